@@ -33,8 +33,6 @@ done
 [[ -z "$NAME" ]] && echo "NAME must be set" && exit 1
 [[ -z "$NAMESPACE" ]] && echo "NAMESPACE must be set" && exit 1
 
-env_vars="$(/bin/print_config.py -o shell_vars)"
-
 echo "Creating the manifests for the kubernetes resources that build the application \"$NAME\""
 
 data_dir="/data"
@@ -51,13 +49,8 @@ if [[ "$mode" = "test" ]]; then
 fi
 
 # Replace the environment variables placeholders from the manifest templates
-for manifest_template_file in "$data_dir"/manifest/*; do
-  manifest_file=$(basename "$manifest_template_file" | sed 's/.template$//')
-  cat "$manifest_template_file" \
-    | /bin/config_env.py envsubst "${env_vars}" \
-    > "$manifest_dir/$manifest_file"
-
-  ensure_k8s_apps_labels.py \
-  --manifest "$manifest_dir/$manifest_file" \
-  --appname "$NAME"
-done
+# and ensure that the resources have the app label, in a single process.
+/bin/multicall.py render_manifests.py \
+  --manifests "$data_dir/manifest" \
+  --dest "$manifest_dir" \
+  --app_name "$NAME"
@@ -51,14 +51,10 @@ function extract_manifest() {
   mkdir -p "$extracted"
 
 
-  # Expand the chart template.
-  if [[ -d "$data_chart" ]]; then
-    for chart in $(find "$data_chart" -maxdepth 1 -type f -name "*.tar.gz"); do
-      chart_manifest_file=$(basename "$chart" | sed 's/.tar.gz$//')
-      mkdir "$extracted/$chart_manifest_file"
-      tar xfC "$chart" "$extracted/$chart_manifest_file"
-    done
-  fi
+  # Expand the chart template, reusing the trees extracted at build time.
+  /bin/multicall.py extract_charts.py \
+    --chart_dir "$data_chart" \
+    --dest "$extracted"
 }
 
 extract_manifest "$data_dir"
@@ -72,36 +68,32 @@ if [[ "$mode" = "test" ]]; then
     continue
   fi
 
-  overlay_test_files.py \
+  /bin/multicall.py overlay_test_files.py \
     --manifest "$data_dir/extracted" \
     --test_manifest "$test_data_dir/extracted" \
     | awk '{print "SMOKE_TEST "$0}'
 fi
 
-# Log information and, at the same time, catch errors early and separately.
-# This is a work around for the fact that process and command substitutions
-# do not propagate errors.
+# Write the values once for all charts. Log them and, at the same time, catch
+# errors early and separately.
+values_dir="$(mktemp -d)"
+/bin/multicall.py print_config.py \
+  --query values.yaml=yaml \
+  --output_dir "$values_dir"
 echo "=== values.yaml ==="
-/bin/print_config.py --output=yaml
+cat "$values_dir/values.yaml"
 echo "==================="
 
-# Run helm expansion.
-for chart in "$data_dir/extracted"/*; do
-  chart_manifest_file=$(basename "$chart" | sed 's/.tar.gz$//').yaml
-  helm template "$NAME" "$chart/chart" \
-    --namespace="$NAMESPACE" \
-    --values=<(/bin/print_config.py --output=yaml) \
-    > "$manifest_dir/$chart_manifest_file"
-
-  if [[ "$mode" != "test" ]]; then
-    process_helm_hooks.py \
-      --manifest "$manifest_dir/$chart_manifest_file"
-  else
-    process_helm_hooks.py --deploy_tests \
-     --manifest "$manifest_dir/$chart_manifest_file"
-  fi
-
-  ensure_k8s_apps_labels.py \
-    --manifest "$manifest_dir/$chart_manifest_file" \
-    --appname "$NAME"
-done
+# Render all charts concurrently, processing helm hooks and adding the app
+# label while writing each chart's manifest.
+deploy_tests_flag=""
+if [[ "$mode" = "test" ]]; then
+  deploy_tests_flag="--deploy_tests"
+fi
+/bin/multicall.py render_helm_charts.py \
+  --extracted "$data_dir/extracted" \
+  --dest "$manifest_dir" \
+  --values "$values_dir/values.yaml" \
+  --name "$NAME" \
+  --namespace "$NAMESPACE" \
+  $deploy_tests_flag
@@ -12,9 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import codecs
 import json
+import os
 import shlex
+import signal
 import subprocess
+import threading
+
+# How much of a stream AsyncCommand reads at once. Lines may be longer.
+_READ_SIZE = 64 * 1024
 
 
 class CommandException(Exception):
@@ -71,3 +78,232 @@ class Command:
   @property
   def output(self):
     return self._output
+
+
+class CommandTimeoutException(CommandException):
+  """Raised when an AsyncCommand does not finish before its timeout."""
+
+  def __init__(self, cmd, timeout):
+    super(CommandTimeoutException, self).__init__(
+        None, "Command '{}' timed out after {} seconds".format(cmd, timeout))
+
+
+class AsyncCommand:
+  """Asyncio counterpart of Command, which does not block the event loop.
+
+  asyncio is only imported when used, as most tools only need Command.
+
+  cmd is a command line, or a list of arguments. The command is started by
+  awaiting run(). Lines written to stdout and stderr are passed to the
+  optional on_stdout/on_stderr callbacks as soon as they are read, whatever
+  their length. With keep_output=False, stdout is only passed to on_stdout,
+  for long running commands. If run() fails, times out or is cancelled, the
+  process is killed.
+  """
+
+  def __init__(self,
+               cmd,
+               print_call=False,
+               print_result=False,
+               on_stdout=None,
+               on_stderr=None,
+               keep_output=True):
+    self._cmd = cmd
+    self._print_call = print_call
+    self._print_result = print_result
+    self._on_stdout = on_stdout
+    self._on_stderr = on_stderr
+    self._keep_output = keep_output
+    self._exitcode = None
+    self._output = None
+
+  async def run(self, timeout=None):
+    """Runs the command. Returns self, or raises CommandException."""
+    import asyncio
+    if self._print_call:
+      print(self._cmd)
+
+    args = shlex.split(self._cmd) if isinstance(self._cmd, str) else self._cmd
+    starting = asyncio.ensure_future(
+        asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            process_group=0))
+    try:
+      process = await asyncio.shield(starting)
+    except asyncio.CancelledError:
+      # Do not leave the process running if it was being started.
+      await _kill(await starting)
+      raise
+    try:
+      self._output, error_message, self._exitcode = await asyncio.wait_for(
+          asyncio.gather(
+              _read_lines(process.stdout, self._on_stdout, self._keep_output),
+              _read_lines(process.stderr, self._on_stderr), process.wait()),
+          timeout)
+    except asyncio.TimeoutError:
+      await _kill(process)
+      raise CommandTimeoutException(self._cmd, timeout)
+    except asyncio.CancelledError:
+      await _kill(process)
+      raise
+    except Exception as e:
+      await _kill(process)
+      raise CommandException(None,
+                             "Command '{}' failed: {}".format(self._cmd,
+                                                              e)) from e
+
+    if self._print_result:
+      result = (f"result: {self._exitcode}\n"
+                f"{self._output}\n"
+                f"{error_message}\n")
+
+      print(result)
+
+    if self._exitcode > 0:
+      raise CommandException(self._exitcode, error_message)
+    return self
+
+  def json(self):
+    return json.loads(self._output)
+
+  @property
+  def exitcode(self):
+    return self._exitcode
+
+  @property
+  def output(self):
+    return self._output
+
+
+async def _read_lines(stream, callback, keep=True):
+  """Reads stream in chunks, passing each line to callback.
+
+  Returns the content of the stream if keep is set, or an empty str."""
+  decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+  content = []
+  partial_line = ''
+  while True:
+    data = await stream.read(_READ_SIZE)
+    text = decoder.decode(data, final=not data)
+    if keep:
+      content.append(text)
+    if callback:
+      lines = (partial_line + text).split('\n')
+      partial_line = lines.pop()
+      for line in lines:
+        callback(line + '\n')
+    if not data:
+      if callback and partial_line:
+        callback(partial_line)
+      return ''.join(content)
+
+
+async def _kill(process):
+  # Kill the whole process group: the pipes stay open, and process.wait()
+  # blocks, for as long as any child of the process holds them.
+  try:
+    os.killpg(process.pid, signal.SIGKILL)
+  except ProcessLookupError:
+    pass
+  await process.wait()
+
+
+async def run_many_async(cmds, max_parallel=4, timeout=None):
+  """Runs AsyncCommands with at most max_parallel of them at the same time.
+
+  Args:
+    cmds: A list of str commands or AsyncCommand instances.
+    max_parallel: The maximum number of processes running at the same time.
+    timeout: The timeout of each single command, in seconds.
+
+  Returns the list of finished AsyncCommands, in the order of cmds. If any
+  command fails, the other ones are cancelled and the error is raised.
+  """
+  import asyncio
+  semaphore = asyncio.Semaphore(max_parallel)
+  commands = [
+      cmd if isinstance(cmd, AsyncCommand) else AsyncCommand(cmd)
+      for cmd in cmds
+  ]
+
+  async def _run(command):
+    async with semaphore:
+      return await command.run(timeout=timeout)
+
+  tasks = [asyncio.ensure_future(_run(command)) for command in commands]
+  try:
+    return await asyncio.gather(*tasks)
+  except BaseException:
+    for task in tasks:
+      task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    raise
+
+
+def run_many(cmds, max_parallel=4, timeout=None):
+  """Blocking wrapper around run_many_async, for synchronous tools."""
+  import asyncio
+  return asyncio.run(
+      run_many_async(cmds, max_parallel=max_parallel, timeout=timeout))
+
+
+class BackgroundCoroutine:
+  """Runs a coroutine in its own thread and event loop.
+
+  This lets synchronous tools run AsyncCommands while doing other work.
+  coroutine_function is called without arguments. cancel() cancels the
+  coroutine, killing the processes of its AsyncCommands. Any exception it
+  raises, other than being cancelled, is kept in the exception attribute.
+  """
+
+  def __init__(self, coroutine_function):
+    self.exception = None
+    self._coroutine_function = coroutine_function
+    self._loop = None
+    self._task = None
+    self._done = False
+    self._lock = threading.Lock()
+    self._started = threading.Event()
+    self._thread = threading.Thread(target=self._run, daemon=True)
+    self._thread.start()
+
+  def _run(self):
+    import asyncio
+    try:
+      asyncio.run(self._main())
+    except asyncio.CancelledError:
+      pass
+    except BaseException as e:
+      self.exception = e
+    finally:
+      self._started.set()
+
+  async def _main(self):
+    import asyncio
+    with self._lock:
+      self._loop = asyncio.get_running_loop()
+      self._task = asyncio.current_task()
+    self._started.set()
+    try:
+      return await self._coroutine_function()
+    finally:
+      with self._lock:
+        self._done = True
+
+  def join(self, timeout=None):
+    """Waits up to timeout seconds for the coroutine to finish.
+
+    Returns whether it has finished."""
+    self._thread.join(timeout)
+    return not self._thread.is_alive()
+
+  def cancel(self):
+    """Cancels the coroutine and waits for it to finish."""
+    self._started.wait()
+    with self._lock:
+      if self._task is not None and not self._done:
+        self._loop.call_soon_threadsafe(self._task.cancel)
+    self._thread.join()
@@ -1,6 +1,10 @@
 """Tests for bash_util."""
 
-from bash_util import Command, CommandException
+from bash_util import AsyncCommand, BackgroundCoroutine, Command
+from bash_util import CommandException, CommandTimeoutException
+from bash_util import run_many, run_many_async
+import asyncio
+import time
 import unittest
 
 
@@ -30,3 +34,134 @@ class BashUtilTest(unittest.TestCase):
     self.assertEqual(
         str(context.exception),
         'cat: nonexistentfile: No such file or directory\n')
+
+
+class AsyncCommandTest(unittest.TestCase):
+
+  def test_async_command_success(self):
+    cmd = asyncio.run(AsyncCommand('echo \'{"a": 1}\'').run())
+    self.assertEqual(cmd.output, '{"a": 1}\n')
+    self.assertEqual(cmd.exitcode, 0)
+    self.assertEqual(cmd.json(), {'a': 1})
+
+  def test_async_command_failure(self):
+    with self.assertRaises(CommandException) as context:
+      asyncio.run(AsyncCommand('cat nonexistentfile').run())
+    self.assertEqual(context.exception.exitcode, 1)
+    self.assertEqual(
+        str(context.exception),
+        'cat: nonexistentfile: No such file or directory\n')
+
+  def test_async_command_streams_lines(self):
+    stdout = []
+    stderr = []
+    asyncio.run(
+        AsyncCommand(
+            'sh -c "echo out1; echo err >&2; echo out2"',
+            on_stdout=stdout.append,
+            on_stderr=stderr.append).run())
+    self.assertEqual(['out1\n', 'out2\n'], stdout)
+    self.assertEqual(['err\n'], stderr)
+
+  def test_async_command_long_lines(self):
+    lines = []
+    cmd = asyncio.run(
+        AsyncCommand([
+            'sh', '-c', 'head -c 100000 /dev/zero | tr "\\0" x; '
+            'echo; printf end'
+        ],
+                     on_stdout=lines.append).run())
+    self.assertEqual(['x' * 100000 + '\n', 'end'], lines)
+    self.assertEqual('x' * 100000 + '\nend', cmd.output)
+
+  def test_async_command_without_output(self):
+    lines = []
+    cmd = asyncio.run(
+        AsyncCommand(['echo', 'a'], on_stdout=lines.append,
+                     keep_output=False).run())
+    self.assertEqual(['a\n'], lines)
+    self.assertEqual('', cmd.output)
+
+  def test_async_command_callback_failure_kills_process(self):
+
+    def _fail(line):
+      raise ValueError('bad line')
+
+    start = time.time()
+    with self.assertRaisesRegex(CommandException, 'bad line'):
+      asyncio.run(
+          AsyncCommand('sh -c "echo a; sleep 10"', on_stdout=_fail).run())
+    self.assertLess(time.time() - start, 5)
+
+  def test_async_command_timeout(self):
+    start = time.time()
+    with self.assertRaises(CommandTimeoutException):
+      asyncio.run(AsyncCommand('sleep 10').run(timeout=0.1))
+    self.assertLess(time.time() - start, 5)
+
+  def test_async_command_timeout_kills_children(self):
+    start = time.time()
+    with self.assertRaises(CommandTimeoutException):
+      asyncio.run(AsyncCommand('sh -c "sleep 10; true"').run(timeout=0.1))
+    self.assertLess(time.time() - start, 5)
+
+  def test_run_many_runs_in_parallel(self):
+    start = time.time()
+    results = run_many(
+        ['sh -c "sleep 0.3; echo {}"'.format(i) for i in range(4)],
+        max_parallel=4)
+    self.assertLess(time.time() - start, 1.1)
+    self.assertEqual(['0\n', '1\n', '2\n', '3\n'], [r.output for r in results])
+
+  def test_run_many_limits_parallelism(self):
+    start = time.time()
+    run_many(['sleep 0.2'] * 4, max_parallel=2)
+    self.assertGreaterEqual(time.time() - start, 0.4)
+
+  def test_run_many_cancels_on_failure(self):
+    start = time.time()
+    with self.assertRaises(CommandException):
+      run_many(['sleep 10', 'bash -c "exit 3"'], max_parallel=2)
+    self.assertLess(time.time() - start, 5)
+
+  def test_run_many_async_cancellation_kills_processes(self):
+
+    async def _cancel():
+      task = asyncio.ensure_future(run_many_async(['sleep 10']))
+      await asyncio.sleep(0.1)
+      task.cancel()
+      with self.assertRaises(asyncio.CancelledError):
+        await task
+
+    start = time.time()
+    asyncio.run(_cancel())
+    self.assertLess(time.time() - start, 5)
+
+
+class BackgroundCoroutineTest(unittest.TestCase):
+
+  def test_join(self):
+
+    async def _run():
+      return await AsyncCommand('true').run()
+
+    task = BackgroundCoroutine(_run)
+    self.assertTrue(task.join(5))
+    self.assertIsNone(task.exception)
+
+  def test_exception_is_kept(self):
+
+    async def _run():
+      await AsyncCommand('bash -c "exit 3"').run()
+
+    task = BackgroundCoroutine(_run)
+    self.assertTrue(task.join(5))
+    self.assertEqual(3, task.exception.exitcode)
+
+  def test_cancel_kills_processes(self):
+    task = BackgroundCoroutine(AsyncCommand('sleep 10').run)
+    self.assertFalse(task.join(0.1))
+    start = time.time()
+    task.cancel()
+    self.assertLess(time.time() - start, 5)
+    self.assertIsNone(task.exception)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+#
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from argparse import ArgumentParser
+
+import config_helper
+import log_util as log
+
+_PROG_HELP = """
+Validates the schema and writes the compiled schema next to it, to
+<schema_file>.compiled. The tools load the compiled schema instead of
+parsing the schema file, as long as the schema file is unchanged.
+"""
+
+
+def main():
+  parser = ArgumentParser(description=_PROG_HELP)
+  parser.add_argument(
+      '--schema_file',
+      help='Path to the schema file',
+      default='/data/schema.yaml')
+  args = parser.parse_args()
+
+  compiled_file = config_helper.write_compiled_schema(args.schema_file)
+  log.info("Compiled {} into {}", args.schema_file, compiled_file)
+
+
+if __name__ == "__main__":
+  main()
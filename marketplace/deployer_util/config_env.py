@@ -37,13 +37,9 @@ def main():
   # Convert values to strings to pass to subprocess.
   values = {k: str(v) for k, v in values.items()}
 
-  # Default env vars should NOT be passed on to the new environment.
-  default_vars = [
-      v.decode('utf-8').split('=')[0] for v in subprocess.check_output(
-          ['env -0'], env={}, shell=True).split(b'\0') if v
-  ]
-  command = (['/usr/bin/env'] + ['--unset={}'.format(v) for v in default_vars] +
-             [args.command] + args.arguments)
+  # The command is run without a shell, so its environment only contains the
+  # config parameters and no shell default variables.
+  command = ['/usr/bin/env', args.command] + args.arguments
   p = subprocess.Popen(
       command,
       env=values,
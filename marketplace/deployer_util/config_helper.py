@@ -13,12 +13,15 @@
 # limitations under the License.
 
 import collections
-import io
+import collections.abc
+import hashlib
 import os
+import pickle
 import re
 import sys
 
-import yaml
+import parse_cache
+import yaml_codec
 
 NAME_RE = re.compile(r'[a-zA-z0-9_\.\-]+$')
 # Suggested from https://semver.org
@@ -45,6 +48,11 @@ XTYPE_MASKED_FIELD = 'MASKED_FIELD'
 
 WIDGET_TYPES = ['help']
 
+# The compiled schema written by compile_schema.py, next to the schema file.
+COMPILED_SCHEMA_SUFFIX = '.compiled'
+# Bump whenever the pickled representation of Schema changes.
+_COMPILED_SCHEMA_VERSION = 1
+
 _OAUTH_SCOPE_PREFIX = 'https://www.googleapis.com/auth/'
 
 
@@ -62,10 +70,10 @@ class InvalidSchema(Exception):
 
 def load_values(values_file, values_dir, schema):
   if values_file == '-':
-    return yaml.safe_load(sys.stdin.read())
+    return yaml_codec.safe_load(sys.stdin.read())
   if values_file and os.path.isfile(values_file):
     with open(values_file, 'r', encoding='utf-8') as f:
-      return yaml.safe_load(f.read())
+      return yaml_codec.safe_load(f.read())
   return _read_values_to_dict(values_dir, schema)
 
 
@@ -92,35 +100,97 @@ def _read_values_to_dict(values_dir, schema):
   return result
 
 
+def compiled_schema_path(schema_file):
+  return schema_file + COMPILED_SCHEMA_SUFFIX
+
+
+def _schema_digest(schema_file):
+  with open(schema_file, 'rb') as f:
+    return hashlib.sha256(f.read()).hexdigest()
+
+
+def write_compiled_schema(schema_file):
+  """Validates the schema file and writes the compiled Schema next to it.
+
+  Returns the name of the compiled schema file."""
+  schema = Schema.load_yaml_file(schema_file).compile()
+  compiled_file = compiled_schema_path(schema_file)
+  tmp_file = '{}.{}.tmp'.format(compiled_file, os.getpid())
+  with open(tmp_file, 'wb') as f:
+    pickle.dump(
+        {
+            'version': _COMPILED_SCHEMA_VERSION,
+            'digest': _schema_digest(schema_file),
+            'schema': schema,
+        },
+        f,
+        protocol=pickle.HIGHEST_PROTOCOL)
+  os.replace(tmp_file, compiled_file)
+  return compiled_file
+
+
+def load_compiled_schema(schema_file):
+  """Returns the compiled Schema of schema_file, or None if there is no
+  compiled schema matching the content of schema_file."""
+  compiled_file = compiled_schema_path(schema_file)
+  if not os.path.exists(compiled_file):
+    return None
+  try:
+    with open(compiled_file, 'rb') as f:
+      compiled = pickle.load(f)
+    if (compiled['version'] != _COMPILED_SCHEMA_VERSION or
+        compiled['digest'] != _schema_digest(schema_file)):
+      return None
+    return compiled['schema']
+  except Exception:
+    # Written by different tools, or unreadable; parse the schema again.
+    return None
+
+
 class Schema:
-  """Accesses a JSON schema."""
+  """Accesses a JSON schema.
+
+  With lazy=True, the properties and the top level x-google-marketplace are
+  only constructed, and checked, when they are first accessed. validate()
+  still checks the whole schema."""
 
   @staticmethod
-  def load_yaml_file(filepath):
-    with io.open(filepath, 'r') as f:
-      d = yaml.safe_load(f)
-      return Schema(d)
+  def load_yaml_file(filepath, lazy=False):
+    compiled = load_compiled_schema(filepath)
+    if compiled is not None:
+      return compiled
+    d = parse_cache.load(filepath, yaml_codec.safe_load, 'yaml')
+    return Schema(d, lazy=lazy)
 
   @staticmethod
-  def load_yaml(yaml_str):
-    return Schema(yaml.safe_load(yaml_str))
+  def load_yaml(yaml_str, lazy=False):
+    return Schema(yaml_codec.safe_load(yaml_str), lazy=lazy)
 
-  def __init__(self, dictionary):
-    self._x_google_marketplace = _maybe_get_and_apply(
-        dictionary, 'x-google-marketplace',
-        lambda v: SchemaXGoogleMarketplace(v))
+  def __init__(self, dictionary, lazy=False):
+    self._dictionary = dictionary
+    self._x_google_marketplace_loaded = False
+    self._x_google_marketplace = None
 
     self._required = dictionary.get('required', [])
-    self._properties = {
-        k: SchemaProperty(k, v, k in self._required)
-        for k, v in dictionary.get('properties', {}).items()
-    }
+    self._property_dicts = dictionary.get('properties', {})
+    self._property_index = None
+    self._properties = _LazyProperties(self._property_dicts, self._required)
 
     self._app_api_version = dictionary.get(
         'applicationApiVersion', dictionary.get('application_api_version',
                                                 None))
 
     self._form = dictionary.get('form', [])
+    self._validated = False
+
+    if not lazy:
+      self.load_all()
+
+  def load_all(self):
+    """Constructs everything left to construct, raising any InvalidSchema."""
+    _ = self.x_google_marketplace
+    if isinstance(self._properties, _LazyProperties):
+      self._properties = dict(self._properties.items())
 
   def validate(self):
     """
@@ -131,6 +201,9 @@ class Schema:
     in class construction which are enforced immediately upon tools repo
     release.
     """
+    if self._validated:
+      return
+    self.load_all()
     bad_required_names = [
         x for x in self._required if x not in self._properties
     ]
@@ -140,9 +213,9 @@ class Schema:
               ', '.join(bad_required_names)))
 
     is_v2 = False
-    if self._x_google_marketplace is not None:
-      self._x_google_marketplace.validate()
-      is_v2 = self._x_google_marketplace.is_v2()
+    if self.x_google_marketplace is not None:
+      self.x_google_marketplace.validate()
+      is_v2 = self.x_google_marketplace.is_v2()
 
     if not is_v2 and self._app_api_version is None:
       raise InvalidSchema('applicationApiVersion is required')
@@ -166,15 +239,27 @@ class Schema:
               'No properties should have x-google-marketplace.type=IMAGE in '
               'schema v2. Images must be declared in the top level '
               'x-google-marketplace.images')
-      if self._x_google_marketplace._deployer_service_account:
-        self._x_google_marketplace._deployer_service_account.validate()
+      if self.x_google_marketplace.deployer_service_account:
+        self.x_google_marketplace.deployer_service_account.validate()
 
     for _, p in self._properties.items():
       if p.xtype == XTYPE_SERVICE_ACCOUNT:
         p.service_account.validate()
+    self._validated = True
+
+  def compile(self):
+    """Validates the schema and builds all of its lookup tables."""
+    self.validate()
+    self._get_property_index().build()
+    return self
 
   @property
   def x_google_marketplace(self):
+    if not self._x_google_marketplace_loaded:
+      self._x_google_marketplace = _maybe_get_and_apply(
+          self._dictionary, 'x-google-marketplace',
+          lambda v: SchemaXGoogleMarketplace(v))
+      self._x_google_marketplace_loaded = True
     return self._x_google_marketplace
 
   @property
@@ -196,17 +281,156 @@ class Schema:
     return self._form
 
   def properties_matching(self, definition):
+    """Returns the properties matching definition.
+
+    See SchemaProperty.matches_definition."""
+    return [
+        self._properties[name]
+        for name in self._get_property_index().matching(definition)
+    ]
+
+  def properties_with_xtype(self, xtype):
+    """Returns the properties whose x-google-marketplace.type is xtype."""
     return [
-        v for k, v in self._properties.items()
-        if v.matches_definition(definition)
+        self._properties[name]
+        for name in self._get_property_index().with_xtype(xtype)
     ]
 
+  def _get_property_index(self):
+    if self._property_index is None:
+      self._property_index = _PropertyIndex(self._property_dicts)
+    return self._property_index
+
   def is_v2(self):
     if self.x_google_marketplace:
       return self.x_google_marketplace.is_v2()
     return False
 
 
+class _LazyProperties(collections.abc.Mapping):
+  """Maps property names to SchemaProperty objects, built on first access."""
+
+  def __init__(self, dictionaries, required):
+    self._dictionaries = dictionaries
+    self._required = required
+    self._properties = {}
+
+  def __getitem__(self, name):
+    prop = self._properties.get(name)
+    if prop is None:
+      prop = SchemaProperty(name, self._dictionaries[name], name
+                            in self._required)
+      self._properties[name] = prop
+    return prop
+
+  def __contains__(self, name):
+    return name in self._dictionaries
+
+  def __iter__(self):
+    return iter(self._dictionaries)
+
+  def __len__(self):
+    return len(self._dictionaries)
+
+
+class _PropertyIndex:
+  """Lookup tables over the raw property dictionaries.
+
+  Property names are indexed by x-google-marketplace type. For other
+  definitions, each property is flattened once into a {path: value} dict,
+  so that matching costs one lookup per leaf of the definition."""
+
+  def __init__(self, dictionaries):
+    self._dictionaries = dictionaries
+    self._by_xtype = collections.defaultdict(list)
+    for name, d in dictionaries.items():
+      x = d.get(XGOOGLE, None)
+      if isinstance(x, dict):
+        self._by_xtype[x.get('type', None)].append(name)
+    self._paths = None
+
+  def build(self):
+    """Builds the tables that are otherwise built on first use."""
+    if self._paths is None:
+      self._paths = {}
+      for name, d in self._dictionaries.items():
+        paths = {}
+        _flatten(dict(list(d.items()) + [('name', name)]), (), paths)
+        self._paths[name] = paths
+
+  def with_xtype(self, xtype):
+    return self._by_xtype.get(xtype, [])
+
+  def matching(self, definition):
+    x = definition.get(XGOOGLE, None)
+    if (len(definition) == 1 and isinstance(x, dict) and list(x) == ['type'] and
+        not isinstance(x['type'], dict)):
+      return self.with_xtype(x['type'])
+
+    self.build()
+    leaves = list(_definition_leaves(definition, ()))
+    return [
+        name for name, paths in self._paths.items()
+        if _paths_match(paths, leaves)
+    ]
+
+
+def _flatten(value, path, paths):
+  """Adds value and all the values nested in it to paths, by key path."""
+  paths[path] = value
+  if isinstance(value, dict):
+    for k, v in value.items():
+      _flatten(v, path + (k,), paths)
+
+
+def _definition_leaves(definition, path):
+  """Yields the (path, value) of the leaves of a definition.
+
+  Empty dicts are leaves, matching any dict."""
+  for k, v in definition.items():
+    if isinstance(v, dict) and v:
+      yield from _definition_leaves(v, path + (k,))
+    else:
+      yield path + (k,), v
+
+
+def _paths_match(paths, leaves):
+  """Flattened equivalent of _definition_matches."""
+  for path, expected in leaves:
+    if path in paths:
+      value = paths[path]
+    elif isinstance(paths.get(path[:-1], None), dict):
+      # Missing keys of an existing dict compare as None.
+      value = None
+    else:
+      return False
+    if isinstance(expected, dict):
+      if not isinstance(value, dict):
+        return False
+    elif isinstance(value, dict) or value != expected:
+      return False
+  return True
+
+
+def _definition_matches(name, dictionary, definition):
+  """Returns true if definition partially matches the property dictionary.
+
+  See SchemaProperty.matches_definition."""
+
+  def _matches(dictionary, subdict):
+    for k, sv in subdict.items():
+      v = dictionary.get(k, None)
+      if isinstance(v, dict):
+        if not _matches(v, sv):
+          return False
+      else:
+        if v != sv:
+          return False
+    return True
+
+  return _matches(dict(list(dictionary.items()) + [('name', name)]), definition)
+
+
 _SCHEMA_VERSION_1 = 'v1'
 _SCHEMA_VERSION_2 = 'v2'
 _SCHEMA_VERSIONS = [_SCHEMA_VERSION_1, _SCHEMA_VERSION_2]
@@ -877,19 +1101,7 @@ class SchemaProperty:
     property name, which does not originally exist in the schema.
     """
 
-    def _matches(dictionary, subdict):
-      for k, sv in subdict.items():
-        v = dictionary.get(k, None)
-        if isinstance(v, dict):
-          if not _matches(v, sv):
-            return False
-        else:
-          if v != sv:
-            return False
-      return True
-
-    return _matches(
-        dict(list(self._d.items()) + [('name', self._name)]), definition)
+    return _definition_matches(self._name, self._d, definition)
 
   def __eq__(self, other):
     if not isinstance(other, SchemaProperty):
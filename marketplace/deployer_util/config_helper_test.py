@@ -15,6 +15,7 @@
 import os
 import tempfile
 import unittest
+from unittest import mock
 
 import config_helper
 
@@ -1797,6 +1798,167 @@ class ConfigHelperTest(unittest.TestCase):
         dirname, config_helper.Schema.load_yaml(schema))
     self.assertEqual(actual_values, expected_values)
 
+  def test_lazy_schema_constructs_properties_on_access(self):
+    schema = config_helper.Schema.load_yaml(
+        """
+    applicationApiVersion: v1beta1
+    properties:
+      name:
+        type: string
+        x-google-marketplace:
+          type: NAME
+      broken:
+        type: string
+        x-google-marketplace:
+          type: UNKNOWN
+    """,
+        lazy=True)
+    self.assertIn('broken', schema.properties)
+    self.assertEqual(['name'], list(schema.properties)[:1])
+    self.assertEqual(['name'], [
+        p.name for p in schema.properties_matching(
+            {'x-google-marketplace': {
+                'type': 'NAME'
+            }})
+    ])
+    with self.assertRaisesRegex(config_helper.InvalidSchema, 'unknown type'):
+      schema.properties['broken']
+    with self.assertRaisesRegex(config_helper.InvalidSchema, 'unknown type'):
+      schema.validate()
+
+  def test_lazy_schema_matches_eager_schema(self):
+    eager = config_helper.Schema.load_yaml(SCHEMA)
+    lazy = config_helper.Schema.load_yaml(SCHEMA, lazy=True)
+    self.assertEqual(dict(eager.properties), dict(lazy.properties))
+    self.assertEqual(eager.required, lazy.required)
+    self.assertEqual(eager.app_api_version, lazy.app_api_version)
+    definition = {'x-google-marketplace': {'type': 'GENERATED_PASSWORD'}}
+    self.assertEqual(
+        eager.properties_matching(definition),
+        lazy.properties_matching(definition))
+
+  def test_lazy_schema_x_google_marketplace_on_access(self):
+    schema = config_helper.Schema.load_yaml(
+        """
+    x-google-marketplace:
+      schemaVersion: v3
+    properties:
+      name:
+        type: string
+    """,
+        lazy=True)
+    self.assertEqual(str, schema.properties['name'].type)
+    with self.assertRaisesRegex(config_helper.InvalidSchema,
+                                'Invalid schema version'):
+      schema.x_google_marketplace
+
+  def test_properties_with_xtype(self):
+    schema = config_helper.Schema.load_yaml(SCHEMA)
+    self.assertEqual(['propertyPassword'], [
+        p.name
+        for p in schema.properties_with_xtype(config_helper.XTYPE_PASSWORD)
+    ])
+    self.assertEqual([], schema.properties_with_xtype('UNKNOWN'))
+
+  def test_properties_matching_uses_definition_semantics(self):
+    schema = config_helper.Schema.load_yaml(SCHEMA)
+    definitions = [
+        {},
+        {
+            'name': 'propertyInt'
+        },
+        {
+            'type': 'string'
+        },
+        {
+            'type': 'string',
+            'default': None
+        },
+        {
+            'default': 3
+        },
+        {
+            'x-google-marketplace': {}
+        },
+        {
+            'x-google-marketplace': {
+                'type': 'IMAGE'
+            }
+        },
+        {
+            'x-google-marketplace': {
+                'type': None
+            }
+        },
+        {
+            'x-google-marketplace': {
+                'type': 'GENERATED_PASSWORD',
+                'generatedPassword': {
+                    'length': 8
+                }
+            }
+        },
+        {
+            'x-google-marketplace': {
+                'generatedPassword': {}
+            }
+        },
+        {
+            'type': {
+                'nested': 'value'
+            }
+        },
+    ]
+    for definition in definitions:
+      expected = [
+          p for p in schema.properties.values()
+          if p.matches_definition(definition)
+      ]
+      self.assertEqual(expected, schema.properties_matching(definition),
+                       definition)
+
+  def test_compiled_schema_is_loaded_while_schema_is_unchanged(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      schema_file = os.path.join(tmpdir, 'schema.yaml')
+      with open(schema_file, 'w') as f:
+        f.write('applicationApiVersion: v1beta1\n' + SCHEMA)
+      compiled_file = config_helper.write_compiled_schema(schema_file)
+      self.assertEqual(schema_file + '.compiled', compiled_file)
+
+      with mock.patch.object(config_helper.parse_cache, 'load') as load:
+        schema = config_helper.Schema.load_yaml_file(schema_file, lazy=True)
+      load.assert_not_called()
+      self.assertEqual(['propertyPassword'], [
+          p.name
+          for p in schema.properties_with_xtype(config_helper.XTYPE_PASSWORD)
+      ])
+      self.assertEqual('v1beta1', schema.app_api_version)
+
+      with open(schema_file, 'a') as f:
+        f.write('required: [propertyString]\n')
+      schema = config_helper.Schema.load_yaml_file(schema_file)
+      self.assertEqual(['propertyString'], schema.required)
+
+  def test_unreadable_compiled_schema_is_ignored(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      schema_file = os.path.join(tmpdir, 'schema.yaml')
+      with open(schema_file, 'w') as f:
+        f.write('applicationApiVersion: v1beta1\n' + SCHEMA)
+      with open(schema_file + '.compiled', 'wb') as f:
+        f.write(b'not a pickle')
+      schema = config_helper.Schema.load_yaml_file(schema_file)
+      self.assertEqual('v1beta1', schema.app_api_version)
+
+  def test_invalid_schema_is_not_compiled(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      schema_file = os.path.join(tmpdir, 'schema.yaml')
+      with open(schema_file, 'w') as f:
+        f.write(SCHEMA)
+      with self.assertRaisesRegex(config_helper.InvalidSchema,
+                                  'applicationApiVersion is required'):
+        config_helper.write_compiled_schema(schema_file)
+      self.assertEqual(['schema.yaml'], os.listdir(tmpdir))
+
 
 if __name__ == 'main':
   unittest.main()
@@ -18,6 +18,19 @@ set -eox pipefail
 
 # This is the entry point for the production deployment
 
+# Parsed schema and manifests are cached by content hash, so that the many
+# tools reading the same files only parse them once.
+export DEPLOYER_PARSE_CACHE_DIR="${DEPLOYER_PARSE_CACHE_DIR:-/tmp/deployer-parse-cache}"
+
+# Tools called through /bin/multicall.py run in a server process which
+# imports the common modules once per deployment. Set DEPLOYER_TOOLS_SERVER to
+# false to start a new interpreter for each tool instead. The socket must be in
+# a directory only accessible to the current user, by default a new one.
+if [[ "${DEPLOYER_TOOLS_SERVER:-true}" == "true" ]]; then
+  export DEPLOYER_TOOLS_SOCKET="${DEPLOYER_TOOLS_SOCKET:-$(mktemp -d)/tools.sock}"
+  /bin/multicall.py serve "$DEPLOYER_TOOLS_SOCKET" &
+fi
+
 # If any command returns with non-zero exit code, set -e will cause the script
 # to exit. Prior to exit, set App assembly status to "Failed".
 handle_failure() {
@@ -25,57 +38,42 @@ handle_failure() {
   if [[ -z "$NAME" ]] || [[ -z "$NAMESPACE" ]]; then
     # /bin/expand_config.py might have failed.
     # We fall back to the unexpanded params to get the name and namespace.
-    NAME="$(/bin/print_config.py \
-            --xtype NAME \
-            --values_mode raw)"
-    NAMESPACE="$(/bin/print_config.py \
-            --xtype NAMESPACE \
-            --values_mode raw)"
-    export NAME
-    export NAMESPACE
+    name_and_namespace="$(/bin/multicall.py print_config.py \
+            --values_mode raw \
+            --query NAME=xtype:NAME \
+            --query NAMESPACE=xtype:NAMESPACE)"
+    eval "$name_and_namespace"
   fi
   patch_assembly_phase.sh --status="Failed"
   exit $code
 }
 trap "handle_failure" EXIT
 
-NAME="$(/bin/print_config.py \
-    --xtype NAME \
-    --values_mode raw)"
-NAMESPACE="$(/bin/print_config.py \
-    --xtype NAMESPACE \
-    --values_mode raw)"
-export NAME
-export NAMESPACE
+name_and_namespace="$(/bin/multicall.py print_config.py \
+    --values_mode raw \
+    --query NAME=xtype:NAME \
+    --query NAMESPACE=xtype:NAMESPACE)"
+eval "$name_and_namespace"
 
 echo "Deploying application \"$NAME\""
 
-app_uid=$(kubectl get "applications.app.k8s.io/$NAME" \
-  --namespace="$NAMESPACE" \
-  --output=jsonpath='{.metadata.uid}')
-app_api_version=$(kubectl get "applications.app.k8s.io/$NAME" \
-  --namespace="$NAMESPACE" \
-  --output=jsonpath='{.apiVersion}')
-
-/bin/expand_config.py --values_mode raw --app_uid "$app_uid"
+# Look up the identity of the Application in a single call.
+app_identity="$(/bin/multicall.py print_app_identity.py \
+  --name "$NAME" \
+  --namespace "$NAMESPACE")"
+eval "$app_identity"
 
-create_manifests.sh
-
-# Assign owner references for the resources.
-/bin/set_ownership.py \
-  --app_name "$NAME" \
-  --app_uid "$app_uid" \
-  --app_api_version "$app_api_version" \
+# Expand the config, create the manifests, assign owner references, validate
+# the Application and set its assembly phase to "Pending" (until successful
+# kubectl apply) in a single process.
+/bin/multicall.py deploy_pipeline.py \
+  --values_mode raw \
+  --app_uid "$APP_UID" \
+  --app_api_version "$APP_API_VERSION" \
+  --assembly_phase "Pending" \
   --manifests "/data/manifest-expanded" \
   --dest "/data/resources.yaml"
 
-validate_app_resource.py --manifests "/data/resources.yaml"
-
-# Ensure assembly phase is "Pending", until successful kubectl apply.
-/bin/setassemblyphase.py \
-  --manifest "/data/resources.yaml" \
-  --status "Pending"
-
 # Apply the manifest.
 kubectl apply --namespace="$NAMESPACE" --filename="/data/resources.yaml"
 
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+#
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import subprocess
+from argparse import ArgumentParser
+
+import config_helper
+import expand_config
+import log_util as log
+import print_config
+import schema_values_common
+from resources import ManifestPipeline
+from separate_tester_resources import add_tester_separation_stage
+from set_ownership import add_ownership_stage
+from setassemblyphase import add_assembly_phase_stage
+from validate_app_resource import validate_app_resource
+from yaml_util import dump_resources_yaml
+from yaml_util import load_manifests
+from yaml_util import write_resources
+
+_PROG_HELP = """
+Runs the deployer pipeline in a single process: expands the configuration,
+creates the manifests, assigns ownership, validates the Application resource
+and writes the final resources manifest. The schema and the values are parsed
+once and the resources are kept in memory between the stages.
+"""
+
+MODE_PROD = 'prod'
+MODE_TEST = 'test'
+
+
+def main():
+  parser = ArgumentParser(description=_PROG_HELP)
+  schema_values_common.add_to_argument_parser(parser)
+  parser.set_defaults(values_mode='raw')
+  parser.add_argument(
+      '--app_uid', help='The uid of the application instance', required=True)
+  parser.add_argument(
+      '--app_api_version',
+      help='The apiVersion of the Application CRD',
+      required=True)
+  parser.add_argument(
+      '--namespace_uid',
+      help='The uid of the namespace containing the application. If set, '
+      'the namespace is set as the owner of cluster-scoped resources.')
+  parser.add_argument(
+      '--mode',
+      choices=[MODE_PROD, MODE_TEST],
+      default=MODE_PROD,
+      help='In test mode, tester resources are separated into --test_dest')
+  parser.add_argument(
+      '--assembly_phase',
+      choices=['Failure', 'Pending', 'Success'],
+      help='If specified, the assembly phase to set on the Application')
+  parser.add_argument(
+      '--final_values_file',
+      help='Where the final value file should be written to',
+      default='/data/final_values.yaml')
+  parser.add_argument(
+      '--create_manifests',
+      help='The command that renders the manifests into --manifests',
+      default='create_manifests.sh')
+  parser.add_argument(
+      '--manifests',
+      help='The folder containing the rendered manifests',
+      default='/data/manifest-expanded')
+  parser.add_argument(
+      '--dest',
+      help='The output file for the resulting manifest',
+      default='/data/resources.yaml')
+  parser.add_argument(
+      '--test_dest',
+      help='The output file for the tester resources in test mode',
+      default='/data/tester.yaml')
+  args = parser.parse_args()
+
+  schema = schema_values_common.load_schema(args)
+  values = schema_values_common.load_values(args)
+
+  app_name = print_config.output_xtype(values, schema, config_helper.XTYPE_NAME,
+                                       False)
+  namespace = print_config.output_xtype(values, schema,
+                                        config_helper.XTYPE_NAMESPACE, False)
+
+  values = expand_config.expand(values, schema, app_uid=args.app_uid)
+  expand_config.write_values(values, args.final_values_file)
+
+  create_manifests(
+      args.create_manifests,
+      app_name=app_name,
+      namespace=namespace,
+      mode=args.mode)
+
+  resources = load_manifests(args.manifests)
+  resources, test_resources = process_resources(
+      resources,
+      schema,
+      app_name=app_name,
+      app_uid=args.app_uid,
+      app_api_version=args.app_api_version,
+      namespace=namespace,
+      namespace_uid=args.namespace_uid,
+      separate_testers=args.mode == MODE_TEST,
+      assembly_phase=args.assembly_phase)
+
+  dump_resources_yaml(resources, args.dest)
+  if test_resources:
+    with open(args.test_dest, 'a', encoding='utf-8') as test_outfile:
+      write_resources(test_resources, test_outfile)
+
+
+def create_manifests(command, app_name, namespace, mode):
+  """Runs the deployer's manifest rendering script."""
+  env = dict(os.environ)
+  env['NAME'] = app_name
+  env['NAMESPACE'] = namespace
+  cmd = [command]
+  if mode == MODE_TEST:
+    cmd.append('--mode=test')
+  log.info('Running {}', ' '.join(cmd))
+  subprocess.run(cmd, env=env, check=True)
+
+
+def process_resources(resources, schema, app_name, app_uid, app_api_version,
+                      namespace, namespace_uid, separate_testers,
+                      assembly_phase):
+  """Runs the in-memory stages over the rendered resources.
+
+  Returns a tuple of (resources, test resources)."""
+  pipeline = add_ownership_stage(
+      ManifestPipeline(),
+      use_app=True,
+      namespace=namespace,
+      namespace_uid=namespace_uid,
+      app_name=app_name,
+      app_uid=app_uid,
+      app_api_version=app_api_version,
+      deployer_name=None,
+      deployer_uid=None)
+
+  def _validate(resources):
+    validate_app_resource(resources, schema)
+    return resources
+
+  pipeline.apply(_validate)
+
+  test_resources = []
+  if separate_testers:
+    add_tester_separation_stage(
+        pipeline,
+        test_resources,
+        app_uid=app_uid,
+        app_name=app_name,
+        app_api_version=app_api_version)
+
+  if assembly_phase:
+    add_assembly_phase_stage(pipeline, assembly_phase)
+
+  return pipeline.run(resources), test_resources
+
+
+if __name__ == "__main__":
+  main()
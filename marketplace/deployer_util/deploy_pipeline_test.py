@@ -0,0 +1,141 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import config_helper
+import deploy_pipeline
+from yaml_util import parse_resources_yaml
+
+APP_API_VERSION = 'app.k8s.io/v1beta1'
+APP_NAME = 'wordpress-1'
+APP_UID = '00000000-1111-2222-3333-444444444444'
+NAMESPACE_UID = '11111111-2222-3333-4444-555555555555'
+
+SCHEMA = config_helper.Schema.load_yaml("""
+    x-google-marketplace:
+      schemaVersion: v2
+      applicationApiVersion: v1beta1
+      publishedVersion: 1.0.0
+      publishedVersionMetadata:
+        releaseNote: Initial release
+      images: {}
+    properties:
+      name:
+        type: string
+        x-google-marketplace:
+          type: NAME
+      namespace:
+        type: string
+        x-google-marketplace:
+          type: NAMESPACE
+    """)
+
+MANIFEST = """
+apiVersion: app.k8s.io/v1beta1
+kind: Application
+metadata:
+  name: wordpress-1
+  annotations:
+    marketplace.cloud.google.com/deploy-info: '{"partner_id": "p", "product_id": "s"}'
+spec:
+  descriptor:
+    version: 1.0.0
+  componentKinds:
+  - group: v1
+    kind: ConfigMap
+  - group: v1
+    kind: Pod
+---
+apiVersion: v1
+kind: ConfigMap
+metadata:
+  name: wordpress-1-config
+---
+apiVersion: v1
+kind: Pod
+metadata:
+  name: wordpress-1-tester
+  annotations:
+    marketplace.cloud.google.com/verification: test
+---
+apiVersion: rbac.authorization.k8s.io/v1
+kind: ClusterRole
+metadata:
+  name: wordpress-1-role
+"""
+
+
+class DeployPipelineTest(unittest.TestCase):
+
+  def process(self, **kwargs):
+    args = {
+        'app_name': APP_NAME,
+        'app_uid': APP_UID,
+        'app_api_version': APP_API_VERSION,
+        'namespace': 'test-ns',
+        'namespace_uid': None,
+        'separate_testers': False,
+        'assembly_phase': None,
+    }
+    args.update(kwargs)
+    return deploy_pipeline.process_resources(
+        parse_resources_yaml(MANIFEST), SCHEMA, **args)
+
+  def test_prod_mode_sets_ownership_and_assembly_phase(self):
+    resources, test_resources = self.process(assembly_phase='Pending')
+    self.assertEqual([], test_resources)
+    self.assertEqual(['Application', 'ConfigMap', 'Pod', 'ClusterRole'],
+                     [r['kind'] for r in resources])
+    self.assertEqual('Pending', resources[0]['spec']['assemblyPhase'])
+    self.assertEqual(APP_UID,
+                     resources[1]['metadata']['ownerReferences'][0]['uid'])
+    self.assertEqual(APP_UID,
+                     resources[2]['metadata']['ownerReferences'][0]['uid'])
+    self.assertNotIn('ownerReferences', resources[3]['metadata'])
+
+  def test_test_mode_separates_testers(self):
+    resources, test_resources = self.process(
+        separate_testers=True, namespace_uid=NAMESPACE_UID)
+    self.assertEqual(['Application', 'ConfigMap', 'ClusterRole'],
+                     [r['kind'] for r in resources])
+    self.assertNotIn('assemblyPhase', resources[0]['spec'])
+    self.assertEqual(NAMESPACE_UID,
+                     resources[2]['metadata']['ownerReferences'][0]['uid'])
+    self.assertEqual(['wordpress-1-tester'],
+                     [r['metadata']['name'] for r in test_resources])
+
+  def test_invalid_application_raises(self):
+    schema = config_helper.Schema.load_yaml("""
+        x-google-marketplace:
+          schemaVersion: v2
+          applicationApiVersion: v1beta1
+          publishedVersion: 2.0.0
+          publishedVersionMetadata:
+            releaseNote: Next release
+          images: {}
+        properties: {}
+        """)
+    self.assertRaisesRegex(
+        Exception, r'.*does not match.*publishedVersion.*',
+        lambda: deploy_pipeline.process_resources(
+            parse_resources_yaml(MANIFEST),
+            schema,
+            app_name=APP_NAME,
+            app_uid=APP_UID,
+            app_api_version=APP_API_VERSION,
+            namespace='test-ns',
+            namespace_uid=None,
+            separate_testers=False,
+            assembly_phase=None))
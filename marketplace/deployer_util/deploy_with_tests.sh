@@ -18,6 +18,19 @@ set -eox pipefail
 
 # This is the entry point for the test deployment
 
+# Parsed schema and manifests are cached by content hash, so that the many
+# tools reading the same files only parse them once.
+export DEPLOYER_PARSE_CACHE_DIR="${DEPLOYER_PARSE_CACHE_DIR:-/tmp/deployer-parse-cache}"
+
+# Tools called through /bin/multicall.py run in a server process which
+# imports the common modules once per deployment. Set DEPLOYER_TOOLS_SERVER to
+# false to start a new interpreter for each tool instead. The socket must be in
+# a directory only accessible to the current user, by default a new one.
+if [[ "${DEPLOYER_TOOLS_SERVER:-true}" == "true" ]]; then
+  export DEPLOYER_TOOLS_SOCKET="${DEPLOYER_TOOLS_SOCKET:-$(mktemp -d)/tools.sock}"
+  /bin/multicall.py serve "$DEPLOYER_TOOLS_SOCKET" &
+fi
+
 # If any command returns with non-zero exit code, set -e will cause the script
 # to exit. Prior to exit, set App assembly status to "Failed".
 handle_failure() {
@@ -25,14 +38,11 @@ handle_failure() {
   if [[ -z "$NAME" ]] || [[ -z "$NAMESPACE" ]]; then
     # /bin/expand_config.py might have failed.
     # We fall back to the unexpanded params to get the name and namespace.
-    NAME="$(/bin/print_config.py \
-            --xtype NAME \
-            --values_mode raw)"
-    NAMESPACE="$(/bin/print_config.py \
-            --xtype NAMESPACE \
-            --values_mode raw)"
-    export NAME
-    export NAMESPACE
+    name_and_namespace="$(/bin/multicall.py print_config.py \
+            --values_mode raw \
+            --query NAME=xtype:NAME \
+            --query NAMESPACE=xtype:NAMESPACE)"
+    eval "$name_and_namespace"
   fi
   patch_assembly_phase.sh --status="Failed"
   exit $code
@@ -40,74 +50,62 @@ handle_failure() {
 trap "handle_failure" EXIT
 
 test_schema="/data-test/schema.yaml"
-overlay_test_schema.py \
+/bin/multicall.py overlay_test_schema.py \
   --test_schema "$test_schema" \
   --original_schema "/data/schema.yaml" \
   --output "/data/schema.yaml" \
   | awk '{print "SMOKE_TEST "$0}'
 
-NAME="$(/bin/print_config.py \
-    --xtype NAME \
-    --values_mode raw)"
-NAMESPACE="$(/bin/print_config.py \
-    --xtype NAMESPACE \
-    --values_mode raw)"
-export NAME
-export NAMESPACE
+name_and_namespace="$(/bin/multicall.py print_config.py \
+    --values_mode raw \
+    --query NAME=xtype:NAME \
+    --query NAMESPACE=xtype:NAMESPACE)"
+eval "$name_and_namespace"
 
 echo "Deploying application \"$NAME\" in test mode"
 
-app_uid=$(kubectl get "applications.app.k8s.io/$NAME" \
-  --namespace="$NAMESPACE" \
-  --output=jsonpath='{.metadata.uid}')
-app_api_version=$(kubectl get "applications.app.k8s.io/$NAME" \
-  --namespace="$NAMESPACE" \
-  --output=jsonpath='{.apiVersion}')
-namespace_uid=$(kubectl get "namespaces/$NAMESPACE" \
-  --output=jsonpath='{.metadata.uid}')
-
-/bin/expand_config.py --values_mode raw --app_uid "$app_uid"
-
-create_manifests.sh --mode="test"
-
-# Assign owner references for the resources.
-/bin/set_ownership.py \
-  --app_name "$NAME" \
-  --app_uid "$app_uid" \
-  --app_api_version "$app_api_version" \
+# Look up the identity of the Application and the Namespace in a single call.
+app_identity="$(/bin/multicall.py print_app_identity.py \
+  --name "$NAME" \
   --namespace "$NAMESPACE" \
-  --namespace_uid "$namespace_uid" \
+  --include_namespace_uid)"
+eval "$app_identity"
+
+# Expand the config, create the manifests, assign owner references, validate
+# the Application and separate the tester resources in a single process.
+/bin/multicall.py deploy_pipeline.py \
+  --values_mode raw \
+  --mode test \
+  --app_uid "$APP_UID" \
+  --app_api_version "$APP_API_VERSION" \
+  --namespace_uid "$NAMESPACE_UID" \
   --manifests "/data/manifest-expanded" \
-  --dest "/data/resources.yaml"
-
-validate_app_resource.py --manifests "/data/resources.yaml"
-
-separate_tester_resources.py \
-  --app_uid "$app_uid" \
-  --app_name "$NAME" \
-  --app_api_version "$app_api_version" \
-  --manifests "/data/resources.yaml" \
-  --out_manifests "/data/resources.yaml" \
-  --out_test_manifests "/data/tester.yaml"
+  --dest "/data/resources.yaml" \
+  --test_dest "/data/tester.yaml"
 
 # Apply the manifest.
 kubectl apply --namespace="$NAMESPACE" --filename="/data/resources.yaml"
 
 patch_assembly_phase.sh --status="Success"
 
-wait_for_ready.py \
+/bin/multicall.py wait_for_ready.py \
   --name $NAME \
   --namespace $NAMESPACE \
-  --timeout ${WAIT_FOR_READY_TIMEOUT:-300}
+  --timeout ${WAIT_FOR_READY_TIMEOUT:-300} \
+  --stability_window ${WAIT_FOR_READY_STABILITY_WINDOW:-30} \
+  --stable_observations ${WAIT_FOR_READY_STABLE_OBSERVATIONS:-3} \
+  --poll_interval ${WAIT_FOR_READY_POLL_INTERVAL:-1} \
+  --max_poll_interval ${WAIT_FOR_READY_MAX_POLL_INTERVAL:-8}
 
 tester_manifest="/data/tester.yaml"
 if [[ -e "$tester_manifest" ]]; then
   cat $tester_manifest
 
-  run_tester.py \
+  /bin/multicall.py run_tester.py \
     --namespace $NAMESPACE \
     --manifest $tester_manifest \
     --timeout ${TESTER_TIMEOUT:-300} \
+    --parallelism ${TESTER_PARALLELISM:-0} \
     | awk '{print "SMOKE_TEST "$0}'
 else
   echo "SMOKE_TEST No tester manifest found at $tester_manifest."
@@ -14,26 +14,28 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import yaml
-import copy
-
 from argparse import ArgumentParser
-from yaml_util import load_resources_yaml
+from resources import copy_resource_metadata
+from resources import ManifestPipeline
+from yaml_util import dump_resources_yaml
+from yaml_util import iter_resources
 
 _K8S_APP_LABEL_KEY = 'app.kubernetes.io/name'
 
 
 def ensure_resource_has_app_label(resource, app_name):
-  res = copy.deepcopy(resource)
-  metadata = res.get('metadata', {})
-  res['metadata'] = metadata
-  labels = metadata.get('labels', {})
-  metadata['labels'] = labels
+  res = copy_resource_metadata(resource)
+  labels = res['metadata'].setdefault('labels', {})
   if not _K8S_APP_LABEL_KEY in labels.keys():
     labels[_K8S_APP_LABEL_KEY] = app_name
   return res
 
 
+def add_app_label_stage(pipeline, app_name):
+  """Adds a stage ensuring that each resource has the app label."""
+  return pipeline.map(lambda r: ensure_resource_has_app_label(r, app_name))
+
+
 def main():
   parser = ArgumentParser()
   parser.add_argument(
@@ -49,10 +51,9 @@ def main():
   args = parser.parse_args()
   manifest = args.manifest
   app_name = args.application_name
-  resources = load_resources_yaml(manifest)
-  resources = [ensure_resource_has_app_label(r, app_name) for r in resources]
-  with open(manifest, "w", encoding='utf-8') as out:
-    yaml.dump_all(resources, out, default_flow_style=False, explicit_start=True)
+  pipeline = add_app_label_stage(ManifestPipeline(), app_name)
+  dump_resources_yaml(
+      pipeline.stream(iter_resources(manifest)), manifest, explicit_start=True)
 
 
 if __name__ == "__main__":
@@ -19,11 +19,10 @@ import json
 import os
 from argparse import ArgumentParser
 
-import yaml
-
 import config_helper
 import property_generator
 import schema_values_common
+import yaml_codec
 
 _PROG_HELP = """
 Modifies the configuration parameter files in a directory
@@ -75,6 +74,12 @@ def expand(values_dict, schema, app_uid=''):
     if k not in valid_property_names:
       raise InvalidProperty('No such property defined in schema: {}'.format(k))
 
+  # Passwords and certificates are generated while the other properties are
+  # expanded.
+  generating = property_generator.generate_in_background(
+      prop for k, prop in schema.properties.items()
+      if values_dict.get(k, None) is None)
+
   # Captures the final property name-value mappings.
   # This has both properties directly specified under schema's `properties` and
   # generated properties. See below for details about generated properties.
@@ -97,11 +102,11 @@ def expand(values_dict, schema, app_uid=''):
     # thus is eligible for auto-generation.
     if v is None:
       if prop.password:
-        v = property_generator.generate_password(prop.password)
+        v = generating[k].result()
       elif prop.application_uid:
         v = app_uid or ''
       elif prop.tls_certificate:
-        v = property_generator.generate_tls_certificate()
+        v = generating[k].result()
       elif prop.xtype == config_helper.XTYPE_ISTIO_ENABLED:
         # For backward compatibility.
         v = False
@@ -261,7 +266,7 @@ def write_values(values, values_file):
   if not os.path.exists(os.path.dirname(values_file)):
     os.makedirs(os.path.dirname(values_file))
   with open(values_file, 'w', encoding='utf-8') as f:
-    data = yaml.safe_dump(values, default_flow_style=False, indent=2)
+    data = yaml_codec.safe_dump(values, default_flow_style=False, indent=2)
     f.write(data)
 
 
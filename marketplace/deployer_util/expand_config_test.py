@@ -18,9 +18,11 @@ import re
 import OpenSSL
 import tempfile
 import unittest
+from unittest import mock
 
 import config_helper
 import expand_config
+import property_generator
 
 
 class ExpandConfigTest(unittest.TestCase):
@@ -191,6 +193,51 @@ class ExpandConfigTest(unittest.TestCase):
         's1.encoded': b'dGVzdA==',
     }, result)
 
+  def test_generate_several_certificates_and_passwords(self):
+    schema = config_helper.Schema.load_yaml("""
+        applicationApiVersion: v1beta1
+        properties:
+          c1:
+            type: string
+            x-google-marketplace:
+              type: TLS_CERTIFICATE
+          c2:
+            type: string
+            x-google-marketplace:
+              type: TLS_CERTIFICATE
+          c3:
+            type: string
+            x-google-marketplace:
+              type: TLS_CERTIFICATE
+          pw1:
+            type: string
+            x-google-marketplace:
+              type: GENERATED_PASSWORD
+              generatedPassword:
+                length: 12
+                base64: false
+          pw2:
+            type: string
+            x-google-marketplace:
+              type: GENERATED_PASSWORD
+        """)
+    with mock.patch.object(
+        property_generator,
+        'generate_tls_certificate',
+        wraps=property_generator.generate_tls_certificate) as generate:
+      result = expand_config.expand(
+          {
+              'c3': '{"private_key": "key", "certificate": "crt"}',
+              'pw2': 'explicit',
+          }, schema)
+
+    self.assertEqual(2, generate.call_count)
+    self.assertEqual('key', json.loads(result['c3'])['private_key'])
+    self.assertEqual('explicit', result['pw2'])
+    self.assertEqual(12, len(result['pw1']))
+    keys = [json.loads(result[k])['private_key'] for k in ['c1', 'c2']]
+    self.assertNotEqual(keys[0], keys[1])
+
   def test_generate_certificate(self):
     schema = config_helper.Schema.load_yaml("""
         applicationApiVersion: v1beta1
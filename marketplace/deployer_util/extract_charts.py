@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+#
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import os
+import shutil
+import tarfile
+import tempfile
+from argparse import ArgumentParser
+
+import log_util as log
+
+_PROG_HELP = """
+Extracts each chart .tar.gz in a folder into <dest>/<chart name>. Extracted
+trees are cached by the sha256 of the tarball, so a chart that has already
+been extracted (for example at image build time) is hardlinked from the
+cache instead of being decompressed again.
+"""
+
+_CHART_SUFFIX = '.tar.gz'
+
+
+def main():
+  parser = ArgumentParser(description=_PROG_HELP)
+  parser.add_argument(
+      '--chart_dir',
+      help='The folder containing the chart .tar.gz files',
+      required=True)
+  parser.add_argument(
+      '--dest',
+      help='The folder to extract the charts into. If not set, the charts '
+      'are only added to the cache.')
+  parser.add_argument(
+      '--cache_dir',
+      help='The folder caching the extracted charts',
+      default='/data/chart-cache')
+  args = parser.parse_args()
+
+  for chart in list_charts(args.chart_dir):
+    tree = cached_tree(chart, args.cache_dir)
+    if args.dest:
+      name = os.path.basename(chart)[:-len(_CHART_SUFFIX)]
+      link_tree(tree, os.path.join(args.dest, name))
+
+
+def list_charts(chart_dir):
+  """Returns the chart tarballs in chart_dir, sorted by name."""
+  if not os.path.isdir(chart_dir):
+    return []
+  return [
+      os.path.join(chart_dir, name)
+      for name in sorted(os.listdir(chart_dir))
+      if name.endswith(_CHART_SUFFIX) and
+      os.path.isfile(os.path.join(chart_dir, name))
+  ]
+
+
+def chart_digest(chart):
+  """Returns the hex sha256 of the chart tarball."""
+  digest = hashlib.sha256()
+  with open(chart, 'rb') as f:
+    for block in iter(lambda: f.read(1 << 20), b''):
+      digest.update(block)
+  return digest.hexdigest()
+
+
+def cached_tree(chart, cache_dir):
+  """Returns the folder holding the extracted chart, extracting it if needed.
+
+  The tree is extracted next to its final location and renamed into place,
+  so a concurrent or interrupted extraction never leaves a partial entry."""
+  tree = os.path.join(cache_dir, chart_digest(chart))
+  if os.path.isdir(tree):
+    log.info("Using cached extraction of {}", chart)
+    return tree
+
+  log.info("Extracting {}", chart)
+  os.makedirs(cache_dir, exist_ok=True)
+  tmp_tree = tempfile.mkdtemp(dir=cache_dir, prefix='.tmp-')
+  try:
+    extract(chart, tmp_tree)
+    os.rename(tmp_tree, tree)
+  except OSError:
+    shutil.rmtree(tmp_tree, ignore_errors=True)
+    if not os.path.isdir(tree):
+      raise
+    # Another process extracted the same chart first.
+  return tree
+
+
+def extract(chart, dest):
+  with tarfile.open(chart, 'r:*') as tar:
+    if hasattr(tarfile, 'data_filter'):
+      # Rejects absolute paths, links outside of dest and device files.
+      tar.extractall(dest, filter='data')
+    else:
+      tar.extractall(dest)
+
+
+def link_tree(src, dest):
+  """Recreates the src tree in dest with hardlinks to the src files.
+
+  Files are copied where hardlinks are not possible, such as across
+  filesystems. The linked files must be replaced rather than modified in
+  place, so that the cached tree stays intact."""
+  shutil.copytree(src, dest, symlinks=True, copy_function=_link_or_copy)
+
+
+def _link_or_copy(src, dest):
+  try:
+    os.link(src, dest)
+  except OSError:
+    shutil.copy2(src, dest)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,122 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+from unittest import mock
+
+import extract_charts
+from extract_charts import cached_tree
+from extract_charts import link_tree
+from extract_charts import list_charts
+from yaml_util import load_yaml
+from yaml_util import overlay_yaml_file
+
+
+def _add_file(tar, name, content):
+  data = content.encode('utf-8')
+  info = tarfile.TarInfo(name)
+  info.size = len(data)
+  tar.addfile(info, io.BytesIO(data))
+
+
+class ExtractChartsTest(unittest.TestCase):
+
+  def setUp(self):
+    tmpdir = tempfile.TemporaryDirectory()
+    self.addCleanup(tmpdir.cleanup)
+    self.tmpdir = tmpdir.name
+    self.chart_dir = os.path.join(self.tmpdir, 'chart')
+    self.cache_dir = os.path.join(self.tmpdir, 'cache')
+    os.makedirs(self.chart_dir)
+
+  def make_chart(self, name, files):
+    chart = os.path.join(self.chart_dir, name + '.tar.gz')
+    with tarfile.open(chart, 'w:gz') as tar:
+      for filename, content in files.items():
+        _add_file(tar, filename, content)
+    return chart
+
+  def test_list_charts(self):
+    self.make_chart('b', {})
+    self.make_chart('a', {})
+    with open(os.path.join(self.chart_dir, 'README'), 'w'):
+      pass
+    self.assertEqual([
+        os.path.join(self.chart_dir, 'a.tar.gz'),
+        os.path.join(self.chart_dir, 'b.tar.gz')
+    ], list_charts(self.chart_dir))
+    self.assertEqual([], list_charts(os.path.join(self.tmpdir, 'missing')))
+
+  def test_chart_is_extracted_once(self):
+    chart = self.make_chart('app', {'chart/values.yaml': 'a: 1\n'})
+    tree = cached_tree(chart, self.cache_dir)
+    with open(os.path.join(tree, 'chart', 'values.yaml')) as f:
+      self.assertEqual('a: 1\n', f.read())
+
+    with mock.patch.object(extract_charts, 'extract') as extract:
+      self.assertEqual(tree, cached_tree(chart, self.cache_dir))
+    extract.assert_not_called()
+
+  def test_changed_chart_gets_a_new_entry(self):
+    chart = self.make_chart('app', {'chart/values.yaml': 'a: 1\n'})
+    first = cached_tree(chart, self.cache_dir)
+    chart = self.make_chart('app', {'chart/values.yaml': 'a: 2\n'})
+    second = cached_tree(chart, self.cache_dir)
+    self.assertNotEqual(first, second)
+    with open(os.path.join(second, 'chart', 'values.yaml')) as f:
+      self.assertEqual('a: 2\n', f.read())
+
+  def test_failed_extraction_leaves_no_entry(self):
+    chart = self.make_chart('app', {'chart/values.yaml': 'a: 1\n'})
+    with mock.patch.object(
+        extract_charts, 'extract', side_effect=OSError('disk full')):
+      with self.assertRaises(OSError):
+        cached_tree(chart, self.cache_dir)
+    self.assertEqual([], os.listdir(self.cache_dir))
+
+  @unittest.skipUnless(
+      hasattr(tarfile, 'data_filter'), 'tarfile has no extraction filters')
+  def test_paths_outside_of_the_tree_are_rejected(self):
+    chart = self.make_chart('evil', {'../evil.yaml': 'a: 1\n'})
+    with self.assertRaises(tarfile.TarError):
+      cached_tree(chart, self.cache_dir)
+    self.assertFalse(os.path.exists(os.path.join(self.tmpdir, 'evil.yaml')))
+
+  def test_linked_tree_overlay_keeps_cache_intact(self):
+    chart = self.make_chart(
+        'app', {
+            'chart/values.yaml': 'a: 1\nb: 1\n',
+            'chart/templates/cm.yaml': 'kind: ConfigMap\n',
+        })
+    tree = cached_tree(chart, self.cache_dir)
+    dest = os.path.join(self.tmpdir, 'extracted', 'app')
+    link_tree(tree, dest)
+
+    cached_values = os.path.join(tree, 'chart', 'values.yaml')
+    values = os.path.join(dest, 'chart', 'values.yaml')
+    self.assertTrue(os.path.samefile(cached_values, values))
+    self.assertTrue(
+        os.path.exists(os.path.join(dest, 'chart', 'templates', 'cm.yaml')))
+
+    test_values = os.path.join(self.tmpdir, 'test-values.yaml')
+    with open(test_values, 'w') as f:
+      f.write('b: 2\n')
+    overlay_yaml_file(test_values, values)
+
+    self.assertEqual({'a': 1, 'b': 2}, load_yaml(values))
+    self.assertEqual({'a': 1, 'b': 1}, load_yaml(cached_values))
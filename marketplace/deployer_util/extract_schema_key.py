@@ -40,9 +40,9 @@ def main():
       required=True)
   args = parser.parse_args()
 
-  schema = config_helper.Schema.load_yaml_file(args.schema_file)
+  schema = config_helper.Schema.load_yaml_file(args.schema_file, lazy=True)
   sys.stdout.write('\n'.join(
-      [k for k, v in schema.properties.items() if v.xtype == args.type]))
+      [p.name for p in schema.properties_with_xtype(args.type)]))
 
 
 if __name__ == "__main__":
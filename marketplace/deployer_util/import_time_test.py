@@ -0,0 +1,155 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Enforces the import time budget of each tool.
+
+Each tool is imported with `python -X importtime` from compiled bytecode, as
+in the deployer images, and must not import the expensive LAZY_MODULES.
+
+Wall clock budgets depend on the machine and its load, so they are only
+checked when DEPLOYER_IMPORT_BUDGET_SCALE is set; it scales all of them, e.g.
+DEPLOYER_IMPORT_BUDGET_SCALE=1 on an idle machine. The test target
+(tests/py/runtests.sh) sets it to 3 unless it is already set.
+"""
+
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import unittest
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+BUDGET_SCALE_ENV = 'DEPLOYER_IMPORT_BUDGET_SCALE'
+
+# The import time budget of each tool, in milliseconds.
+IMPORT_BUDGETS_MS = {
+    'compile_schema': 60,
+    'config_env': 80,
+    'deploy_pipeline': 100,
+    'ensure_k8s_apps_labels': 60,
+    'expand_config': 70,
+    'extract_charts': 60,
+    'extract_schema_key': 60,
+    'make_dns1123_name': 50,
+    'multicall': 50,
+    'overlay_test_files': 60,
+    'overlay_test_schema': 60,
+    'print_app_api_version': 60,
+    'print_app_identity': 130,
+    'print_config': 70,
+    'print_published_version': 60,
+    'print_version_metadata': 100,
+    'process_helm_hooks': 60,
+    'provision': 80,
+    'render_helm_charts': 110,
+    'render_manifests': 70,
+    'run_tester': 130,
+    'separate_tester_resources': 60,
+    'set_app_labels': 60,
+    'set_ownership': 60,
+    'setassemblyphase': 60,
+    'validate_app_resource': 60,
+    'validate_schema': 60,
+    'wait_for_ready': 130,
+}
+
+# Expensive modules which are only imported by the code paths using them.
+LAZY_MODULES = ['OpenSSL', 'asyncio', 'yaml']
+
+_MAIN_RE = re.compile(r'^if __name__ == [\'"]__main__[\'"]:', re.MULTILINE)
+_IMPORT_TIME_RE = re.compile(r'^import time:\s*(\d+) \|\s*(\d+) \| (\s*)(\S+)$')
+
+
+def list_tools():
+  """Returns the modules of the executable tools, sorted by name."""
+  tools = []
+  for filename in sorted(os.listdir(TOOLS_DIR)):
+    name, ext = os.path.splitext(filename)
+    if ext != '.py' or name.endswith('_test'):
+      continue
+    with open(os.path.join(TOOLS_DIR, filename), encoding='utf-8') as f:
+      if _MAIN_RE.search(f.read()):
+        tools.append(name)
+  return tools
+
+
+def measure_import(module, pycache_dir):
+  """Imports module in a new interpreter.
+
+  Returns the import time in microseconds and the set of imported modules."""
+  env = dict(os.environ)
+  env.pop('PYTHONDONTWRITEBYTECODE', None)
+  result = subprocess.run([
+      sys.executable, '-X', 'importtime', '-X',
+      'pycache_prefix={}'.format(pycache_dir), '-c', 'import ' + module
+  ],
+                          cwd=TOOLS_DIR,
+                          env=env,
+                          stdout=subprocess.DEVNULL,
+                          stderr=subprocess.PIPE,
+                          encoding='utf-8',
+                          check=True)
+  cumulative = None
+  modules = set()
+  for line in result.stderr.splitlines():
+    match = _IMPORT_TIME_RE.match(line)
+    if not match:
+      continue
+    modules.add(match.group(4))
+    if match.group(4) == module and not match.group(3):
+      cumulative = int(match.group(2))
+  return cumulative, modules
+
+
+class ImportTimeTest(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    cls._pycache = tempfile.TemporaryDirectory()
+    cls.measurements = {}
+    for tool in list_tools():
+      # The first import compiles the bytecode.
+      measure_import(tool, cls._pycache.name)
+      runs = [measure_import(tool, cls._pycache.name) for _ in range(2)]
+      cls.measurements[tool] = (min(run[0] for run in runs), runs[0][1])
+
+  @classmethod
+  def tearDownClass(cls):
+    cls._pycache.cleanup()
+
+  def test_every_tool_has_a_budget(self):
+    self.assertEqual(sorted(IMPORT_BUDGETS_MS), sorted(self.measurements))
+
+  @unittest.skipUnless(
+      os.environ.get(BUDGET_SCALE_ENV),
+      '{} is not set'.format(BUDGET_SCALE_ENV))
+  def test_tools_import_within_budget(self):
+    scale = float(os.environ[BUDGET_SCALE_ENV])
+    over_budget = {
+        tool:
+            '{:.1f}ms > {}ms'.format(micros / 1000.0,
+                                     IMPORT_BUDGETS_MS[tool] * scale)
+        for tool, (micros, _) in self.measurements.items()
+        if tool in IMPORT_BUDGETS_MS and micros > IMPORT_BUDGETS_MS[tool] *
+        scale * 1000
+    }
+    self.assertEqual({}, over_budget)
+
+  def test_expensive_modules_are_imported_lazily(self):
+    eager = {
+        tool: sorted(set(LAZY_MODULES) & modules)
+        for tool, (_, modules) in self.measurements.items()
+        if set(LAZY_MODULES) & modules
+    }
+    self.assertEqual({}, eager)
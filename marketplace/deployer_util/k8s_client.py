@@ -0,0 +1,469 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Small in-process client for the Kubernetes API.
+
+Inside a cluster, requests go straight to the API server over kept-alive
+connections, authenticated with the pod's service account token. Outside a
+cluster, or when DEPLOYER_K8S_BACKEND=kubectl, the same operations are run
+through kubectl instead.
+
+Resources are named like on the kubectl command line, e.g. "Pod", "pods",
+"deployments.apps" or "applications.app.k8s.io". get() also accepts a
+comma-separated list of resource types, like `kubectl get`.
+"""
+
+import http.client
+import json
+import os
+import select
+import ssl
+import subprocess
+import threading
+import urllib.parse
+
+from bash_util import CommandException
+from bash_util import run_many
+
+BACKEND_ENV = 'DEPLOYER_K8S_BACKEND'
+BACKEND_API = 'api'
+BACKEND_KUBECTL = 'kubectl'
+
+SERVICE_ACCOUNT_DIR = '/var/run/secrets/kubernetes.io/serviceaccount'
+
+FIELD_MANAGER = 'marketplace-deployer'
+
+# Seconds to wait for the API server to accept a connection or to send data.
+DEFAULT_TIMEOUT = 60
+
+# Methods which may be sent again when the connection fails.
+_IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'PUT', 'DELETE'])
+
+PATCH_JSON = 'json'
+PATCH_MERGE = 'merge'
+PATCH_STRATEGIC = 'strategic'
+_PATCH_CONTENT_TYPES = {
+    PATCH_JSON: 'application/json-patch+json',
+    PATCH_MERGE: 'application/merge-patch+json',
+    PATCH_STRATEGIC: 'application/strategic-merge-patch+json',
+}
+# JSON is valid YAML, so server-side apply bodies are sent as JSON.
+_APPLY_CONTENT_TYPE = 'application/apply-patch+yaml'
+
+# Same message as kubectl, so that callers can handle both backends alike.
+_UNKNOWN_RESOURCE_MESSAGE = "the server doesn't have a resource type \"{}\""
+
+
+class ApiException(Exception):
+  """A failed request. status is the HTTP status, or None with kubectl."""
+
+  def __init__(self, status, message):
+    self._status = status
+    super(ApiException, self).__init__(message)
+
+  @property
+  def status(self):
+    return self._status
+
+
+def new_client():
+  """Returns an API client when running in a cluster, a kubectl one otherwise.
+
+  The DEPLOYER_K8S_BACKEND environment variable forces either backend."""
+  backend = os.environ.get(BACKEND_ENV)
+  if backend == BACKEND_API or (backend != BACKEND_KUBECTL and
+                                ApiClient.in_cluster_available()):
+    return ApiClient.in_cluster()
+  return KubectlClient()
+
+
+class ApiClient:
+  """Talks to the API server directly, reusing its connections."""
+
+  def __init__(self,
+               server,
+               token_file=None,
+               ca_file=None,
+               timeout=DEFAULT_TIMEOUT):
+    url = urllib.parse.urlsplit(server)
+    self._timeout = timeout
+    self._https = url.scheme == 'https'
+    self._netloc = url.netloc
+    self._ssl_context = (
+        ssl.create_default_context(cafile=ca_file) if self._https else None)
+    self._token = _Token(token_file)
+    self._idle_connections = []
+    self._lock = threading.Lock()
+    self._discovery = _Discovery(self)
+
+  @staticmethod
+  def in_cluster_available():
+    return bool(
+        os.environ.get('KUBERNETES_SERVICE_HOST') and
+        os.path.exists(os.path.join(SERVICE_ACCOUNT_DIR, 'token')))
+
+  @classmethod
+  def in_cluster(cls):
+    """Returns a client using the pod's service account."""
+    host = os.environ['KUBERNETES_SERVICE_HOST']
+    if ':' in host:
+      host = '[{}]'.format(host)
+    port = os.environ.get('KUBERNETES_SERVICE_PORT', '443')
+    return cls(
+        'https://{}:{}'.format(host, port),
+        token_file=os.path.join(SERVICE_ACCOUNT_DIR, 'token'),
+        ca_file=os.path.join(SERVICE_ACCOUNT_DIR, 'ca.crt'))
+
+  def get(self, resource, name=None, namespace=None, selector=None):
+    """Returns a resource, or a List of resources if name is not set."""
+    if ',' in resource:
+      if name:
+        raise ValueError('name requires a single resource type')
+      items = []
+      for single_resource in resource.split(','):
+        items.extend(
+            self.get(single_resource, namespace=namespace,
+                     selector=selector)['items'])
+      return {'apiVersion': 'v1', 'kind': 'List', 'items': items}
+
+    info = self._discovery.resolve(resource)
+    query = {'labelSelector': selector} if selector else None
+    result = self.request('GET', info.path(namespace, name), query=query)
+    if name is None:
+      # Like kubectl, fill in the type of each item of the list.
+      for item in result.get('items', []):
+        item.setdefault('apiVersion', info.group_version)
+        item.setdefault('kind', info.kind)
+    return result
+
+  def get_many(self, queries):
+    """Returns the results of get() for each tuple of arguments in queries.
+
+    The requests share the kept-alive connections, so they are sent in turn."""
+    return [self.get(*query) for query in queries]
+
+  def create(self, body, namespace=None):
+    info = self._discovery.resolve_kind(body['apiVersion'], body['kind'])
+    namespace = namespace or body.get('metadata', {}).get('namespace')
+    return self.request('POST', info.path(namespace), body=body)
+
+  def apply(self, body, namespace=None, field_manager=FIELD_MANAGER):
+    """Server-side applies the resource."""
+    info = self._discovery.resolve_kind(body['apiVersion'], body['kind'])
+    namespace = namespace or body.get('metadata', {}).get('namespace')
+    return self.request(
+        'PATCH',
+        info.path(namespace, body['metadata']['name']),
+        body=body,
+        content_type=_APPLY_CONTENT_TYPE,
+        query={
+            'fieldManager': field_manager,
+            'force': 'true'
+        })
+
+  def patch(self, resource, name, body, namespace=None, patch_type=PATCH_MERGE):
+    info = self._discovery.resolve(resource)
+    return self.request(
+        'PATCH',
+        info.path(namespace, name),
+        body=body,
+        content_type=_PATCH_CONTENT_TYPES[patch_type])
+
+  def delete(self, resource, name, namespace=None):
+    info = self._discovery.resolve(resource)
+    return self.request('DELETE', info.path(namespace, name))
+
+  def request(self,
+              method,
+              path,
+              body=None,
+              content_type='application/json',
+              query=None):
+    """Sends a request and returns its decoded JSON response."""
+    if query:
+      path += '?' + urllib.parse.urlencode(query)
+    headers = {'Accept': 'application/json'}
+    token = self._token.get()
+    if token:
+      headers['Authorization'] = 'Bearer {}'.format(token)
+    data = None
+    if body is not None:
+      data = json.dumps(body).encode('utf-8')
+      headers['Content-Type'] = content_type
+
+    while True:
+      connection, reused = self._acquire()
+      sent = False
+      try:
+        connection.request(method, path, body=data, headers=headers)
+        sent = True
+        response = connection.getresponse()
+        payload = response.read()
+      except (http.client.HTTPException, OSError) as e:
+        connection.close()
+        # The server may have closed an idle kept-alive connection; retry
+        # with another one, unless the server may have processed the request.
+        if (reused and not isinstance(e, TimeoutError) and
+            (not sent or method in _IDEMPOTENT_METHODS)):
+          continue
+        raise
+      break
+
+    if response.will_close:
+      connection.close()
+    else:
+      self._release(connection)
+
+    if response.status >= 400:
+      raise ApiException(response.status, _error_message(payload))
+    return json.loads(payload) if payload else None
+
+  def _acquire(self):
+    while True:
+      with self._lock:
+        if not self._idle_connections:
+          break
+        connection = self._idle_connections.pop()
+      if not _is_dropped(connection):
+        return connection, True
+      connection.close()
+    if self._https:
+      connection = http.client.HTTPSConnection(
+          self._netloc, timeout=self._timeout, context=self._ssl_context)
+    else:
+      connection = http.client.HTTPConnection(
+          self._netloc, timeout=self._timeout)
+    return connection, False
+
+  def _release(self, connection):
+    with self._lock:
+      self._idle_connections.append(connection)
+
+  def close(self):
+    with self._lock:
+      connections, self._idle_connections = self._idle_connections, []
+    for connection in connections:
+      connection.close()
+
+
+def _is_dropped(connection):
+  """Returns whether the server has closed an idle connection.
+
+  An idle connection has nothing to read unless it has been closed."""
+  if connection.sock is None:
+    return True
+  try:
+    readable, _, _ = select.select([connection.sock], [], [], 0)
+  except (OSError, ValueError):
+    return True
+  return bool(readable)
+
+
+def _error_message(payload):
+  try:
+    return json.loads(payload)['message']
+  except (ValueError, KeyError, TypeError):
+    return payload.decode('utf-8', errors='replace')
+
+
+class _Token:
+  """The bearer token, read again whenever its file is rotated."""
+
+  def __init__(self, token_file):
+    self._token_file = token_file
+    self._mtime = None
+    self._token = None
+
+  def get(self):
+    if not self._token_file:
+      return None
+    mtime = os.stat(self._token_file).st_mtime
+    if mtime != self._mtime:
+      with open(self._token_file, 'r', encoding='utf-8') as f:
+        self._token = f.read().strip()
+      self._mtime = mtime
+    return self._token
+
+
+class _ResourceInfo:
+
+  def __init__(self, group_version, resource):
+    self.group_version = group_version
+    self.plural = resource['name']
+    self.kind = resource['kind']
+    self.namespaced = resource['namespaced']
+    self._names = set([
+        self.plural,
+        self.kind.lower(),
+        resource.get('singularName') or self.kind.lower(),
+    ] + resource.get('shortNames', []))
+
+  def matches(self, name):
+    return name.lower() in self._names
+
+  def path(self, namespace=None, name=None):
+    if self.group_version == 'v1':
+      path = '/api/v1'
+    else:
+      path = '/apis/{}'.format(self.group_version)
+    if self.namespaced and namespace:
+      path += '/namespaces/{}'.format(urllib.parse.quote(namespace, safe=''))
+    path += '/{}'.format(self.plural)
+    if name:
+      path += '/{}'.format(urllib.parse.quote(name, safe=''))
+    return path
+
+
+class _Discovery:
+  """Maps resource names to API paths. Discovery documents are cached."""
+
+  def __init__(self, client):
+    self._client = client
+    self._lock = threading.Lock()
+    self._preferred_versions = None
+    self._resources = {}
+
+  def resolve(self, resource):
+    """Resolves a kubectl style resource name, e.g. "deployments.apps"."""
+    name, _, group = resource.partition('.')
+    with self._lock:
+      if group:
+        candidates = self._group_candidates(group)
+      else:
+        candidates = ['v1'] + list(self._groups().values())
+      for group_version in candidates:
+        for info in self._group_version_resources(group_version):
+          if info.matches(name):
+            return info
+    raise ApiException(404, _UNKNOWN_RESOURCE_MESSAGE.format(resource))
+
+  def resolve_kind(self, api_version, kind):
+    with self._lock:
+      for info in self._group_version_resources(api_version):
+        if info.kind == kind:
+          return info
+    raise ApiException(
+        404, _UNKNOWN_RESOURCE_MESSAGE.format('{}/{}'.format(api_version,
+                                                             kind)))
+
+  def _group_candidates(self, group):
+    groups = self._groups()
+    if group in groups:
+      return [groups[group]]
+    # e.g. "deployments.v1.apps".
+    version, _, group = group.partition('.')
+    if group in groups:
+      return ['{}/{}'.format(group, version)]
+    return []
+
+  def _groups(self):
+    """Returns the preferred group version of each API group."""
+    if self._preferred_versions is None:
+      groups = self._client.request('GET', '/apis')['groups']
+      self._preferred_versions = {
+          group['name']: group['preferredVersion']['groupVersion']
+          for group in groups
+      }
+    return self._preferred_versions
+
+  def _group_version_resources(self, group_version):
+    if group_version not in self._resources:
+      path = '/api/v1' if group_version == 'v1' else '/apis/' + group_version
+      try:
+        resource_list = self._client.request('GET', path)
+      except ApiException as e:
+        if e.status != 404:
+          raise
+        resource_list = {}
+      self._resources[group_version] = [
+          _ResourceInfo(group_version, resource)
+          for resource in resource_list.get('resources', [])
+          if '/' not in resource['name']
+      ]
+    return self._resources[group_version]
+
+
+class KubectlClient:
+  """Runs the same operations as ApiClient through kubectl."""
+
+  def __init__(self, binary=('kubectl',)):
+    self._binary = list(binary)
+
+  def get(self, resource, name=None, namespace=None, selector=None):
+    return self._run_json(_get_args(resource, name, selector), namespace)
+
+  def get_many(self, queries):
+    """Runs one kubectl get per query, in parallel.
+
+    Each query is a tuple of get() arguments. Returns the results in the
+    order of queries."""
+
+    def _get_command(resource, name=None, namespace=None, selector=None):
+      return self._command(
+          _get_args(resource, name, selector) + ['--output=json'], namespace)
+
+    commands = [_get_command(*query) for query in queries]
+    try:
+      return [command.json() for command in run_many(commands)]
+    except CommandException as e:
+      raise ApiException(None, str(e).strip()) from e
+
+  def create(self, body, namespace=None):
+    return self._run_json(['create', '--filename=-'], namespace, body)
+
+  def apply(self, body, namespace=None, field_manager=FIELD_MANAGER):
+    return self._run_json([
+        'apply', '--server-side', '--force-conflicts',
+        '--field-manager={}'.format(field_manager), '--filename=-'
+    ], namespace, body)
+
+  def patch(self, resource, name, body, namespace=None, patch_type=PATCH_MERGE):
+    return self._run_json([
+        'patch', resource, name, '--type={}'.format(patch_type),
+        '--patch={}'.format(json.dumps(body))
+    ], namespace)
+
+  def delete(self, resource, name, namespace=None):
+    self._run(['delete', resource, name], namespace)
+
+  def close(self):
+    pass
+
+  def _run_json(self, args, namespace, body=None):
+    return json.loads(self._run(args + ['--output=json'], namespace, body))
+
+  def _run(self, args, namespace, body=None):
+    process = subprocess.run(
+        self._command(args, namespace),
+        input=None if body is None else json.dumps(body),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        encoding='utf-8')
+    if process.returncode != 0:
+      raise ApiException(None, process.stderr.strip())
+    return process.stdout
+
+  def _command(self, args, namespace):
+    command = self._binary + args
+    if namespace:
+      command.append('--namespace={}'.format(namespace))
+    return command
+
+
+def _get_args(resource, name, selector):
+  args = ['get', resource]
+  if name:
+    args.append(name)
+  if selector:
+    args.append('--selector={}'.format(selector))
+  return args
@@ -0,0 +1,455 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import http.client
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import urllib.parse
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from unittest import mock
+
+import k8s_client
+from k8s_client import ApiClient
+from k8s_client import ApiException
+from k8s_client import KubectlClient
+
+DISCOVERY = {
+    '/api/v1': {
+        'resources': [{
+            'name': 'pods',
+            'singularName': '',
+            'namespaced': True,
+            'kind': 'Pod',
+            'shortNames': ['po'],
+        }, {
+            'name': 'pods/log',
+            'namespaced': True,
+            'kind': 'Pod',
+        }, {
+            'name': 'namespaces',
+            'singularName': '',
+            'namespaced': False,
+            'kind': 'Namespace',
+            'shortNames': ['ns'],
+        }]
+    },
+    '/apis': {
+        'groups': [{
+            'name': 'apps',
+            'preferredVersion': {
+                'groupVersion': 'apps/v1'
+            },
+        }, {
+            'name': 'app.k8s.io',
+            'preferredVersion': {
+                'groupVersion': 'app.k8s.io/v1beta1'
+            },
+        }]
+    },
+    '/apis/apps/v1': {
+        'resources': [{
+            'name': 'deployments',
+            'singularName': 'deployment',
+            'namespaced': True,
+            'kind': 'Deployment',
+        }]
+    },
+    '/apis/app.k8s.io/v1beta1': {
+        'resources': [{
+            'name': 'applications',
+            'singularName': 'application',
+            'namespaced': True,
+            'kind': 'Application',
+        }]
+    },
+}
+
+
+class FakeApiServer(ThreadingHTTPServer):
+  """A local stand-in for the Kubernetes API server.
+
+  Objects are stored by path. Every request is recorded with the client
+  address it came from."""
+
+  daemon_threads = True
+
+  def __init__(self):
+    super(FakeApiServer, self).__init__(('127.0.0.1', 0), _Handler)
+    self.objects = {}
+    self.requests = []
+    self.close_after_response = False
+    self._thread = threading.Thread(
+        target=self.serve_forever, args=(0.01,), daemon=True)
+    self._thread.start()
+
+  @property
+  def url(self):
+    return 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+  def stop(self):
+    self.shutdown()
+    self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+
+  def log_message(self, *args):
+    pass
+
+  def do_GET(self):
+    url = urllib.parse.urlsplit(self.path)
+    if url.path in DISCOVERY:
+      return self._reply(200, DISCOVERY[url.path])
+    if url.path in self.server.objects:
+      return self._reply(200, self.server.objects[url.path])
+    items = [
+        obj for path, obj in sorted(self.server.objects.items())
+        if path.rsplit('/', 1)[0] == url.path and
+        _matches(obj, urllib.parse.parse_qs(url.query))
+    ]
+    if items or url.path.endswith('s'):
+      return self._reply(200, {'kind': 'List', 'items': items})
+    self._reply(404, {'message': 'not found'})
+
+  def do_POST(self):
+    body = self._body()
+    path = '{}/{}'.format(self.path, body['metadata']['name'])
+    self.server.objects[path] = body
+    self._reply(201, body)
+
+  def do_PATCH(self):
+    path = urllib.parse.urlsplit(self.path).path
+    self.server.objects[path] = self._body()
+    self._reply(200, self.server.objects[path])
+
+  def do_DELETE(self):
+    self._reply(200, self.server.objects.pop(self.path))
+
+  def _body(self):
+    length = int(self.headers['Content-Length'])
+    return json.loads(self.rfile.read(length))
+
+  def _reply(self, status, body):
+    self.server.requests.append({
+        'method': self.command,
+        'path': self.path,
+        'headers': dict(self.headers),
+        'client': self.client_address,
+    })
+    payload = json.dumps(body).encode('utf-8')
+    self.send_response(status)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(payload)))
+    self.end_headers()
+    self.wfile.write(payload)
+    if self.server.close_after_response:
+      self.close_connection = True
+
+
+def _matches(obj, query):
+  for selector in query.get('labelSelector', []):
+    key, value = selector.split('=')
+    if obj['metadata'].get('labels', {}).get(key) != value:
+      return False
+  return True
+
+
+def _pod(name, app):
+  return {
+      'metadata': {
+          'name': name,
+          'labels': {
+              'app.kubernetes.io/name': app
+          }
+      },
+      'status': {
+          'phase': 'Running'
+      },
+  }
+
+
+class ApiClientTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = FakeApiServer()
+    self.addCleanup(self.server.stop)
+    self.client = ApiClient(self.server.url)
+    self.addCleanup(self.client.close)
+    self.server.objects['/api/v1/namespaces/ns/pods/a'] = _pod('a', 'app')
+    self.server.objects['/api/v1/namespaces/ns/pods/b'] = _pod('b', 'other')
+    self.server.objects['/apis/apps/v1/namespaces/ns/deployments/d'] = (
+        _pod('d', 'app'))
+
+  def paths(self):
+    return [r['path'] for r in self.server.requests]
+
+  def test_get(self):
+    self.assertEqual('a', self.client.get('Pod', 'a', 'ns')['metadata']['name'])
+    self.assertEqual('a', self.client.get('po', 'a', 'ns')['metadata']['name'])
+    self.assertEqual(
+        'd',
+        self.client.get('deployments.apps', 'd', 'ns')['metadata']['name'])
+
+  def test_list_with_selector_sets_item_kinds(self):
+    result = self.client.get(
+        'pods', namespace='ns', selector='app.kubernetes.io/name=app')
+    self.assertEqual(['a'], [i['metadata']['name'] for i in result['items']])
+    self.assertEqual('Pod', result['items'][0]['kind'])
+    self.assertEqual('v1', result['items'][0]['apiVersion'])
+
+  def test_list_several_kinds(self):
+    result = self.client.get(
+        'Pod,Deployment', namespace='ns', selector='app.kubernetes.io/name=app')
+    self.assertEqual(
+        [('Pod', 'a'), ('Deployment', 'd')],
+        [(i['kind'], i['metadata']['name']) for i in result['items']])
+
+  def test_unknown_resource(self):
+    with self.assertRaises(ApiException) as context:
+      self.client.get('Missing', namespace='ns')
+    self.assertIn("the server doesn't have a resource type",
+                  str(context.exception))
+
+  def test_not_found(self):
+    with self.assertRaises(ApiException) as context:
+      self.client.get('applications.app.k8s.io', 'missing', 'ns')
+    self.assertEqual(404, context.exception.status)
+    self.assertEqual('not found', str(context.exception))
+
+  def test_discovery_is_cached(self):
+    self.client.get('Deployment', 'd', 'ns')
+    self.client.get('Deployment', 'd', 'ns')
+    self.client.get('Pod', 'a', 'ns')
+    self.assertEqual(1, self.paths().count('/api/v1'))
+    self.assertEqual(1, self.paths().count('/apis/apps/v1'))
+
+  def test_connection_is_reused(self):
+    for _ in range(5):
+      self.client.get('Pod', 'a', 'ns')
+    self.assertEqual(1, len(set(r['client'] for r in self.server.requests)))
+
+  def test_closed_idle_connection_is_reopened(self):
+    self.server.close_after_response = True
+    self.client.get('Pod', 'a', 'ns')
+    self.client.get('Pod', 'a', 'ns')
+    self.assertEqual('/api/v1/namespaces/ns/pods/a', self.paths()[-1])
+
+  def test_closed_idle_connection_is_not_used_for_post(self):
+    self.server.close_after_response = True
+    self.client.get('Pod', 'a', 'ns')
+    # Give the server time to close the connection.
+    time.sleep(0.1)
+    self.client.create({
+        'apiVersion': 'v1',
+        'kind': 'Pod',
+        'metadata': {
+            'name': 'c',
+            'namespace': 'ns'
+        }
+    })
+    self.assertEqual(['GET', 'POST'],
+                     [r['method'] for r in self.server.requests[-2:]])
+
+  def test_post_is_not_sent_again_after_failure(self):
+    connection = mock.Mock()
+    connection.getresponse.side_effect = http.client.RemoteDisconnected()
+    with mock.patch.object(
+        self.client, '_acquire', return_value=(connection, True)):
+      with self.assertRaises(http.client.RemoteDisconnected):
+        self.client.request('POST', '/api/v1/namespaces/ns/pods', body={})
+    self.assertEqual(1, connection.request.call_count)
+
+  def test_get_is_sent_again_after_failure(self):
+    stale = mock.Mock()
+    stale.getresponse.side_effect = http.client.RemoteDisconnected()
+    acquire = self.client._acquire
+    connections = iter([(stale, True)])
+    with mock.patch.object(
+        self.client,
+        '_acquire',
+        side_effect=lambda: next(connections, None) or acquire()):
+      self.client.request('GET', '/api/v1/namespaces/ns/pods/a')
+    self.assertEqual(1, stale.request.call_count)
+    self.assertEqual('/api/v1/namespaces/ns/pods/a', self.paths()[-1])
+
+  def test_stalled_server_times_out(self):
+    listener = socket.socket()
+    self.addCleanup(listener.close)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    client = ApiClient(
+        'http://127.0.0.1:{}'.format(listener.getsockname()[1]), timeout=0.1)
+    self.addCleanup(client.close)
+    with self.assertRaises(TimeoutError):
+      client.request('GET', '/api/v1')
+
+  def test_create_and_delete(self):
+    body = {
+        'apiVersion': 'app.k8s.io/v1beta1',
+        'kind': 'Application',
+        'metadata': {
+            'name': 'app'
+        }
+    }
+    self.client.create(body, 'ns')
+    path = '/apis/app.k8s.io/v1beta1/namespaces/ns/applications/app'
+    self.assertEqual(body, self.server.objects[path])
+    self.client.delete('applications.app.k8s.io', 'app', 'ns')
+    self.assertNotIn(path, self.server.objects)
+
+  def test_apply_is_server_side(self):
+    body = {
+        'apiVersion': 'v1',
+        'kind': 'Pod',
+        'metadata': {
+            'name': 'a',
+            'namespace': 'ns'
+        }
+    }
+    self.client.apply(body)
+    request = self.server.requests[-1]
+    self.assertEqual('PATCH', request['method'])
+    self.assertEqual(
+        '/api/v1/namespaces/ns/pods/a?fieldManager=marketplace-deployer'
+        '&force=true', request['path'])
+    self.assertEqual('application/apply-patch+yaml',
+                     request['headers']['Content-Type'])
+
+  def test_patch(self):
+    self.client.patch(
+        'applications.app.k8s.io',
+        'app', [{
+            'op': 'add',
+            'path': '/spec',
+            'value': {}
+        }],
+        namespace='ns',
+        patch_type=k8s_client.PATCH_JSON)
+    request = self.server.requests[-1]
+    self.assertEqual('/apis/app.k8s.io/v1beta1/namespaces/ns/applications/app',
+                     request['path'])
+    self.assertEqual('application/json-patch+json',
+                     request['headers']['Content-Type'])
+
+  def test_rotated_token_is_read_again(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      token_file = os.path.join(tmpdir, 'token')
+      with open(token_file, 'w') as f:
+        f.write('first\n')
+      os.utime(token_file, (1, 1))
+      client = ApiClient(self.server.url, token_file=token_file)
+      self.addCleanup(client.close)
+      client.get('Pod', 'a', 'ns')
+      self.assertEqual('Bearer first',
+                       self.server.requests[-1]['headers']['Authorization'])
+
+      with open(token_file, 'w') as f:
+        f.write('second\n')
+      os.utime(token_file, (2, 2))
+      client.get('Pod', 'a', 'ns')
+      self.assertEqual('Bearer second',
+                       self.server.requests[-1]['headers']['Authorization'])
+
+
+# Prints its arguments and stdin as JSON, like `kubectl --output=json` would.
+ECHO_BINARY = [
+    sys.executable, '-c', 'import json, sys; print(json.dumps('
+    '{"args": sys.argv[1:], "stdin": sys.stdin.read()}))'
+]
+
+
+class KubectlClientTest(unittest.TestCase):
+
+  def test_get(self):
+    client = KubectlClient(binary=ECHO_BINARY)
+    self.assertEqual([
+        'get', 'Pod,Deployment', '--selector=a=b', '--output=json',
+        '--namespace=ns'
+    ],
+                     client.get(
+                         'Pod,Deployment', namespace='ns',
+                         selector='a=b')['args'])
+
+  def test_get_many(self):
+    client = KubectlClient(binary=ECHO_BINARY)
+    results = client.get_many([('Pod', 'a', 'ns'), ('namespaces', 'ns')])
+    self.assertEqual([
+        ['get', 'Pod', 'a', '--output=json', '--namespace=ns'],
+        ['get', 'namespaces', 'ns', '--output=json'],
+    ], [result['args'] for result in results])
+
+  def test_get_many_failure(self):
+    client = KubectlClient(
+        binary=['sh', '-c', 'echo "error: boom" >&2; exit 1', 'kubectl'])
+    with self.assertRaises(ApiException) as context:
+      client.get_many([('Pod', 'a'), ('Pod', 'b')])
+    self.assertEqual('error: boom', str(context.exception))
+
+  def test_apply(self):
+    client = KubectlClient(binary=ECHO_BINARY)
+    body = {'kind': 'Pod'}
+    result = client.apply(body)
+    self.assertEqual([
+        'apply', '--server-side', '--force-conflicts',
+        '--field-manager=marketplace-deployer', '--filename=-', '--output=json'
+    ], result['args'])
+    self.assertEqual(body, json.loads(result['stdin']))
+
+  def test_patch(self):
+    client = KubectlClient(binary=ECHO_BINARY)
+    self.assertEqual([
+        'patch', 'Pod', 'a', '--type=merge', '--patch={"a": 1}',
+        '--output=json', '--namespace=ns'
+    ],
+                     client.patch('Pod', 'a', {'a': 1}, namespace='ns')['args'])
+
+  def test_failure(self):
+    client = KubectlClient(
+        binary=['sh', '-c', 'echo "error: boom" >&2; exit 1', 'kubectl'])
+    with self.assertRaises(ApiException) as context:
+      client.get('Pod', 'a')
+    self.assertEqual('error: boom', str(context.exception))
+
+
+class NewClientTest(unittest.TestCase):
+
+  def test_kubectl_outside_of_cluster(self):
+    with mock.patch.dict(os.environ, {'KUBERNETES_SERVICE_HOST': ''}):
+      self.assertIsInstance(k8s_client.new_client(), KubectlClient)
+
+  def test_kubectl_forced_by_env(self):
+    with mock.patch.dict(os.environ, {k8s_client.BACKEND_ENV: 'kubectl'}):
+      with mock.patch.object(
+          ApiClient, 'in_cluster_available', return_value=True):
+        self.assertIsInstance(k8s_client.new_client(), KubectlClient)
+
+  def test_api_in_cluster(self):
+    with mock.patch.dict(
+        os.environ, {
+            k8s_client.BACKEND_ENV: '',
+            'KUBERNETES_SERVICE_HOST': '10.0.0.1',
+            'KUBERNETES_SERVICE_PORT': '443',
+        }):
+      with mock.patch.object(
+          ApiClient, 'in_cluster_available', return_value=True):
+        with mock.patch.object(k8s_client.ssl, 'create_default_context'):
+          self.assertIsInstance(k8s_client.new_client(), ApiClient)
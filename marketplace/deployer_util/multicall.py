@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+#
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Runs any of the deployer_util tools from a single entry point.
+
+  multicall.py TOOL [ARGS...]
+    Runs TOOL (for example print_config.py) with ARGS. The tool module is
+    only imported at this point, so the heavy imports of the other tools are
+    never paid for. multicall.py can also be linked to under the name of a
+    tool, busybox style.
+
+  multicall.py serve SOCKET
+    Starts a server listening on the Unix socket SOCKET. It imports the
+    commonly used modules once, then forks a child per request, so each tool
+    call skips the interpreter startup and imports.
+
+When the DEPLOYER_TOOLS_SOCKET environment variable points to a running
+server, `multicall.py TOOL` sends the call to that server. The child gets the
+caller's stdin, stdout, stderr, working directory and environment, and its
+exit code is returned. Termination signals received by the caller are
+relayed to the child, and the child is terminated if the caller goes away.
+Otherwise the tool runs in the current process.
+
+The socket must be in a directory only accessible to the current user;
+callers run their tools locally rather than use any other socket.
+
+This module is imported by every call, so it must only import modules which
+are cheap to import.
+"""
+
+import importlib
+import json
+import os
+import re
+import signal
+import socket
+import stat
+import struct
+import sys
+import threading
+import traceback
+
+SOCKET_ENV = 'DEPLOYER_TOOLS_SOCKET'
+SERVE_COMMAND = 'serve'
+
+# Imported by the server before forking, so that the children share them.
+_PRELOADED_MODULES = [
+    'config_helper',
+    'k8s_client',
+    'property_generator',
+    'resources',
+    'schema_values_common',
+    'yaml_util',
+]
+
+_TOOL_RE = re.compile(r'^[a-z_][a-z0-9_]*$')
+_TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+_HEADER = struct.Struct('!Q')
+_EXIT_CODE = struct.Struct('!i')
+_SIGNAL = struct.Struct('!i')
+_STDIO_FDS = [0, 1, 2]
+_FORWARDED_SIGNALS = [
+    signal.SIGHUP, signal.SIGINT, signal.SIGQUIT, signal.SIGTERM
+]
+
+
+class UnknownTool(Exception):
+  pass
+
+
+def main():
+  name = os.path.basename(sys.argv[0])
+  if name != os.path.basename(__file__):
+    sys.exit(call(name, sys.argv[1:]))
+
+  if len(sys.argv) < 2:
+    sys.stderr.write(__doc__)
+    sys.exit(2)
+  if sys.argv[1] == SERVE_COMMAND:
+    if len(sys.argv) != 3:
+      sys.stderr.write('Usage: multicall.py serve SOCKET\n')
+      sys.exit(2)
+    serve(sys.argv[2])
+    return
+  sys.exit(call(sys.argv[1], sys.argv[2:]))
+
+
+def call(tool, args):
+  """Runs the tool, on the server if there is one. Returns the exit code."""
+  socket_path = os.environ.get(SOCKET_ENV)
+  if socket_path and _is_private_dir(
+      os.path.dirname(os.path.abspath(socket_path))):
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+      conn.connect(socket_path)
+    except OSError:
+      # The server is not running (anymore); run the tool here.
+      conn.close()
+    else:
+      with conn:
+        return call_server(conn, tool, args)
+  return run_tool(tool, args)
+
+
+def tool_module_name(tool):
+  """Returns the module implementing tool, such as print_config for
+  print_config.py, or raises UnknownTool."""
+  name = tool[:-len('.py')] if tool.endswith('.py') else tool
+  if (not _TOOL_RE.match(name) or name.endswith('_test') or
+      name == 'multicall' or
+      not os.path.isfile(os.path.join(_TOOLS_DIR, name + '.py'))):
+    raise UnknownTool('Unknown tool: {}'.format(tool))
+  return name
+
+
+def run_tool(tool, args):
+  """Imports the tool and runs its main() with args. Returns the exit code."""
+  try:
+    module = importlib.import_module(tool_module_name(tool))
+    if not callable(getattr(module, 'main', None)):
+      raise UnknownTool('Not a tool: {}'.format(tool))
+  except UnknownTool as e:
+    sys.stderr.write('{}\n'.format(e))
+    return 127
+
+  sys.argv = [tool] + list(args)
+  try:
+    module.main()
+    return 0
+  except SystemExit as e:
+    return _exit_code(e.code)
+  except KeyboardInterrupt:
+    return 130
+  except Exception:
+    traceback.print_exc()
+    return 1
+  finally:
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+
+def _exit_code(code):
+  """Converts a SystemExit code like the interpreter does."""
+  if code is None:
+    return 0
+  if isinstance(code, int):
+    return code
+  sys.stderr.write('{}\n'.format(code))
+  return 1
+
+
+def call_server(conn, tool, args):
+  """Runs the tool on the server connected to conn."""
+  request = json.dumps({
+      'tool': tool,
+      'args': list(args),
+      'cwd': os.getcwd(),
+      'env': dict(os.environ),
+  }).encode('utf-8')
+  forwarded = []
+
+  def _forward(signum, frame):
+    forwarded.append(signum)
+    try:
+      conn.sendall(_SIGNAL.pack(signum))
+    except OSError:
+      pass
+
+  previous_handlers = {}
+  for signum in _FORWARDED_SIGNALS:
+    # Ignored signals, e.g. SIGINT in background jobs, stay ignored.
+    if signal.getsignal(signum) != signal.SIG_IGN:
+      previous_handlers[signum] = signal.signal(signum, _forward)
+  try:
+    sys.stdout.flush()
+    sys.stderr.flush()
+    socket.send_fds(conn, [_HEADER.pack(len(request))], _STDIO_FDS)
+    conn.sendall(request)
+    response = _recv_exactly(conn, _EXIT_CODE.size)
+  finally:
+    for signum, handler in previous_handlers.items():
+      if handler is not None:
+        signal.signal(signum, handler)
+  if len(response) != _EXIT_CODE.size:
+    # The child died before reporting its exit code, e.g. because of a
+    # relayed signal. Report it like the shell would.
+    return 128 + forwarded[-1] if forwarded else 1
+  return _EXIT_CODE.unpack(response)[0]
+
+
+def serve(socket_path, preload=_PRELOADED_MODULES):
+  """Serves tool calls on socket_path until the parent process exits."""
+  for module in preload:
+    importlib.import_module(module)
+
+  parent_pid = os.getppid()
+  directory = os.path.dirname(os.path.abspath(socket_path))
+  os.makedirs(directory, mode=0o700, exist_ok=True)
+  if not _is_private_dir(directory):
+    raise Exception(
+        '{} must be a directory owned by the current user with mode 0700'
+        .format(directory))
+  _unlink_socket(socket_path)
+  listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  listener.bind(socket_path)
+  listener.listen(64)
+  listener.settimeout(1)
+  # Children are reaped automatically; they report their exit code to the
+  # caller themselves.
+  signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+  try:
+    while os.getppid() == parent_pid:
+      try:
+        conn, _ = listener.accept()
+      except socket.timeout:
+        continue
+      _handle(listener, conn)
+  finally:
+    listener.close()
+    _unlink_socket(socket_path)
+
+
+def _is_private_dir(directory):
+  """Returns whether only the current user can access directory."""
+  try:
+    st = os.lstat(directory)
+  except OSError:
+    return False
+  return (stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid() and
+          not st.st_mode & 0o077)
+
+
+def _unlink_socket(socket_path):
+  """Removes the socket left at socket_path, if any, but no other file."""
+  try:
+    st = os.lstat(socket_path)
+  except FileNotFoundError:
+    return
+  if not stat.S_ISSOCK(st.st_mode):
+    raise Exception('{} exists and is not a socket'.format(socket_path))
+  os.unlink(socket_path)
+
+
+def _handle(listener, conn):
+  fds = []
+  try:
+    conn.settimeout(10)
+    header, fds, _, _ = socket.recv_fds(conn, _HEADER.size, len(_STDIO_FDS))
+    header += _recv_exactly(conn, _HEADER.size - len(header))
+    if len(fds) != len(_STDIO_FDS) or len(header) != _HEADER.size:
+      return
+    request = json.loads(
+        _recv_exactly(conn,
+                      _HEADER.unpack(header)[0]).decode('utf-8'))
+    conn.settimeout(None)
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    if os.fork() == 0:
+      listener.close()
+      _run_child(conn, fds, request)
+  except (OSError, ValueError):
+    # A broken request only affects its caller.
+    pass
+  finally:
+    for fd in fds:
+      os.close(fd)
+    conn.close()
+
+
+def _run_child(conn, fds, request):
+  """Runs the request in the forked child and never returns."""
+  code = 1
+  finished = threading.Event()
+  try:
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    threading.Thread(
+        target=_relay_signals, args=(conn, finished), daemon=True).start()
+    for fd, stdio_fd in zip(fds, _STDIO_FDS):
+      os.dup2(fd, stdio_fd)
+      os.close(fd)
+    os.chdir(request['cwd'])
+    os.environ.clear()
+    os.environ.update(request['env'])
+    code = run_tool(request['tool'], request['args'])
+  except BaseException:
+    traceback.print_exc()
+  finally:
+    finished.set()
+    try:
+      conn.sendall(_EXIT_CODE.pack(code))
+    finally:
+      os._exit(code)
+
+
+def _relay_signals(conn, finished):
+  """Raises the signals relayed by the caller in this process, and
+  terminates it once the caller goes away."""
+  while True:
+    try:
+      data = _recv_exactly(conn, _SIGNAL.size)
+    except OSError:
+      data = b''
+    if finished.is_set():
+      return
+    if len(data) != _SIGNAL.size:
+      os.kill(os.getpid(), signal.SIGTERM)
+      return
+    os.kill(os.getpid(), _SIGNAL.unpack(data)[0])
+
+
+def _recv_exactly(conn, size):
+  """Returns size bytes from conn, or fewer if the connection is closed."""
+  data = b''
+  while len(data) < size:
+    chunk = conn.recv(size - len(data))
+    if not chunk:
+      break
+    data += chunk
+  return data
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,224 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import multicall
+
+MULTICALL = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'multicall.py')
+
+SCHEMA = """
+applicationApiVersion: v1beta1
+properties:
+  name:
+    type: string
+    x-google-marketplace:
+      type: NAME
+"""
+
+
+class MulticallTest(unittest.TestCase):
+
+  def setUp(self):
+    tmpdir = tempfile.TemporaryDirectory()
+    self.addCleanup(tmpdir.cleanup)
+    self.tmpdir = tmpdir.name
+    with open(os.path.join(self.tmpdir, 'schema.yaml'), 'w') as f:
+      f.write(SCHEMA)
+
+  def run_tool(self, tool, args):
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    with mock.patch('sys.stdout', stdout), mock.patch('sys.stderr', stderr):
+      code = multicall.run_tool(tool, args)
+    return code, stdout.getvalue(), stderr.getvalue()
+
+  def test_tool_module_name(self):
+    self.assertEqual('print_config',
+                     multicall.tool_module_name('print_config.py'))
+    self.assertEqual('print_config', multicall.tool_module_name('print_config'))
+    for tool in [
+        'missing.py', 'config_helper_test.py', 'multicall.py',
+        '../deployer_util/print_config.py', 'os.path'
+    ]:
+      with self.assertRaises(multicall.UnknownTool):
+        multicall.tool_module_name(tool)
+
+  def test_run_tool(self):
+    code, stdout, _ = self.run_tool(
+        'print_app_api_version.py',
+        ['--schema_file',
+         os.path.join(self.tmpdir, 'schema.yaml')])
+    self.assertEqual(0, code)
+    self.assertEqual('v1beta1', stdout)
+
+  def test_run_tool_exit_codes(self):
+    code, _, stderr = self.run_tool('print_app_api_version.py',
+                                    ['--unknown_flag'])
+    self.assertEqual(2, code)
+    self.assertIn('unrecognized arguments', stderr)
+
+    code, _, stderr = self.run_tool(
+        'print_app_api_version.py',
+        ['--schema_file',
+         os.path.join(self.tmpdir, 'missing.yaml')])
+    self.assertEqual(1, code)
+    self.assertIn('FileNotFoundError', stderr)
+
+    code, _, stderr = self.run_tool('dict_util.py', [])
+    self.assertEqual(127, code)
+    self.assertIn('Not a tool', stderr)
+
+
+class MulticallServerTest(unittest.TestCase):
+
+  def setUp(self):
+    tmpdir = tempfile.TemporaryDirectory()
+    self.addCleanup(tmpdir.cleanup)
+    self.tmpdir = tmpdir.name
+    with open(os.path.join(self.tmpdir, 'schema.yaml'), 'w') as f:
+      f.write(SCHEMA)
+    self.socket = os.path.join(self.tmpdir, 'tools.sock')
+
+  def start_server(self):
+    server = subprocess.Popen([sys.executable, MULTICALL, 'serve', self.socket])
+    self.addCleanup(server.wait)
+    self.addCleanup(server.kill)
+    deadline = time.time() + 10
+    while not os.path.exists(self.socket):
+      self.assertLess(time.time(), deadline, 'The server did not start')
+      self.assertIsNone(server.poll())
+      time.sleep(0.01)
+    return server
+
+  def call(self, *args):
+    env = dict(os.environ)
+    env[multicall.SOCKET_ENV] = self.socket
+    return subprocess.run(
+        [sys.executable, MULTICALL] + list(args),
+        cwd=self.tmpdir,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        encoding='utf-8')
+
+  def test_calls_run_on_the_server(self):
+    self.start_server()
+    # The relative schema file resolves in the caller's working directory.
+    result = self.call('print_app_api_version.py', '--schema_file',
+                       'schema.yaml')
+    self.assertEqual(0, result.returncode, result.stderr)
+    self.assertEqual('v1beta1', result.stdout)
+
+    result = self.call('print_app_api_version.py', '--schema_file',
+                       'missing.yaml')
+    self.assertEqual(1, result.returncode)
+    self.assertIn('FileNotFoundError', result.stderr)
+
+  def test_calls_run_concurrently(self):
+    self.start_server()
+    env = dict(os.environ)
+    env[multicall.SOCKET_ENV] = self.socket
+    calls = [
+        subprocess.Popen([
+            sys.executable, MULTICALL, 'print_app_api_version.py',
+            '--schema_file', 'schema.yaml'
+        ],
+                         cwd=self.tmpdir,
+                         env=env,
+                         stdout=subprocess.PIPE,
+                         encoding='utf-8') for _ in range(5)
+    ]
+    for process in calls:
+      stdout, _ = process.communicate()
+      self.assertEqual('v1beta1', stdout)
+      self.assertEqual(0, process.returncode)
+
+  def test_calls_run_locally_without_server(self):
+    result = self.call('print_app_api_version.py', '--schema_file',
+                       'schema.yaml')
+    self.assertEqual(0, result.returncode, result.stderr)
+    self.assertEqual('v1beta1', result.stdout)
+
+  def start_blocked_call(self, server):
+    """Starts a call which blocks reading its stdin, and waits until it
+    runs in a child of the server."""
+    children = '/proc/{0}/task/{0}/children'.format(server.pid)
+    if not os.path.exists(children):
+      self.skipTest('The children of the server cannot be listed')
+    env = dict(os.environ)
+    env[multicall.SOCKET_ENV] = self.socket
+    caller = subprocess.Popen([
+        sys.executable, MULTICALL, 'print_config.py', '--schema_file',
+        'schema.yaml', '--values_mode', 'stdin'
+    ],
+                              cwd=self.tmpdir,
+                              env=env,
+                              stdin=subprocess.PIPE)
+    self.addCleanup(caller.stdin.close)
+    self.addCleanup(caller.wait)
+    self.addCleanup(caller.kill)
+    deadline = time.time() + 10
+    while True:
+      with open(children) as f:
+        if f.read().strip():
+          return caller
+      self.assertLess(time.time(), deadline, 'The call did not start')
+      time.sleep(0.01)
+
+  def assert_call_terminated(self, caller):
+    """Asserts that nobody reads the call's stdin anymore."""
+    deadline = time.time() + 10
+    while True:
+      try:
+        caller.stdin.write(b'x' * 65536)
+        caller.stdin.flush()
+      except BrokenPipeError:
+        return
+      self.assertLess(time.time(), deadline, 'The tool is still running')
+      time.sleep(0.01)
+
+  def test_signals_are_relayed(self):
+    caller = self.start_blocked_call(self.start_server())
+    caller.send_signal(signal.SIGTERM)
+    self.assertEqual(128 + signal.SIGTERM, caller.wait(10))
+    self.assert_call_terminated(caller)
+
+  def test_tool_is_terminated_with_its_caller(self):
+    caller = self.start_blocked_call(self.start_server())
+    caller.kill()
+    caller.wait(10)
+    self.assert_call_terminated(caller)
+
+  def test_socket_directory_must_be_private(self):
+    os.chmod(self.tmpdir, 0o755)
+    with self.assertRaisesRegex(Exception, 'mode 0700'):
+      multicall.serve(self.socket, preload=[])
+
+  def test_only_sockets_are_replaced(self):
+    with open(self.socket, 'w') as f:
+      f.write('data')
+    with self.assertRaisesRegex(Exception, 'not a socket'):
+      multicall.serve(self.socket, preload=[])
+    with open(self.socket) as f:
+      self.assertEqual('data', f.read())
@@ -21,27 +21,36 @@ from argparse import ArgumentParser
 ''' Copy all the files from the test manifest into final manifest.
     The values.yaml file is merged instead of overwriten '''
 
-parser = ArgumentParser()
-
-parser.add_argument(
-    "-tc", "--manifest", dest="manifest", help="the configuration for tests")
-parser.add_argument(
-    "-td",
-    "--test_manifest",
-    dest="test_manifest",
-    help="the output for test resources")
-
-args = parser.parse_args()
-
-for parent, dir_list, file_list in os.walk(args.test_manifest):
-  for filename in file_list:
-    orig = os.path.join(parent, filename)
-    dest = parent[len(args.test_manifest) + 1:]
-    dest = os.path.join(args.manifest, dest)
-    if not os.path.exists(dest):
-      os.makedirs(dest)
-    dest = os.path.join(dest, filename)
-    if filename == "values.yaml":
-      overlay_yaml_file(orig, dest)
-    else:
-      os.rename(orig, dest)
+
+def main():
+  parser = ArgumentParser()
+
+  parser.add_argument(
+      "-tc", "--manifest", dest="manifest", help="the configuration for tests")
+  parser.add_argument(
+      "-td",
+      "--test_manifest",
+      dest="test_manifest",
+      help="the output for test resources")
+
+  args = parser.parse_args()
+  overlay_test_files(args.manifest, args.test_manifest)
+
+
+def overlay_test_files(manifest, test_manifest):
+  for parent, dir_list, file_list in os.walk(test_manifest):
+    for filename in file_list:
+      orig = os.path.join(parent, filename)
+      dest = parent[len(test_manifest) + 1:]
+      dest = os.path.join(manifest, dest)
+      if not os.path.exists(dest):
+        os.makedirs(dest)
+      dest = os.path.join(dest, filename)
+      if filename == "values.yaml":
+        overlay_yaml_file(orig, dest)
+      else:
+        os.rename(orig, dest)
+
+
+if __name__ == "__main__":
+  main()
@@ -14,11 +14,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import yaml
 import os.path
 from argparse import ArgumentParser
 
 import log_util as log
+import yaml_codec
 from dict_util import deep_get
 from yaml_util import load_yaml
 
@@ -63,7 +63,7 @@ def main():
 
   for output in args.output:
     with open(output, 'w', encoding='utf-8') as f:
-      yaml.dump(output_schema, f)
+      yaml_codec.dump(output_schema, f)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,103 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""On-disk cache of parsed files, keyed by the hash of their content.
+
+The cache is opt-in: it is only used when the DEPLOYER_PARSE_CACHE_DIR
+environment variable points to a directory. Entries are pickled, so loading
+a file that has already been parsed by another process in the same deployment
+costs a hash and a pickle load instead of a full YAML parse. A changed file
+has a different hash, so stale entries are never used.
+
+As unpickling an entry can run arbitrary code, the cache directory is only
+used if it is owned by the current user and not accessible to anybody else.
+"""
+
+import hashlib
+import os
+import pickle
+import stat
+
+import log_util as log
+
+CACHE_DIR_ENV = 'DEPLOYER_PARSE_CACHE_DIR'
+
+# Bump whenever the parsed representation of a file changes.
+_CACHE_VERSION = b'1'
+
+
+def cache_dir():
+  """Returns the cache directory, or None if caching is disabled."""
+  return os.environ.get(CACHE_DIR_ENV) or None
+
+
+def load(filename, parse_fn, kind):
+  """Returns parse_fn(content) for the content of filename.
+
+  Args:
+    filename: A str, the name of the file to parse.
+    parse_fn: A function parsing the file content (a str).
+    kind: A str identifying parse_fn, so that the same file parsed in
+      different ways gets different cache entries.
+  """
+  with open(filename, 'rb') as f:
+    content = f.read()
+
+  directory = _private_dir(cache_dir())
+  if not directory:
+    return parse_fn(content.decode('utf-8'))
+
+  digest = hashlib.sha256(_CACHE_VERSION + b'\0' + kind.encode('utf-8') +
+                          b'\0' + content).hexdigest()
+  entry = os.path.join(directory, '{}-{}.pickle'.format(kind, digest))
+  try:
+    with open(entry, 'rb') as f:
+      return pickle.load(f)
+  except Exception:
+    # Missing or unreadable entry; parse the file again.
+    pass
+
+  parsed = parse_fn(content.decode('utf-8'))
+  _store(directory, entry, parsed)
+  return parsed
+
+
+def _private_dir(directory):
+  """Creates directory if needed and returns it, or None if it is not a
+  directory private to the current user."""
+  if not directory:
+    return None
+  try:
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.lstat(directory)
+  except OSError:
+    return None
+  if (not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or
+      st.st_mode & 0o077):
+    log.warn(
+        "Not using the parse cache {}: it must be a directory owned by "
+        "the current user with mode 0700", directory)
+    return None
+  return directory
+
+
+def _store(directory, entry, parsed):
+  """Atomically writes the cache entry, ignoring failures."""
+  tmp_entry = '{}.{}.tmp'.format(entry, os.getpid())
+  try:
+    with open(tmp_entry, 'wb') as f:
+      pickle.dump(parsed, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_entry, entry)
+  except OSError:
+    if os.path.exists(tmp_entry):
+      os.unlink(tmp_entry)
@@ -0,0 +1,101 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import parse_cache
+import yaml_codec
+
+
+class ParseCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self._tmpdir = tempfile.TemporaryDirectory()
+    self.cache_dir = os.path.join(self._tmpdir.name, 'cache')
+    self.filename = os.path.join(self._tmpdir.name, 'schema.yaml')
+    self.write('properties: {a: {type: string}}\n')
+    self.parse_calls = 0
+
+  def tearDown(self):
+    self._tmpdir.cleanup()
+
+  def write(self, content):
+    with open(self.filename, 'w', encoding='utf-8') as f:
+      f.write(content)
+
+  def parse(self, content):
+    self.parse_calls += 1
+    return yaml_codec.safe_load(content)
+
+  def load(self):
+    with mock.patch.dict(os.environ,
+                         {parse_cache.CACHE_DIR_ENV: self.cache_dir}):
+      return parse_cache.load(self.filename, self.parse, 'yaml')
+
+  def test_disabled_by_default(self):
+    with mock.patch.dict(os.environ, {parse_cache.CACHE_DIR_ENV: ''}):
+      parse_cache.load(self.filename, self.parse, 'yaml')
+      parse_cache.load(self.filename, self.parse, 'yaml')
+    self.assertEqual(2, self.parse_calls)
+    self.assertFalse(os.path.exists(self.cache_dir))
+
+  def test_second_load_hits_cache(self):
+    expected = {'properties': {'a': {'type': 'string'}}}
+    self.assertEqual(expected, self.load())
+    self.assertEqual(expected, self.load())
+    self.assertEqual(1, self.parse_calls)
+
+  def test_cached_result_is_a_fresh_copy(self):
+    self.load()['properties']['a']['type'] = 'mutated'
+    cached = self.load()
+    cached['properties']['a']['type'] = 'mutated'
+    self.assertEqual('string', self.load()['properties']['a']['type'])
+
+  def test_changed_file_is_parsed_again(self):
+    self.load()
+    self.write('properties: {b: {type: integer}}\n')
+    self.assertEqual({'properties': {'b': {'type': 'integer'}}}, self.load())
+    self.assertEqual(2, self.parse_calls)
+
+  def test_kinds_are_cached_separately(self):
+    self.load()
+    with mock.patch.dict(os.environ,
+                         {parse_cache.CACHE_DIR_ENV: self.cache_dir}):
+      self.assertEqual(
+          'other', parse_cache.load(self.filename, lambda c: 'other', 'other'))
+
+  def test_corrupted_entry_is_parsed_again(self):
+    self.load()
+    for entry in os.listdir(self.cache_dir):
+      with open(os.path.join(self.cache_dir, entry), 'wb') as f:
+        f.write(b'not a pickle')
+    self.assertEqual({'properties': {'a': {'type': 'string'}}}, self.load())
+    self.assertEqual(2, self.parse_calls)
+
+  def test_directory_accessible_to_others_is_not_used(self):
+    os.makedirs(self.cache_dir, mode=0o777)
+    os.chmod(self.cache_dir, 0o777)
+    self.load()
+    self.load()
+    self.assertEqual(2, self.parse_calls)
+    self.assertEqual([], os.listdir(self.cache_dir))
+
+  def test_directory_owned_by_another_user_is_not_used(self):
+    os.makedirs(self.cache_dir, mode=0o700)
+    with mock.patch.object(os, 'getuid', return_value=os.getuid() + 1):
+      self.load()
+    self.assertEqual([], os.listdir(self.cache_dir))
@@ -43,25 +43,39 @@ fi
 
 echo "Marking deployment of application \"$NAME\" as \"$status\"."
 
+patch="$(jq --null-input --compact-output --arg status "$status" \
+  '[{"op": "add", "path": "/spec/assemblyPhase", "value": $status}]')"
+
 if [[ "$status" == "Success" ]]; then
-  published_version="$(print_published_version.py --empty_if_not_supported)"
+  published_version="$(/bin/multicall.py print_published_version.py --empty_if_not_supported)"
   if ! [[ -z "$published_version" ]]; then
-    # Ensure that the application resource has a version
-    # matching the declared published version.
-    app_version="$(kubectl get "applications.app.k8s.io/$NAME" --output=json \
-      | jq -r .spec.descriptor.version)"
-    if [[ "$app_version" != "$published_version" ]]; then
-      echo "Application's version '$app_version' does not match the declared" \
-        "publishedVersion '$published_version' in schema.yaml."
-      exit 1
-    fi
+    # Ensure that the application resource has a version matching the
+    # declared published version. The test is part of the same patch, so
+    # the check and the update are a single atomic request.
+    patch="$(jq --null-input --compact-output \
+      --arg version "$published_version" \
+      --argjson patch "$patch" \
+      '[{"op": "test", "path": "/spec/descriptor/version", "value": $version}]
+        + $patch')"
   fi
 fi
 
 # --output=json is used to force kubectl to succeed even if the patch command
 # makes not change to the resource. Otherwise, this command exits 1.
-kubectl patch "applications.app.k8s.io/$NAME" \
+if ! kubectl patch "applications.app.k8s.io/$NAME" \
   --output=json \
   --namespace="$NAMESPACE" \
-  --type=merge \
-  --patch "{\"spec\": {\"assemblyPhase\": \"$status\"}}"
+  --type=json \
+  --patch "$patch"; then
+  if ! [[ -z "$published_version" ]]; then
+    # Only looked up on failure, to tell why the test did not pass.
+    app_version="$(kubectl get "applications.app.k8s.io/$NAME" \
+      --namespace="$NAMESPACE" --output=json \
+      | jq -r .spec.descriptor.version)" || true
+    if [[ "$app_version" != "$published_version" ]]; then
+      echo "Application's version '$app_version' does not match the declared" \
+        "publishedVersion '$published_version' in schema.yaml."
+    fi
+  fi
+  exit 1
+fi
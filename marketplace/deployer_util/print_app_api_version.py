@@ -33,7 +33,7 @@ def main():
       default='/data/schema.yaml')
   args = parser.parse_args()
 
-  schema = config_helper.Schema.load_yaml_file(args.schema_file)
+  schema = config_helper.Schema.load_yaml_file(args.schema_file, lazy=True)
   sys.stdout.write(schema.app_api_version)
   sys.stdout.flush()
 
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+#
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import shlex
+import sys
+
+from argparse import ArgumentParser
+
+import k8s_client
+
+_PROG_HELP = """
+Fetches the Application, and optionally its Namespace, once and prints the
+identity fields needed by the deployer, either as shell exports to be
+eval'ed or as JSON.
+"""
+
+OUTPUT_SHELL = 'shell'
+OUTPUT_JSON = 'json'
+
+
+def main():
+  parser = ArgumentParser(description=_PROG_HELP)
+  parser.add_argument(
+      '--name', help='The name of the application instance', required=True)
+  parser.add_argument(
+      '--namespace',
+      help='The namespace containing the application',
+      required=True)
+  parser.add_argument(
+      '--include_namespace_uid',
+      action='store_true',
+      help='Also fetch the Namespace to print its uid')
+  parser.add_argument(
+      '--output',
+      choices=[OUTPUT_SHELL, OUTPUT_JSON],
+      default=OUTPUT_SHELL,
+      help='Print shell export statements, or a JSON object')
+  args = parser.parse_args()
+
+  identity = fetch_identity(
+      k8s_client.new_client(),
+      args.name,
+      args.namespace,
+      include_namespace_uid=args.include_namespace_uid)
+  if args.output == OUTPUT_JSON:
+    sys.stdout.write(json.dumps(identity, sort_keys=True) + '\n')
+  else:
+    sys.stdout.write(shell_exports(identity))
+  sys.stdout.flush()
+
+
+def fetch_identity(client, name, namespace, include_namespace_uid=False):
+  """Returns a dict of the identity fields, keyed by env variable name."""
+  queries = [('applications.app.k8s.io', name, namespace)]
+  if include_namespace_uid:
+    queries.append(('namespaces', namespace))
+  results = client.get_many(queries)
+  application = results[0]
+  identity = {
+      'APP_UID': application['metadata']['uid'],
+      'APP_API_VERSION': application['apiVersion'],
+  }
+  if include_namespace_uid:
+    identity['NAMESPACE_UID'] = results[1]['metadata']['uid']
+  return identity
+
+
+def shell_exports(identity):
+  return ''.join('export {}={}\n'.format(key, shlex.quote(value))
+                 for key, value in sorted(identity.items()))
+
+
+if __name__ == "__main__":
+  main()
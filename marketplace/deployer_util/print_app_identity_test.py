@@ -0,0 +1,78 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import subprocess
+import unittest
+
+from print_app_identity import fetch_identity
+from print_app_identity import shell_exports
+
+APPLICATION = {
+    'apiVersion': 'app.k8s.io/v1beta1',
+    'kind': 'Application',
+    'metadata': {
+        'name': 'wordpress-1',
+        'uid': 'app-uid',
+    },
+    'spec': {
+        'descriptor': {
+            'version': '1.0.0'
+        }
+    },
+}
+NAMESPACE = {'metadata': {'name': 'ns', 'uid': 'namespace-uid'}}
+
+
+class FakeClient:
+
+  def __init__(self):
+    self.calls = []
+
+  def get(self, resource, name=None, namespace=None):
+    if resource == 'namespaces':
+      return NAMESPACE
+    return APPLICATION
+
+  def get_many(self, queries):
+    self.calls.append([query[0] for query in queries])
+    return [self.get(*query) for query in queries]
+
+
+class PrintAppIdentityTest(unittest.TestCase):
+
+  def test_fetch_identity(self):
+    client = FakeClient()
+    self.assertEqual(
+        {
+            'APP_UID': 'app-uid',
+            'APP_API_VERSION': 'app.k8s.io/v1beta1',
+        }, fetch_identity(client, 'wordpress-1', 'ns'))
+    self.assertEqual([['applications.app.k8s.io']], client.calls)
+
+  def test_fetch_identity_with_namespace_uid(self):
+    client = FakeClient()
+    identity = fetch_identity(
+        client, 'wordpress-1', 'ns', include_namespace_uid=True)
+    self.assertEqual('app-uid', identity['APP_UID'])
+    self.assertEqual('namespace-uid', identity['NAMESPACE_UID'])
+    self.assertEqual([['applications.app.k8s.io', 'namespaces']], client.calls)
+
+  def test_shell_exports_are_quoted(self):
+    exports = shell_exports({'APP_UID': "it's", 'APP_API_VERSION': ''})
+    output = subprocess.run(
+        ['bash', '-c', exports + 'echo "$APP_UID|$APP_API_VERSION"'],
+        stdout=subprocess.PIPE,
+        encoding='utf-8',
+        check=True).stdout
+    self.assertEqual("it's|\n", output)
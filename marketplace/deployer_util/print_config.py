@@ -14,15 +14,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
+import os
 import re
+import shlex
 import sys
 
 from argparse import ArgumentParser
 
-import yaml
-
 import config_helper
 import schema_values_common
+import yaml_codec
 
 _PROG_HELP = """
 Outputs configuration parameters constructed from files in a directory.
@@ -36,10 +38,33 @@ shell: lines of VAR=VALUE, where the VALUEs are properly shell escaped.
 yaml: a YAML file.
 """
 
+_QUERY_HELP = """
+Answers a query, as NAME=QUERY, and can be repeated to answer several queries
+with a single load of the schema and values. QUERY is one of:
+xtype:TYPE, the value of the x-google-marketplace property of that type;
+xtype_key:TYPE, the name of that property;
+shell_vars or yaml, the same output as --output.
+The results are printed as defined by --query_output, or written to files
+named NAME in --output_dir.
+"""
+
+_QUERY_OUTPUT_HELP = """
+Choose the format to output the query results.
+env: lines of export NAME=VALUE, where the VALUEs are properly shell escaped.
+json: a JSON object.
+"""
+
 OUTPUT_YAML = 'yaml'
 OUTPUT_SHELL_VARS = 'shell_vars'
 
+QUERY_XTYPE = 'xtype'
+QUERY_XTYPE_KEY = 'xtype_key'
+
+QUERY_OUTPUT_ENV = 'env'
+QUERY_OUTPUT_JSON = 'json'
+
 ENV_KEY_RE = re.compile(r'^[a-zA-z0-9_]+$')
+QUERY_NAME_RE = re.compile(r'^[a-zA-Z0-9_][a-zA-Z0-9_.-]*$')
 
 
 class InvalidParameter(Exception):
@@ -61,12 +86,35 @@ def main():
       ' property.')
   parser.add_argument(
       '--key', help='If specified, outputs the keys, rather than the values')
+  parser.add_argument(
+      '--query', action='append', metavar='NAME=QUERY', help=_QUERY_HELP)
+  parser.add_argument(
+      '--query_output',
+      help=_QUERY_OUTPUT_HELP,
+      choices=[QUERY_OUTPUT_ENV, QUERY_OUTPUT_JSON],
+      default=QUERY_OUTPUT_ENV)
+  parser.add_argument(
+      '--output_dir',
+      help='If specified, the result of each --query is written to a file '
+      'in this directory instead of being printed')
   args = parser.parse_args()
 
-  schema = schema_values_common.load_schema(args)
+  queries = [parse_query(query) for query in args.query or []]
+
+  schema = schema_values_common.load_schema(args, lazy=True)
   values = schema_values_common.load_values(args)
 
   try:
+    if queries:
+      results = run_queries(values, schema, queries)
+      if args.output_dir:
+        write_query_results(results, args.output_dir)
+      elif args.query_output == QUERY_OUTPUT_JSON:
+        sys.stdout.write(json.dumps(dict(results), indent=2) + '\n')
+      else:
+        sys.stdout.write(output_env(results))
+      return
+
     if args.xtype:
       sys.stdout.write(output_xtype(values, schema, args.xtype, args.key))
       return
@@ -79,9 +127,52 @@ def main():
     sys.stdout.flush()
 
 
+def parse_query(query):
+  """Parses a NAME=QUERY argument into a (name, query) tuple."""
+  name, sep, query = query.partition('=')
+  if not sep or not QUERY_NAME_RE.match(name):
+    raise InvalidParameter(
+        'Invalid query, expected NAME=QUERY: {}'.format(name + sep + query))
+  return name, query
+
+
+def run_queries(values, schema, queries):
+  """Returns the list of (name, result) tuples of (name, query) tuples."""
+  return [(name, run_query(values, schema, query)) for name, query in queries]
+
+
+def run_query(values, schema, query):
+  query_type, _, arg = query.partition(':')
+  if query_type == QUERY_XTYPE and arg:
+    return output_xtype(values, schema, arg, False)
+  if query_type == QUERY_XTYPE_KEY and arg:
+    return output_xtype(values, schema, arg, True)
+  if query == OUTPUT_SHELL_VARS:
+    return output_shell_vars(values)
+  if query == OUTPUT_YAML:
+    return output_yaml(values)
+  raise InvalidParameter('Unknown query: {}'.format(query))
+
+
+def output_env(results):
+  invalid_names = [name for name, _ in results if not ENV_KEY_RE.match(name)]
+  if invalid_names:
+    raise InvalidParameter(
+        'Invalid env variable names: {}'.format(invalid_names))
+  return ''.join('export {}={}\n'.format(name, shlex.quote(result))
+                 for name, result in results)
+
+
+def write_query_results(results, output_dir):
+  os.makedirs(output_dir, exist_ok=True)
+  for name, result in results:
+    with open(os.path.join(output_dir, name), 'w', encoding='utf-8') as f:
+      f.write(result)
+
+
 def output_xtype(values, schema, xtype, print_keys):
   definition = {"x-google-marketplace": {"type": xtype}}
-  candidates = schema.properties_matching(definition)
+  candidates = schema.properties_with_xtype(xtype)
   if len(candidates) != 1:
     raise InvalidParameter(
         'There must be exactly one parameter matching but found {}: {}'.format(
@@ -115,7 +206,7 @@ def output_yaml(values):
       current_new_values = current_new_values[key_prefix]
     current_new_values[key] = value
 
-  return yaml.safe_dump(new_values, default_flow_style=False, indent=2)
+  return yaml_codec.safe_dump(new_values, default_flow_style=False, indent=2)
 
 
 if __name__ == "__main__":
@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import subprocess
 import tempfile
 import unittest
 
@@ -121,3 +123,62 @@ class PrintConfigTest(unittest.TestCase):
     self.assertRaises(
         print_config.InvalidParameter,
         lambda: print_config.output_xtype(values, schema, 'IMAGE', True))
+
+  def test_queries(self):
+    values = {'name': 'name-1', 'namespace': "it's"}
+    schema = config_helper.Schema.load_yaml("""
+        properties:
+          name:
+            type: string
+            x-google-marketplace:
+              type: NAME
+          namespace:
+            type: string
+            x-google-marketplace:
+              type: NAMESPACE
+        """)
+    queries = [
+        print_config.parse_query(q) for q in [
+            'NAME=xtype:NAME', 'NAMESPACE=xtype:NAMESPACE',
+            'NAME_KEY=xtype_key:NAME', 'VARS=shell_vars', 'values.yaml=yaml'
+        ]
+    ]
+    results = print_config.run_queries(values, schema, queries)
+    self.assertEqual([
+        ('NAME', 'name-1'),
+        ('NAMESPACE', "it's"),
+        ('NAME_KEY', 'name'),
+        ('VARS', '$name $namespace'),
+        ('values.yaml', print_config.output_yaml(values)),
+    ], results)
+
+    output = subprocess.run([
+        'bash', '-c',
+        print_config.output_env(results[:4]) + 'echo "$NAME|$NAMESPACE"'
+    ],
+                            stdout=subprocess.PIPE,
+                            encoding='utf-8',
+                            check=True).stdout
+    self.assertEqual("name-1|it's\n", output)
+    self.assertRaises(print_config.InvalidParameter,
+                      lambda: print_config.output_env(results))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+      print_config.write_query_results(results, tmpdir)
+      with open(os.path.join(tmpdir, 'values.yaml'), encoding='utf-8') as f:
+        self.assertEqual(yaml.safe_load(f), values)
+
+  def test_invalid_queries(self):
+    self.assertRaises(print_config.InvalidParameter,
+                      lambda: print_config.parse_query('xtype:NAME'))
+    self.assertRaises(print_config.InvalidParameter,
+                      lambda: print_config.parse_query('../a=yaml'))
+    schema = config_helper.Schema.load_yaml("""
+        properties:
+          name:
+            type: string
+        """)
+    self.assertRaises(print_config.InvalidParameter,
+                      lambda: print_config.run_query({}, schema, 'unknown'))
+    self.assertRaises(print_config.InvalidParameter,
+                      lambda: print_config.run_query({}, schema, 'xtype:'))
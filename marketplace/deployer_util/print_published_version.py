@@ -35,7 +35,7 @@ def main():
       help='For a v1 schema, do not fail but output empty string instead')
   args = parser.parse_args()
 
-  schema = schema_values_common.load_schema(args)
+  schema = schema_values_common.load_schema(args, lazy=True)
   if (schema.x_google_marketplace is None or
       not schema.x_google_marketplace.is_v2()):
     if args.empty_if_not_supported:
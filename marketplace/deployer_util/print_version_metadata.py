@@ -17,11 +17,11 @@
 import collections
 import datetime
 import sys
-import yaml
 
 from argparse import ArgumentParser
 
 import schema_values_common
+import yaml_codec
 
 _PROG_HELP = """
 Generates a version metadata in yaml format from schema.yaml.
@@ -64,7 +64,11 @@ def main():
   sys.stdout.flush()
 
 
-def _ordered_dump(data, stream=None, dumper=yaml.Dumper, **kwds):
+def _ordered_dump(data, stream=None, dumper=None, **kwds):
+  # yaml is only imported here, so that importing this tool stays cheap.
+  import yaml
+  if dumper is None:
+    dumper = yaml_codec.Dumper
 
   class OrderedDumper(dumper):
     pass
@@ -14,12 +14,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import yaml
-
 from argparse import ArgumentParser
 from constants import GOOGLE_CLOUD_TEST
 from dict_util import deep_get
-from yaml_util import load_resources_yaml
+from ensure_k8s_apps_labels import add_app_label_stage
+from resources import copy_resource_metadata
+from resources import ManifestPipeline
+from yaml_util import dump_resources_yaml
+from yaml_util import iter_resources
 ''' Remove all resources considered to be Kuberenetes Helm tests from
     a given manifest file. '''
 
@@ -31,35 +33,66 @@ _HOOK_FAILURE = ['test-failure']
 def main():
   parser = ArgumentParser()
   parser.add_argument(
-      "--manifest", help="the manifest file location to be cleared of tests")
+      "--manifest",
+      help="the manifest file location to be cleared of tests, or - for stdin")
+  parser.add_argument(
+      "--output",
+      help="the file to write the result to, or - for stdout; defaults to "
+      "updating the manifest in place")
   parser.add_argument(
       "--deploy_tests",
       action="store_true",
       help="indicates whether tests should be deployed")
+  parser.add_argument(
+      "--appname",
+      help="if set, the app label is also added to each resource, in the "
+      "same pass")
   args = parser.parse_args()
 
-  manifest = args.manifest
-  resources = load_resources_yaml(manifest)
-  filtered_resources = []
-  for resource in resources:
-    helm_hook = deep_get(resource, "metadata", "annotations", _HELM_HOOK_KEY)
-    if helm_hook is None:
-      filtered_resources.append(resource)
-    elif helm_hook in _HOOK_SUCCESS:
-      if args.deploy_tests:
-        annotations = deep_get(resource, "metadata", "annotations")
-        del annotations[_HELM_HOOK_KEY]
-        annotations[GOOGLE_CLOUD_TEST] = "test"
-        filtered_resources.append(resource)
-    elif helm_hook in _HOOK_FAILURE:
-      if args.deploy_tests:
-        raise Exception("Helm hook {} is not supported".format(helm_hook))
-    else:
-      raise Exception("Helm hook {} is not supported".format(helm_hook))
+  pipeline = add_post_render_stages(ManifestPipeline(), args.deploy_tests,
+                                    args.appname)
+  dump_resources_yaml(
+      pipeline.stream(iter_resources(args.manifest)),
+      args.output or args.manifest,
+      explicit_start=True)
+
+
+def add_helm_hook_stage(pipeline, deploy_tests):
+  """Adds a stage removing (or converting, if deploy_tests) helm tests."""
+  return pipeline.map(lambda r: process_helm_hook(r, deploy_tests))
 
-  with open(manifest, "w", encoding='utf-8') as out:
-    yaml.dump_all(
-        filtered_resources, out, default_flow_style=False, explicit_start=True)
+
+def add_post_render_stages(pipeline, deploy_tests, app_name=None):
+  """Adds the stages applied to helm's output: the helm hook stage, then
+  the app label stage if app_name is set.
+
+  Both are map stages, so each resource goes through them before the next
+  one is parsed and the manifest is read and written only once."""
+  pipeline = add_helm_hook_stage(pipeline, deploy_tests)
+  if app_name:
+    pipeline = add_app_label_stage(pipeline, app_name)
+  return pipeline
+
+
+def process_helm_hook(resource, deploy_tests):
+  """Returns the resource with its helm test hook converted, or None if the
+  resource should be removed."""
+  helm_hook = deep_get(resource, "metadata", "annotations", _HELM_HOOK_KEY)
+  if helm_hook is None:
+    return resource
+  if helm_hook in _HOOK_SUCCESS:
+    if deploy_tests:
+      res = copy_resource_metadata(resource)
+      annotations = res['metadata']['annotations']
+      del annotations[_HELM_HOOK_KEY]
+      annotations[GOOGLE_CLOUD_TEST] = "test"
+      return res
+    return None
+  if helm_hook in _HOOK_FAILURE:
+    if deploy_tests:
+      raise Exception("Helm hook {} is not supported".format(helm_hook))
+    return None
+  raise Exception("Helm hook {} is not supported".format(helm_hook))
 
 
 if __name__ == "__main__":
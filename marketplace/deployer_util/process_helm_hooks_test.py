@@ -0,0 +1,77 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from process_helm_hooks import add_post_render_stages
+from resources import ManifestPipeline
+
+DEPLOYMENT = {
+    'kind': 'Deployment',
+    'metadata': {
+        'name': 'app'
+    },
+}
+
+HELM_TEST = {
+    'kind': 'Pod',
+    'metadata': {
+        'name': 'app-test',
+        'annotations': {
+            'helm.sh/hook': 'test-success'
+        },
+    },
+}
+
+HELM_FAILURE_TEST = {
+    'kind': 'Pod',
+    'metadata': {
+        'name': 'app-failure-test',
+        'annotations': {
+            'helm.sh/hook': 'test-failure'
+        },
+    },
+}
+
+
+def _post_render(resources, deploy_tests, app_name=None):
+  pipeline = add_post_render_stages(ManifestPipeline(), deploy_tests, app_name)
+  return pipeline.run(resources)
+
+
+class ProcessHelmHooksTest(unittest.TestCase):
+
+  def test_tests_are_removed(self):
+    self.assertEqual([DEPLOYMENT],
+                     _post_render([DEPLOYMENT, HELM_TEST, HELM_FAILURE_TEST],
+                                  deploy_tests=False))
+
+  def test_tests_are_converted_and_labeled(self):
+    deployment, test = _post_render([DEPLOYMENT, HELM_TEST],
+                                    deploy_tests=True,
+                                    app_name='app')
+    self.assertEqual({'app.kubernetes.io/name': 'app'},
+                     deployment['metadata']['labels'])
+    self.assertEqual({'marketplace.cloud.google.com/verification': 'test'},
+                     test['metadata']['annotations'])
+    self.assertEqual({'app.kubernetes.io/name': 'app'},
+                     test['metadata']['labels'])
+
+  def test_failure_tests_are_not_supported(self):
+    with self.assertRaisesRegex(Exception, 'test-failure is not supported'):
+      _post_render([HELM_FAILURE_TEST], deploy_tests=True)
+
+  def test_labels_are_not_added_without_app_name(self):
+    [deployment] = _post_render([DEPLOYMENT], deploy_tests=False)
+    self.assertNotIn('labels', deployment['metadata'])
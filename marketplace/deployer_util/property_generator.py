@@ -14,12 +14,36 @@
 
 import base64
 import json
-import OpenSSL
+import os
 import random
+from concurrent.futures import ThreadPoolExecutor
 
 from password import GeneratePassword
 
 
+def generate_in_background(props):
+  """Starts generating the values of the password and TLS certificate
+  properties in props.
+
+  Returns a dict mapping the property names to futures of their values.
+  RSA key generation releases the GIL, so the certificates are generated in
+  parallel, while the caller works on the other properties."""
+  props = [p for p in props if p.password or p.tls_certificate]
+  if not props:
+    return {}
+  executor = ThreadPoolExecutor(
+      max_workers=min(len(props),
+                      os.cpu_count() or 1))
+  try:
+    return {
+        p.name: (executor.submit(generate_password, p.password) if p.password
+                 else executor.submit(generate_tls_certificate)) for p in props
+    }
+  finally:
+    # The submitted values are still generated; the threads exit afterwards.
+    executor.shutdown(wait=False)
+
+
 def generate_password(config):
   """Generate password value for SchemaXPassword config."""
   pw = GeneratePassword(config.length, config.include_symbols)
@@ -30,6 +54,9 @@ def generate_password(config):
 
 def generate_tls_certificate():
   """Generate TLS value, a json string."""
+  # OpenSSL takes long to import and is only needed for TLS properties.
+  import OpenSSL
+
   cert_seconds_to_expiry = 60 * 60 * 24 * 365  # one year
 
   key = OpenSSL.crypto.PKey()
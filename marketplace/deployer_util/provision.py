@@ -17,13 +17,12 @@
 from argparse import ArgumentParser
 from make_dns1123_name import dns1123_name, limit_name
 
-import yaml
-
 import config_helper
 import log_util as log
 import property_generator
 import schema_values_common
 import storage
+import yaml_codec
 
 _PROG_HELP = """
 Reads the schemas and writes k8s manifests for objects
@@ -56,7 +55,7 @@ def main():
       image_pull_secret=args.image_pull_secret,
       deployer_service_account_name=args.deployer_service_account_name,
       storage_class_provisioner=args.storage_class_provisioner)
-  print(yaml.safe_dump_all(manifests, default_flow_style=False, indent=2))
+  print(yaml_codec.safe_dump_all(manifests, default_flow_style=False, indent=2))
 
 
 def process(schema, values, deployer_image, deployer_entrypoint, version_repo,
@@ -67,6 +66,11 @@ def process(schema, values, deployer_image, deployer_entrypoint, version_repo,
   app_name = get_name(schema, values)
   namespace = get_namespace(schema, values)
 
+  # Passwords and certificates are generated while the other properties are
+  # provisioned.
+  generating = property_generator.generate_in_background(
+      prop for prop in schema.properties.values() if prop.name not in values)
+
   # Inject DEPLOYER_IMAGE property values if not already present.
   values = inject_deployer_image_properties(values, schema, deployer_image)
 
@@ -111,10 +115,8 @@ def process(schema, values, deployer_image, deployer_entrypoint, version_repo,
     elif prop.xtype == config_helper.XTYPE_INGRESS_AVAILABLE:
       # TODO(#360): Really populate this value.
       props[prop.name] = True
-    elif prop.password:
-      props[prop.name] = property_generator.generate_password(prop.password)
-    elif prop.tls_certificate:
-      props[prop.name] = property_generator.generate_tls_certificate()
+    elif prop.password or prop.tls_certificate:
+      props[prop.name] = generating[prop.name].result()
 
   # Merge input and provisioned properties.
   app_params = dict(list(values.items()) + list(props.items()))
@@ -166,7 +168,7 @@ def provision_from_storage(key, value, app_name, namespace):
   """Provisions a resource for a property specified from storage."""
   raw_manifest = storage.load(value)
 
-  manifest = yaml.safe_load(raw_manifest)
+  manifest = yaml_codec.safe_load(raw_manifest)
   if 'metadata' not in manifest:
     manifest['metadata'] = {}
   resource_name = dns1123_name("{}-{}".format(app_name, key))
@@ -555,7 +557,8 @@ def make_app_params_yaml(app_params, deployer_image):
   final_app_params = {k: v for k, v in app_params.items()}
   final_app_params['__image_repo_prefix__'] = deployer_image_to_repo_prefix(
       deployer_image)
-  return yaml.safe_dump(final_app_params, default_flow_style=False, indent=2)
+  return yaml_codec.safe_dump(
+      final_app_params, default_flow_style=False, indent=2)
 
 
 def provision_service_account(schema, prop, app_name, namespace,
@@ -713,11 +716,7 @@ def get_namespace(schema, values):
 
 
 def get_property_value(schema, values, xtype):
-  candidates = schema.properties_matching({
-      'x-google-marketplace': {
-          'type': xtype,
-      },
-  })
+  candidates = schema.properties_with_xtype(xtype)
   if len(candidates) != 1:
     raise Exception('Unable to find exactly one property with '
                     'x-google-marketplace.type={}'.format(xtype))
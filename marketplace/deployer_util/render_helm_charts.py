@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+#
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import subprocess
+import tempfile
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+import log_util as log
+from bash_util import CommandException
+from process_helm_hooks import add_post_render_stages
+from resources import ManifestPipeline
+from yaml_util import dump_resources_yaml
+from yaml_util import iter_resources
+
+_PROG_HELP = """
+Renders all extracted helm charts with `helm template`, several at the same
+time. helm's output is post-processed while it is read, in a single pass:
+helm hooks are removed (or converted to tests) and the app label is added.
+"""
+
+
+def main():
+  parser = ArgumentParser(description=_PROG_HELP)
+  parser.add_argument(
+      '--extracted',
+      help='The folder containing one extracted chart per subfolder',
+      default='/data/extracted')
+  parser.add_argument(
+      '--dest',
+      help='The folder to write the rendered manifests to',
+      default='/data/manifest-expanded')
+  parser.add_argument(
+      '--values', help='The values.yaml file passed to helm', required=True)
+  parser.add_argument(
+      '--name', help='The name of the application instance', required=True)
+  parser.add_argument(
+      '--namespace',
+      help='The namespace of the application instance',
+      required=True)
+  parser.add_argument(
+      '--deploy_tests',
+      action='store_true',
+      help='Convert helm tests to tests instead of removing them')
+  parser.add_argument(
+      '--parallelism',
+      type=int,
+      default=4,
+      help='The number of charts rendered at the same time')
+  parser.add_argument('--helm', help='The helm binary', default='helm')
+  args = parser.parse_args()
+
+  render_charts(
+      list_charts(args.extracted),
+      args.dest,
+      values_file=args.values,
+      name=args.name,
+      namespace=args.namespace,
+      deploy_tests=args.deploy_tests,
+      parallelism=args.parallelism,
+      helm=args.helm)
+
+
+def list_charts(extracted):
+  """Returns the chart folders of the extracted charts, sorted by name."""
+  if not os.path.isdir(extracted):
+    return []
+  return [
+      os.path.join(extracted, name, 'chart')
+      for name in sorted(os.listdir(extracted))
+      if os.path.isdir(os.path.join(extracted, name))
+  ]
+
+
+def helm_template_command(chart, values_file, name, namespace, helm='helm'):
+  return [
+      helm, 'template', name, chart, '--namespace={}'.format(namespace),
+      '--values={}'.format(values_file)
+  ]
+
+
+def render_charts(charts,
+                  dest,
+                  values_file,
+                  name,
+                  namespace,
+                  deploy_tests=False,
+                  parallelism=4,
+                  helm='helm'):
+  """Renders each chart into dest/<extracted chart name>.yaml.
+
+  All charts are rendered with the same values file. Rendering fails as soon
+  as one of the `helm template` calls fails."""
+  if not charts:
+    return
+  os.makedirs(dest, exist_ok=True)
+
+  def _render(chart):
+    # Charts are extracted into <extracted>/<name>/chart.
+    chart_name = os.path.basename(os.path.dirname(chart))
+    render_chart(
+        helm_template_command(chart, values_file, name, namespace, helm),
+        os.path.join(dest, chart_name + '.yaml'), name, deploy_tests)
+
+  with ThreadPoolExecutor(max_workers=max(parallelism, 1)) as executor:
+    # list() propagates the first rendering error.
+    list(executor.map(_render, charts))
+
+
+def render_chart(cmd, dest_file, app_name, deploy_tests):
+  """Runs the helm command and post-processes its stdout into dest_file.
+
+  The resources are parsed from helm's stdout as it is produced, so the raw
+  output is never written to disk. dest_file is only written if helm
+  succeeds."""
+  log.info("Running {}", ' '.join(cmd))
+  pipeline = add_post_render_stages(ManifestPipeline(), deploy_tests, app_name)
+  # stderr goes to a file so that helm never blocks on a full pipe.
+  with tempfile.TemporaryFile(mode='w+', encoding='utf-8') as stderr:
+    with subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=stderr,
+        encoding='utf-8') as process:
+      try:
+        dump_resources_yaml(
+            pipeline.stream(_checked_resources(process, stderr)),
+            dest_file,
+            explicit_start=True)
+      except BaseException:
+        process.kill()
+        raise
+
+
+def _checked_resources(process, stderr):
+  """Yields the resources printed by process, then checks its exit code."""
+  try:
+    yield from iter_resources(process.stdout)
+  except Exception:
+    # Unparsable output is usually an error message; prefer helm's error.
+    if process.wait():
+      _raise_command_error(process, stderr)
+    raise
+  if process.wait():
+    _raise_command_error(process, stderr)
+
+
+def _raise_command_error(process, stderr):
+  stderr.seek(0)
+  raise CommandException(process.returncode, stderr.read())
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,130 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import time
+import unittest
+
+from bash_util import CommandException
+from render_helm_charts import list_charts
+from render_helm_charts import render_charts
+from yaml_util import load_resources_yaml
+
+# Stands in for helm: prints a deployment and a helm test named after the
+# chart folder, after sleeping for $FAKE_HELM_DELAY seconds.
+FAKE_HELM = """#!/bin/sh
+sleep "${FAKE_HELM_DELAY:-0}"
+chart="$(basename "$(dirname "$3")")"
+[ "$chart" = broken ] && echo "Error: broken chart" >&2 && exit 1
+cat <<YAML
+---
+# Source: $chart/templates/deployment.yaml
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: $2-$chart
+  labels:
+    app.kubernetes.io/name: $2
+---
+apiVersion: v1
+kind: Pod
+metadata:
+  name: $2-$chart-test
+  annotations:
+    helm.sh/hook: test-success
+YAML
+"""
+
+
+class RenderHelmChartsTest(unittest.TestCase):
+
+  def setUp(self):
+    tmpdir = tempfile.TemporaryDirectory()
+    self.addCleanup(tmpdir.cleanup)
+    self.tmpdir = tmpdir.name
+    self.helm = os.path.join(self.tmpdir, 'helm')
+    with open(self.helm, 'w') as f:
+      f.write(FAKE_HELM)
+    os.chmod(self.helm, 0o755)
+    self.extracted = os.path.join(self.tmpdir, 'extracted')
+    self.dest = os.path.join(self.tmpdir, 'manifest-expanded')
+
+  def add_chart(self, name):
+    os.makedirs(os.path.join(self.extracted, name, 'chart'))
+
+  def render(self, deploy_tests=False, parallelism=4):
+    render_charts(
+        list_charts(self.extracted),
+        self.dest,
+        values_file=os.path.join(self.tmpdir, 'values.yaml'),
+        name='app',
+        namespace='ns',
+        deploy_tests=deploy_tests,
+        parallelism=parallelism,
+        helm=self.helm)
+
+  def load(self, name):
+    return load_resources_yaml(os.path.join(self.dest, name))
+
+  def test_list_charts(self):
+    self.add_chart('b')
+    self.add_chart('a')
+    self.assertEqual([
+        os.path.join(self.extracted, 'a', 'chart'),
+        os.path.join(self.extracted, 'b', 'chart')
+    ], list_charts(self.extracted))
+    self.assertEqual([], list_charts(os.path.join(self.tmpdir, 'missing')))
+
+  def test_charts_are_rendered_and_post_processed(self):
+    self.add_chart('operator')
+    self.add_chart('app')
+    self.render()
+
+    self.assertEqual(['app.yaml', 'operator.yaml'],
+                     sorted(os.listdir(self.dest)))
+    [deployment] = self.load('operator.yaml')
+    self.assertEqual('app-operator', deployment['metadata']['name'])
+    self.assertEqual({'app.kubernetes.io/name': 'app'},
+                     deployment['metadata']['labels'])
+    with open(os.path.join(self.dest, 'app.yaml')) as f:
+      self.assertTrue(f.read().startswith('---\n'))
+
+  def test_tests_are_converted_when_deployed(self):
+    self.add_chart('app')
+    self.render(deploy_tests=True)
+
+    [_, test] = self.load('app.yaml')
+    self.assertEqual({'marketplace.cloud.google.com/verification': 'test'},
+                     test['metadata']['annotations'])
+    self.assertEqual({'app.kubernetes.io/name': 'app'},
+                     test['metadata']['labels'])
+
+  def test_charts_are_rendered_concurrently(self):
+    for i in range(4):
+      self.add_chart('chart{}'.format(i))
+    os.environ['FAKE_HELM_DELAY'] = '0.5'
+    self.addCleanup(os.environ.pop, 'FAKE_HELM_DELAY')
+
+    start = time.time()
+    self.render(parallelism=4)
+    self.assertLess(time.time() - start, 4 * 0.5)
+    self.assertEqual(4, len(os.listdir(self.dest)))
+
+  def test_failing_chart_raises(self):
+    self.add_chart('app')
+    self.add_chart('broken')
+    with self.assertRaisesRegex(CommandException, 'broken chart'):
+      self.render()
+    self.assertNotIn('broken.yaml', os.listdir(self.dest))
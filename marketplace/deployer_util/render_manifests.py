@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+#
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+import re
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+import log_util as log
+import schema_values_common
+from ensure_k8s_apps_labels import add_app_label_stage
+from print_config import output_shell_vars
+from resources import ManifestPipeline
+from yaml_util import dump_resources_yaml
+from yaml_util import iter_resources
+
+_PROG_HELP = """
+Renders the manifest templates in a single process: substitutes the config
+parameters like `envsubst "$(print_config.py -o shell_vars)"` would, and
+ensures that every resource has the app label.
+"""
+
+_VARIABLE_RE = re.compile(
+    r'\$(?:\{([A-Za-z_][A-Za-z0-9_]*)\}|([A-Za-z_][A-Za-z0-9_]*))')
+_TEMPLATE_SUFFIX = '.template'
+
+
+def main():
+  parser = ArgumentParser(description=_PROG_HELP)
+  schema_values_common.add_to_argument_parser(parser)
+  parser.add_argument(
+      '--manifests',
+      help='The folder containing the manifest templates',
+      default='/data/manifest')
+  parser.add_argument(
+      '--dest',
+      help='The folder to write the rendered manifests to',
+      default='/data/manifest-expanded')
+  parser.add_argument(
+      '--app_name', help='The name of the application instance', required=True)
+  parser.add_argument(
+      '--parallelism',
+      type=int,
+      default=1,
+      help='The number of templates rendered at the same time')
+  args = parser.parse_args()
+
+  values = schema_values_common.load_values(args)
+  # Validates the parameter names like the shell_vars output does.
+  output_shell_vars(values)
+
+  render_manifests(
+      args.manifests,
+      args.dest,
+      values,
+      app_name=args.app_name,
+      parallelism=args.parallelism)
+
+
+def envsubst(template, values):
+  """Substitutes $VAR and ${VAR} for the config parameters in template.
+
+  Like envsubst called with the list of all parameters, references to
+  other variables are left as is. Values are converted with str()."""
+
+  def _replace(match):
+    name = match.group(1) or match.group(2)
+    if name not in values:
+      return match.group(0)
+    return str(values[name])
+
+  return _VARIABLE_RE.sub(_replace, template)
+
+
+def render_manifests(manifests, dest, values, app_name, parallelism=1):
+  """Renders each template file in manifests to a file in dest."""
+  os.makedirs(dest, exist_ok=True)
+  templates = sorted(
+      name for name in os.listdir(manifests)
+      if os.path.isfile(os.path.join(manifests, name)))
+
+  def _render(name):
+    output_name = name
+    if output_name.endswith(_TEMPLATE_SUFFIX):
+      output_name = output_name[:-len(_TEMPLATE_SUFFIX)]
+    render_manifest(
+        os.path.join(manifests, name), os.path.join(dest, output_name), values,
+        app_name)
+
+  with ThreadPoolExecutor(max_workers=max(parallelism, 1)) as executor:
+    # list() propagates the first rendering error.
+    list(executor.map(_render, templates))
+
+
+def render_manifest(template_file, dest_file, values, app_name):
+  log.info("Rendering {} into {}", template_file, dest_file)
+  with open(template_file, 'r', encoding='utf-8') as f:
+    rendered = envsubst(f.read(), values)
+  pipeline = add_app_label_stage(ManifestPipeline(), app_name)
+  dump_resources_yaml(
+      pipeline.stream(iter_resources(io.StringIO(rendered))),
+      dest_file,
+      explicit_start=True)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,113 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from print_config import output_shell_vars
+from render_manifests import envsubst
+from render_manifests import render_manifests
+from yaml_util import load_resources_yaml
+
+TEMPLATE = """
+apiVersion: v1
+kind: ConfigMap
+metadata:
+  name: $NAME-config
+  labels:
+    app.kubernetes.io/component: ${NAME}_web
+data:
+  replicas: "$replicas"
+  unknown: "$UNKNOWN ${UNKNOWN}"
+  partial: "$NAMESPACE_suffix ${NAMESPACE}_suffix"
+  dollar: "$ $$ ${ $1"
+"""
+
+VALUES = {
+    'NAME': 'app',
+    'NAMESPACE': 'ns',
+    'replicas': 3,
+}
+
+
+class EnvsubstTest(unittest.TestCase):
+
+  def test_substitutes_parameters_only(self):
+    rendered = envsubst(TEMPLATE, VALUES)
+    self.assertIn('name: app-config', rendered)
+    self.assertIn('app.kubernetes.io/component: app_web', rendered)
+    self.assertIn('replicas: "3"', rendered)
+    self.assertIn('unknown: "$UNKNOWN ${UNKNOWN}"', rendered)
+    self.assertIn('partial: "$NAMESPACE_suffix ns_suffix"', rendered)
+    self.assertIn('dollar: "$ $$ ${ $1"', rendered)
+
+  @unittest.skipUnless(shutil.which('envsubst'), 'envsubst is not installed')
+  def test_matches_gnu_envsubst(self):
+    env = {k: str(v) for k, v in VALUES.items()}
+    expected = subprocess.run(
+        ['envsubst', output_shell_vars(VALUES)],
+        input=TEMPLATE,
+        env=env,
+        stdout=subprocess.PIPE,
+        encoding='utf-8',
+        check=True).stdout
+    self.assertEqual(expected, envsubst(TEMPLATE, VALUES))
+
+
+class RenderManifestsTest(unittest.TestCase):
+
+  def setUp(self):
+    tmpdir = tempfile.TemporaryDirectory()
+    self.addCleanup(tmpdir.cleanup)
+    self.manifests = os.path.join(tmpdir.name, 'manifest')
+    self.dest = os.path.join(tmpdir.name, 'manifest-expanded')
+    os.makedirs(os.path.join(self.manifests, 'subdir'))
+    for i in range(5):
+      name = 'configmap{}.yaml.template'.format(i)
+      with open(os.path.join(self.manifests, name), 'w') as f:
+        f.write(TEMPLATE.replace('-config', '-config{}'.format(i)))
+    with open(os.path.join(self.manifests, 'service.yaml'), 'w') as f:
+      f.write('---\nkind: Service\nmetadata:\n  name: $NAME\n')
+
+  def assert_rendered(self):
+    self.assertEqual(['configmap{}.yaml'.format(i) for i in range(5)] +
+                     ['service.yaml'], sorted(os.listdir(self.dest)))
+    [service] = load_resources_yaml(os.path.join(self.dest, 'service.yaml'))
+    self.assertEqual(
+        {
+            'name': 'app',
+            'labels': {
+                'app.kubernetes.io/name': 'app'
+            }
+        }, service['metadata'])
+    [configmap
+    ] = load_resources_yaml(os.path.join(self.dest, 'configmap3.yaml'))
+    self.assertEqual('app-config3', configmap['metadata']['name'])
+    self.assertEqual(
+        {
+            'app.kubernetes.io/component': 'app_web',
+            'app.kubernetes.io/name': 'app',
+        }, configmap['metadata']['labels'])
+
+  def test_render_manifests(self):
+    render_manifests(self.manifests, self.dest, VALUES, app_name='app')
+    self.assert_rendered()
+
+  def test_render_manifests_in_parallel(self):
+    render_manifests(
+        self.manifests, self.dest, VALUES, app_name='app', parallelism=4)
+    self.assert_rendered()
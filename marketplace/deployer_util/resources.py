@@ -57,6 +57,24 @@ def set_resource_ownership(owner_uid, owner_name, owner_api_version, owner_kind,
   owner_reference['uid'] = owner_uid
 
 
+def copy_resource_metadata(resource):
+  """Returns a copy of the resource whose metadata can be modified.
+
+  Only the metadata, its labels, annotations and owner references are copied;
+  all other fields (e.g. spec or data) are shared with the given resource."""
+  res = dict(resource)
+  metadata = dict(res.get('metadata') or {})
+  for key in ('labels', 'annotations'):
+    if metadata.get(key) is not None:
+      metadata[key] = dict(metadata[key])
+  if metadata.get('ownerReferences') is not None:
+    metadata['ownerReferences'] = [
+        dict(owner_reference) for owner_reference in metadata['ownerReferences']
+    ]
+  res['metadata'] = metadata
+  return res
+
+
 def find_application_resource(resources):
   """Finds the Application resource from a list of resource manifests."""
   apps = [
@@ -68,3 +86,49 @@ def find_application_resource(resources):
   if len(apps) > 1:
     raise Exception("Set of resources includes multiple Applications")
   return apps[0]
+
+
+class ManifestPipeline:
+  """Chains transformations over parsed resources.
+
+  Each stage is either applied to every single resource (see `map`) or
+  to the whole list of resources (see `apply`), so the resources are parsed
+  and serialized once regardless of the number of transformations.
+  """
+
+  def __init__(self):
+    self._stages = []
+
+  def map(self, fn):
+    """Adds a stage calling fn on each resource.
+
+    fn returns the resulting resource, or None to drop the resource."""
+
+    def _stage(resources):
+      return (r for r in (fn(resource) for resource in resources) if r)
+
+    self._stages.append(_stage)
+    return self
+
+  def apply(self, fn):
+    """Adds a stage calling fn on the list of resources.
+
+    fn returns the resulting list of resources."""
+    self._stages.append(lambda resources: fn(list(resources)))
+    return self
+
+  def run(self, resources):
+    """Runs all stages in order and returns the resulting resources."""
+    return list(self.stream(resources))
+
+  def stream(self, resources):
+    """Lazily runs all stages over an iterable of resources.
+
+    Returns a generator of the resulting resources. As long as the pipeline
+    only has `map` stages, each resource flows through all stages before the
+    next one is read, so memory stays bounded by a single resource. An
+    `apply` stage has to hold all resources at that point."""
+    resources = iter(resources)
+    for stage in self._stages:
+      resources = stage(resources)
+    yield from resources
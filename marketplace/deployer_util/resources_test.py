@@ -14,6 +14,8 @@
 
 import unittest
 
+from resources import ManifestPipeline
+from resources import copy_resource_metadata
 from resources import find_application_resource
 from resources import set_app_resource_ownership
 from resources import set_resource_ownership
@@ -82,6 +84,40 @@ class ResourcesTest(unittest.TestCase):
         'uid': '11111111-2222-3333-4444-555555555555',
     }])
 
+  def test_copy_resource_metadata_shares_other_fields(self):
+    resource = {
+        'kind': 'ConfigMap',
+        'metadata': {
+            'name': 'config',
+            'labels': {
+                'a': 'b'
+            },
+            'ownerReferences': [{
+                'uid': OTHER_UID
+            }],
+        },
+        'data': {
+            'key': 'value'
+        },
+    }
+    copied = copy_resource_metadata(resource)
+    set_app_resource_ownership(APP_UID, APP_NAME, APP_API_VERSION, copied)
+    copied['metadata']['labels']['c'] = 'd'
+    copied['metadata']['ownerReferences'][0]['name'] = 'other'
+
+    self.assertIs(resource['data'], copied['data'])
+    self.assertEqual({'a': 'b'}, resource['metadata']['labels'])
+    self.assertEqual([{
+        'uid': OTHER_UID
+    }], resource['metadata']['ownerReferences'])
+    self.assertEqual(APP_OWNER_REF, copied['metadata']['ownerReferences'][1])
+
+  def test_copy_resource_metadata_without_metadata(self):
+    resource = {'kind': 'ConfigMap'}
+    copied = copy_resource_metadata(resource)
+    copied['metadata']['name'] = 'config'
+    self.assertEqual({'kind': 'ConfigMap'}, resource)
+
   def test_find_application_resource(self):
     expected_app_resource = {
         # Intentionally some version we don't support,
@@ -138,3 +174,41 @@ class ResourcesTest(unittest.TestCase):
     ]
     self.assertRaisesRegex(Exception, r'.*multiple Applications.*',
                            lambda: find_application_resource(resources))
+
+  def test_manifest_pipeline_runs_stages_in_order(self):
+    pipeline = ManifestPipeline()
+    pipeline.map(lambda r: dict(r, seen=r.get('seen', []) + ['map']))
+    pipeline.apply(lambda rs: [dict(r, seen=r['seen'] + ['apply']) for r in rs])
+    self.assertEqual([{
+        'kind': 'Pod',
+        'seen': ['map', 'apply']
+    }], pipeline.run([{
+        'kind': 'Pod'
+    }]))
+
+  def test_manifest_pipeline_map_drops_none(self):
+    pipeline = ManifestPipeline().map(lambda r: r
+                                      if r['kind'] != 'Job' else None)
+    self.assertEqual([{
+        'kind': 'Pod'
+    }], pipeline.run([{
+        'kind': 'Job'
+    }, {
+        'kind': 'Pod'
+    }]))
+
+  def test_manifest_pipeline_stream_is_lazy(self):
+    consumed = []
+
+    def _source():
+      for kind in ['Pod', 'Job', 'Service']:
+        consumed.append(kind)
+        yield {'kind': kind}
+
+    pipeline = ManifestPipeline().map(lambda r: r
+                                      if r['kind'] != 'Job' else None)
+    resources = pipeline.stream(_source())
+    self.assertEqual({'kind': 'Pod'}, next(resources))
+    self.assertEqual(['Pod'], consumed)
+    self.assertEqual({'kind': 'Service'}, next(resources))
+    self.assertEqual(['Pod', 'Job', 'Service'], consumed)
@@ -14,24 +14,54 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import http.client
 import sys
+import threading
 import time
+import k8s_client
 import log_util as log
 
 from argparse import ArgumentParser
+from bash_util import AsyncCommand
+from bash_util import BackgroundCoroutine
 from bash_util import Command
 from bash_util import CommandException
+from concurrent.futures import ThreadPoolExecutor
 from dict_util import deep_get
+from k8s_client import ApiException
 from yaml_util import load_resources_yaml
 
 _PROG_HELP = "Deploy and run tester pods and wait for them to finish execution"
 
+_POLL_INTERVAL = 4
+# How many of the last log lines of each tester are kept in memory.
+_LOG_TAIL_LINES = 200
+# How long to wait for the end of the logs once a tester has finished.
+_LOG_DRAIN_TIMEOUT = 10
+
+_stdout_lock = threading.Lock()
+
+RESULT_SUCCEEDED = 'succeeded'
+RESULT_FAILED = 'failed'
+RESULT_TIMEOUT = 'timed out'
+
 
 def main():
   parser = ArgumentParser(description=_PROG_HELP)
   parser.add_argument('--namespace')
   parser.add_argument('--manifest')
-  parser.add_argument('--timeout', type=int, default=300)
+  parser.add_argument(
+      '--timeout',
+      type=int,
+      default=300,
+      help='The number of seconds all tester pods have to finish in')
+  parser.add_argument(
+      '--parallelism',
+      type=int,
+      default=0,
+      help='The maximum number of tester pods monitored at the same time. '
+      'By default, all tester pods are monitored concurrently.')
   args = parser.parse_args()
 
   try:
@@ -48,7 +78,7 @@ def main():
 
   resources = load_resources_yaml(args.manifest)
 
-  test_failed = False
+  tester_names = []
   for resource_def in resources:
     full_name = "{}/{}".format(resource_def['kind'],
                                deep_get(resource_def, 'metadata', 'name'))
@@ -56,60 +86,140 @@ def main():
     if resource_def['kind'] != 'Pod':
       log.info("Skip '{}'", full_name)
       continue
+    tester_names.append(full_name)
+
+  results = run_testers(
+      tester_names,
+      args.namespace,
+      timeout=args.timeout,
+      parallelism=args.parallelism)
+
+  for full_name, (result, log_tail) in zip(tester_names, results):
+    log.info("Tester '{}' {}.", full_name, result)
+    if result != RESULT_SUCCEEDED and log_tail:
+      log.info("Last {} log lines of tester '{}':\n{}", len(log_tail),
+               full_name, ''.join(log_tail).rstrip('\n'))
+  if any(result != RESULT_SUCCEEDED for result, _ in results):
+    sys.exit("At least 1 test failed or timed out.")
 
-    start_time = time.time()
-    poll_interval = 4
-    tester_timeout = args.timeout
-
-    while True:
-      try:
-        resource = Command(
-            '''
-          kubectl get "{}"
-          --namespace="{}"
-          -o=json
-          '''.format(full_name, args.namespace),
-            print_call=True).json()
-      except CommandException as ex:
-        log.info(str(ex))
-        log.info("retrying")
-        time.sleep(poll_interval)
-        continue
-
-      result = deep_get(resource, 'status', 'phase')
 
-      if result == "Failed":
-        print_tester_logs(full_name, args.namespace)
-        log.error("Tester '{}' failed.", full_name)
-        test_failed = True
-        break
+def run_testers(tester_names, namespace, timeout, parallelism=0):
+  """Waits for the tester pods concurrently.
 
-      if result == "Succeeded":
-        print_tester_logs(full_name, args.namespace)
-        log.info("Tester '{}' succeeded.", full_name)
-        break
+  The timeout applies to all the testers together. Returns the list of
+  (result, log tail) tuples, in the order of tester_names."""
+  if not tester_names:
+    return []
+  deadline = time.time() + timeout
+  client = k8s_client.new_client()
+  max_workers = min(parallelism or len(tester_names), len(tester_names))
+  with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    return list(
+        executor.map(
+            lambda name: wait_for_tester(client, name, namespace, deadline),
+            tester_names))
 
-      if time.time() - start_time > tester_timeout:
-        print_tester_logs(full_name, args.namespace)
-        log.error("Tester '{}' timeout.", full_name)
-        test_failed = True
-        break
 
-      time.sleep(poll_interval)
+def wait_for_tester(client, full_name, namespace, deadline):
+  """Waits for a tester pod to finish while streaming its logs.
 
-  if test_failed:
-    sys.exit("At least 1 test failed or timed out.")
+  Returns a tuple of RESULT_SUCCEEDED, RESULT_FAILED or RESULT_TIMEOUT and
+  the last lines of the tester logs."""
+  logs = TesterLogStream(full_name, namespace)
+  try:
+    result = _wait_for_tester_phase(client, full_name, namespace, deadline)
+    if result != RESULT_TIMEOUT:
+      logs.finish(_LOG_DRAIN_TIMEOUT)
+  finally:
+    logs.stop()
+  return result, list(logs.tail)
+
+
+def _wait_for_tester_phase(client, full_name, namespace, deadline):
+  kind, name = full_name.split('/', 1)
+  while True:
+    try:
+      resource = client.get(kind, name, namespace)
+    except (ApiException, OSError, http.client.HTTPException) as ex:
+      # Like kubectl failures, connection problems are retried.
+      log.info(str(ex))
+      log.info("retrying")
+      resource = None
+
+    result = deep_get(resource, 'status', 'phase')
+
+    if result == "Failed":
+      log.error("Tester '{}' failed.", full_name)
+      return RESULT_FAILED
+
+    if result == "Succeeded":
+      log.info("Tester '{}' succeeded.", full_name)
+      return RESULT_SUCCEEDED
+
+    if time.time() > deadline:
+      log.error("Tester '{}' timeout.", full_name)
+      return RESULT_TIMEOUT
+
+    time.sleep(_POLL_INTERVAL)
+
+
+class TesterLogStream:
+  """Streams the logs of a tester pod while it runs.
+
+  Each line is written to stdout as soon as kubectl reports it, prefixed with
+  the name of the pod. Only the last tail_lines lines are kept in memory.
+  """
+
+  def __init__(self,
+               full_name,
+               namespace,
+               tail_lines=_LOG_TAIL_LINES,
+               binary=('kubectl',)):
+    self.tail = collections.deque(maxlen=tail_lines)
+    self._full_name = full_name
+    self._command = list(binary) + [
+        'logs', '--follow', full_name, '--namespace={}'.format(namespace)
+    ]
+    self._prefix = '[{}] '.format(full_name)
+    self._streaming = BackgroundCoroutine(self._stream)
+
+  async def _stream(self):
+    import asyncio
+    while True:
+      streamed = []
 
+      def _forward(line):
+        streamed.append(True)
+        self._forward(line)
 
-def print_tester_logs(full_name, namespace):
-  try:
-    Command(
-        'kubectl logs {} --namespace="{}"'.format(full_name, namespace),
-        print_call=True,
-        print_result=True)
-  except CommandException as ex:
-    log.error(str(ex))
-    log.error("Failed to get the tester logs.")
+      try:
+        await AsyncCommand(
+            self._command, on_stdout=_forward, keep_output=False).run()
+        return
+      except CommandException as ex:
+        if streamed:
+          log.warn("Streaming the logs of tester '{}' stopped: {}",
+                   self._full_name,
+                   str(ex).strip())
+          return
+      # The pod is not running yet.
+      await asyncio.sleep(_POLL_INTERVAL)
+
+  def _forward(self, line):
+    if not line.endswith('\n'):
+      line += '\n'
+    self.tail.append(line)
+    with _stdout_lock:
+      sys.stdout.write(self._prefix + line)
+      sys.stdout.flush()
+
+  def finish(self, timeout):
+    """Waits up to timeout seconds for the remaining logs."""
+    self._streaming.join(timeout)
+
+  def stop(self):
+    """Stops streaming the logs."""
+    self._streaming.cancel()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,175 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import k8s_client
+import run_tester
+from k8s_client import ApiException
+
+
+class FakeClient:
+  """Stands in for a k8s_client client getting tester pods.
+
+  Each pod reports phases[pod] once it has been polled polls[pod] times."""
+
+  def __init__(self, phases, polls):
+    self._phases = phases
+    self._polls = dict(polls)
+    self._lock = threading.Lock()
+
+  def get(self, kind, name, namespace):
+    full_name = '{}/{}'.format(kind, name)
+    with self._lock:
+      remaining = self._polls[full_name]
+      self._polls[full_name] = remaining - 1
+    if remaining < 0:
+      raise ApiException(404, 'pods "{}" not found'.format(name))
+    phase = self._phases[full_name] if remaining == 0 else 'Running'
+    return {'status': {'phase': phase}}
+
+
+class FakeLogStream:
+
+  def __init__(self, full_name, namespace):
+    self.tail = ['log of {}\n'.format(full_name)]
+
+  def finish(self, timeout):
+    pass
+
+  def stop(self):
+    pass
+
+
+class RunTesterTest(unittest.TestCase):
+
+  def setUp(self):
+    patches = [
+        mock.patch.object(run_tester, '_POLL_INTERVAL', 0.05),
+        mock.patch.object(run_tester, 'TesterLogStream', FakeLogStream),
+    ]
+    for patch in patches:
+      patch.start()
+      self.addCleanup(patch.stop)
+
+  def run_testers(self, client, names, timeout=10, parallelism=0):
+    with mock.patch.object(k8s_client, 'new_client', return_value=client):
+      results = run_tester.run_testers(
+          names, 'ns', timeout=timeout, parallelism=parallelism)
+    return [result for result, _ in results]
+
+  def test_results_are_reported_per_tester(self):
+    client = FakeClient({
+        'Pod/a': 'Succeeded',
+        'Pod/b': 'Failed',
+    }, {
+        'Pod/a': 2,
+        'Pod/b': 0,
+    })
+    self.assertEqual([run_tester.RESULT_SUCCEEDED, run_tester.RESULT_FAILED],
+                     self.run_testers(client, ['Pod/a', 'Pod/b']))
+
+  def test_testers_are_monitored_concurrently(self):
+    names = ['Pod/{}'.format(i) for i in range(4)]
+    client = FakeClient({name: 'Succeeded' for name in names},
+                        {name: 5 for name in names})
+    start = time.time()
+    results = self.run_testers(client, names)
+    self.assertEqual([run_tester.RESULT_SUCCEEDED] * 4, results)
+    # Sequentially, this would take 4 * 5 polls.
+    self.assertLess(time.time() - start, 10 * 0.05)
+
+  def test_timeout_applies_to_all_testers(self):
+    client = FakeClient({
+        'Pod/a': 'Succeeded',
+        'Pod/b': 'Succeeded',
+    }, {
+        'Pod/a': 1000,
+        'Pod/b': 1000,
+    })
+    start = time.time()
+    results = self.run_testers(
+        client, ['Pod/a', 'Pod/b'], timeout=0.2, parallelism=1)
+    self.assertEqual([run_tester.RESULT_TIMEOUT] * 2, results)
+    self.assertLess(time.time() - start, 1)
+
+  def test_connection_errors_are_retried(self):
+    client = FakeClient({'Pod/a': 'Succeeded'}, {'Pod/a': 1})
+    get = client.get
+    errors = [TimeoutError('timed out'), ConnectionResetError('reset')]
+
+    def _get(*args):
+      if errors:
+        raise errors.pop()
+      return get(*args)
+
+    client.get = _get
+    self.assertEqual([run_tester.RESULT_SUCCEEDED],
+                     self.run_testers(client, ['Pod/a']))
+
+  def test_missing_tester_times_out(self):
+    client = FakeClient({'Pod/a': 'Succeeded'}, {'Pod/a': -1})
+    self.assertEqual([run_tester.RESULT_TIMEOUT],
+                     self.run_testers(client, ['Pod/a'], timeout=0.1))
+
+
+class TesterLogStreamTest(unittest.TestCase):
+
+  def stream(self, script, tail_lines=10):
+    stdout = io.StringIO()
+    with mock.patch('sys.stdout', stdout):
+      logs = run_tester.TesterLogStream(
+          'Pod/tester',
+          'ns',
+          tail_lines=tail_lines,
+          binary=['sh', '-c', script, 'kubectl'])
+      logs.finish(5)
+      logs.stop()
+    return logs, stdout.getvalue()
+
+  def test_lines_are_forwarded_with_prefix(self):
+    logs, output = self.stream('echo "$1 $2"; echo "$3 $4"')
+    self.assertEqual(
+        '[Pod/tester] logs --follow\n'
+        '[Pod/tester] Pod/tester --namespace=ns\n', output)
+
+  def test_only_the_tail_is_kept(self):
+    logs, output = self.stream('seq 1 1000', tail_lines=3)
+    self.assertEqual(['998\n', '999\n', '1000\n'], list(logs.tail))
+    self.assertEqual(1000, len(output.splitlines()))
+
+  def test_retries_until_pod_is_running(self):
+    with mock.patch.object(run_tester, '_POLL_INTERVAL', 0.01):
+      marker = os.path.join(self._tmpdir(), 'started')
+      logs, output = self.stream(
+          '[ -e {0} ] || {{ touch {0}; exit 1; }}; echo running'.format(marker))
+    self.assertEqual('[Pod/tester] running\n', output)
+
+  def test_stop_terminates_the_stream(self):
+    logs = run_tester.TesterLogStream(
+        'Pod/tester', 'ns', binary=['sh', '-c', 'sleep 60', 'kubectl'])
+    start = time.time()
+    logs.stop()
+    self.assertLess(time.time() - start, 5)
+
+  def _tmpdir(self):
+    tmpdir = tempfile.TemporaryDirectory()
+    self.addCleanup(tmpdir.cleanup)
+    return tmpdir.name
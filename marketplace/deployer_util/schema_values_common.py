@@ -56,9 +56,24 @@ def memoize(func):
   return memoized_func
 
 
-@memoize
-def load_schema(parsed_args):
-  return config_helper.Schema.load_yaml_file(parsed_args.schema_file)
+# Schemas loaded by load_schema, by schema file.
+_schemas = {}
+
+
+def load_schema(parsed_args, lazy=False):
+  """Loads the schema. With lazy, properties are only constructed and
+  checked when accessed; see config_helper.Schema.
+
+  Lazy and eager loads share one parsed schema: an eager load of a schema
+  already loaded lazily constructs the rest of it."""
+  schema = _schemas.get(parsed_args.schema_file)
+  if schema is None:
+    schema = config_helper.Schema.load_yaml_file(
+        parsed_args.schema_file, lazy=True)
+    _schemas[parsed_args.schema_file] = schema
+  if not lazy:
+    schema.load_all()
+  return schema
 
 
 def load_schema_and_validate(parsed_args):
@@ -70,4 +85,4 @@ def load_values(parsed_args):
   values_file = VALUES_FILE[parsed_args.values_mode]
   values_dir = VALUES_DIR[parsed_args.values_mode]
   return config_helper.load_values(values_file, values_dir,
-                                   load_schema(parsed_args))
+                                   load_schema(parsed_args, lazy=True))
@@ -0,0 +1,55 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import schema_values_common
+import yaml_codec
+
+SCHEMA = """
+applicationApiVersion: v1beta1
+properties:
+  name:
+    type: string
+    default: app
+    x-google-marketplace:
+      type: NAME
+"""
+
+
+class LoadSchemaTest(unittest.TestCase):
+
+  def setUp(self):
+    tmpdir = tempfile.TemporaryDirectory()
+    self.addCleanup(tmpdir.cleanup)
+    self.args = argparse.Namespace(
+        schema_file=os.path.join(tmpdir.name, 'schema.yaml'))
+    with open(self.args.schema_file, 'w', encoding='utf-8') as f:
+      f.write(SCHEMA)
+    patch = mock.patch.dict(schema_values_common._schemas, clear=True)
+    patch.start()
+    self.addCleanup(patch.stop)
+
+  def test_lazy_and_eager_loads_share_one_parse(self):
+    with mock.patch.object(
+        yaml_codec, 'safe_load', wraps=yaml_codec.safe_load) as safe_load:
+      lazy = schema_values_common.load_schema(self.args, lazy=True)
+      eager = schema_values_common.load_schema(self.args)
+    self.assertIs(lazy, eager)
+    self.assertEqual(1, safe_load.call_count)
+    self.assertEqual(['name'], list(eager.properties))
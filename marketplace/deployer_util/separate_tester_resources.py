@@ -14,14 +14,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import os
-import yaml
+import itertools
 
 from argparse import ArgumentParser
 from constants import GOOGLE_CLOUD_TEST
 from dict_util import deep_get
+from resources import ManifestPipeline
 from resources import set_app_resource_ownership
-from yaml_util import load_resources_yaml
+from yaml_util import dump_resources_yaml
+from yaml_util import iter_manifests
+from yaml_util import write_resources
 
 _PROG_HELP = "Separate the tester job from resources manifest into a different manifest"
 
@@ -49,38 +51,49 @@ def main():
       help="the file to write test resources to")
   args = parser.parse_args()
 
-  if os.path.isfile(args.manifests):
-    resources = load_resources_yaml(args.manifests)
-  else:
-    resources = []
-    for filename in os.listdir(args.manifests):
-      resources += load_resources_yaml(os.path.join(args.manifests, filename))
-
   test_resources = []
-  nontest_resources = []
-  for resource in resources:
+  pipeline = add_tester_separation_stage(
+      ManifestPipeline(),
+      test_resources,
+      app_uid=args.app_uid,
+      app_name=args.app_name,
+      app_api_version=args.app_api_version)
+  nontest_resources = pipeline.stream(iter_manifests(args.manifests))
+  first_nontest_resource = next(nontest_resources, None)
+  if first_nontest_resource is not None:
+    dump_resources_yaml(
+        itertools.chain([first_nontest_resource], nontest_resources),
+        args.out_manifests)
+
+  if test_resources:
+    with open(args.out_test_manifests, "a", encoding='utf-8') as test_outfile:
+      write_resources(test_resources, test_outfile)
+
+
+def add_tester_separation_stage(pipeline, test_resources, app_uid, app_name,
+                                app_api_version):
+  """Adds a stage moving the tester resources out of the pipeline.
+
+  Tester resources are made owned by the Application and appended to
+  test_resources."""
+
+  def _separate(resource):
     full_name = "{}/{}".format(resource['kind'],
                                deep_get(resource, 'metadata', 'name'))
     if deep_get(resource, 'metadata', 'annotations',
                 GOOGLE_CLOUD_TEST) == 'test':
       print("INFO Tester resource: {}".format(full_name))
       set_app_resource_ownership(
-          app_uid=args.app_uid,
-          app_name=args.app_name,
-          app_api_version=args.app_api_version,
+          app_uid=app_uid,
+          app_name=app_name,
+          app_api_version=app_api_version,
           resource=resource)
       test_resources.append(resource)
-    else:
-      print("INFO Prod resource: {}".format(full_name))
-      nontest_resources.append(resource)
-
-  if nontest_resources:
-    with open(args.out_manifests, "w", encoding='utf-8') as outfile:
-      yaml.safe_dump_all(nontest_resources, outfile, default_flow_style=False)
+      return None
+    print("INFO Prod resource: {}".format(full_name))
+    return resource
 
-  if test_resources:
-    with open(args.out_test_manifests, "a", encoding='utf-8') as test_outfile:
-      yaml.safe_dump_all(test_resources, test_outfile, default_flow_style=False)
+  return pipeline.map(_separate)
 
 
 if __name__ == "__main__":
@@ -14,14 +14,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import os
-import sys
 from argparse import ArgumentParser
 
-import yaml
-
-from yaml_util import load_resources_yaml
-from yaml_util import parse_resources_yaml
+from resources import ManifestPipeline
+from yaml_util import dump_resources_yaml
+from yaml_util import iter_manifests
 
 _PROG_HELP = """
 Sets the app.kubernetes.io labels on resources.
@@ -48,36 +45,26 @@ def main():
       required=True)
   args = parser.parse_args()
 
-  resources = []
-  if args.manifests == "-":
-    resources = parse_resources_yaml(sys.stdin.read())
-  elif os.path.isfile(args.manifests):
-    resources = load_resources_yaml(args.manifests)
-  else:
-    resources = []
-    for filename in os.listdir(args.manifests):
-      resources += load_resources_yaml(os.path.join(args.manifests, filename))
+  pipeline = add_app_labels_stage(ManifestPipeline(), args.name, args.namespace)
+  dump_resources_yaml(
+      pipeline.stream(iter_manifests(args.manifests)), args.dest)
 
-  # Modify resources inlined.
-  for resource in resources:
-    labels = resource['metadata'].get('labels', {})
-    resource['metadata']['labels'] = labels
-    labels['app.kubernetes.io/name'] = args.name
-    # For a resource that doesn't have a namespace (i.e. cluster resource),
-    # also all label it with the namespace of the application.
-    if 'namespace' not in resource['metadata']:
-      labels['app.kubernetes.io/namespace'] = args.namespace
 
-  if args.dest == "-":
-    write_resources(resources, sys.stdout)
-    sys.stdout.flush()
-  else:
-    with open(args.dest, "w", encoding='utf-8') as outfile:
-      write_resources(resources, outfile)
+def add_app_labels_stage(pipeline, name, namespace):
+  """Adds a stage setting the app.kubernetes.io labels on each resource."""
+  return pipeline.map(lambda r: set_app_labels(r, name, namespace))
 
 
-def write_resources(resources, outfile):
-  yaml.safe_dump_all(resources, outfile, default_flow_style=False, indent=2)
+def set_app_labels(resource, name, namespace):
+  # Modify resources inlined.
+  labels = resource['metadata'].get('labels', {})
+  resource['metadata']['labels'] = labels
+  labels['app.kubernetes.io/name'] = name
+  # For a resource that doesn't have a namespace (i.e. cluster resource),
+  # also all label it with the namespace of the application.
+  if 'namespace' not in resource['metadata']:
+    labels['app.kubernetes.io/namespace'] = namespace
+  return resource
 
 
 if __name__ == "__main__":
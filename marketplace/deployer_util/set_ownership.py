@@ -14,19 +14,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import copy
-import os
-import sys
-import yaml
 import log_util as log
 
 from argparse import ArgumentParser
+from resources import copy_resource_metadata
 from resources import find_application_resource
 from resources import set_app_resource_ownership
 from resources import set_namespace_resource_ownership
 from resources import set_service_account_resource_ownership
-from yaml_util import load_resources_yaml
-from yaml_util import parse_resources_yaml
+from resources import ManifestPipeline
+from yaml_util import dump_resources_yaml
+from yaml_util import load_manifests
 
 _PROG_HELP = """
 Scans the manifest folder kubernetes resources and set the Application to own
@@ -108,55 +106,56 @@ def main():
       "all of the (namespaced) resources in the manifests")
   args = parser.parse_args()
 
-  resources = []
-  if args.manifests == "-":
-    resources = parse_resources_yaml(sys.stdin.read())
-  elif os.path.isfile(args.manifests):
-    resources = load_resources_yaml(args.manifests)
-  else:
-    resources = []
-    for filename in os.listdir(args.manifests):
-      resources += load_resources_yaml(os.path.join(args.manifests, filename))
-
-  if not args.noapp:
-    app = find_application_resource(resources)
-    kinds = set([x["kind"] for x in app["spec"].get("componentKinds", [])])
-
-    excluded_kinds = ["PersistentVolumeClaim", "Application"]
-    included_kinds = [kind for kind in kinds if kind not in excluded_kinds]
-  else:
-    included_kinds = None
-
-  if args.dest == "-":
-    dump(
-        sys.stdout,
+  pipeline = add_ownership_stage(
+      ManifestPipeline(),
+      use_app=not args.noapp,
+      namespace=args.namespace,
+      namespace_uid=args.namespace_uid,
+      app_name=args.app_name,
+      app_uid=args.app_uid,
+      app_api_version=args.app_api_version,
+      deployer_name=args.deployer_name,
+      deployer_uid=args.deployer_uid)
+  resources = pipeline.run(load_manifests(args.manifests))
+  dump_resources_yaml(resources, args.dest)
+
+
+def find_included_kinds(resources):
+  """Returns the kinds listed in the Application's componentKinds."""
+  app = find_application_resource(resources)
+  kinds = set([x["kind"] for x in app["spec"].get("componentKinds", [])])
+
+  excluded_kinds = ["PersistentVolumeClaim", "Application"]
+  return [kind for kind in kinds if kind not in excluded_kinds]
+
+
+def add_ownership_stage(pipeline, use_app, namespace, namespace_uid, app_name,
+                        app_uid, app_api_version, deployer_name, deployer_uid):
+  """Adds a stage setting the owner references of the resources.
+
+  If use_app, only the kinds listed in the Application's componentKinds are
+  owned by the Application."""
+
+  def _stage(resources):
+    included_kinds = find_included_kinds(resources) if use_app else None
+    return assign_ownership(
         resources,
         included_kinds,
-        namespace=args.namespace,
-        namespace_uid=args.namespace_uid,
-        app_name=args.app_name,
-        app_uid=args.app_uid,
-        app_api_version=args.app_api_version,
-        deployer_name=args.deployer_name,
-        deployer_uid=args.deployer_uid)
-    sys.stdout.flush()
-  else:
-    with open(args.dest, "w", encoding='utf-8') as outfile:
-      dump(
-          outfile,
-          resources,
-          included_kinds,
-          namespace=args.namespace,
-          namespace_uid=args.namespace_uid,
-          app_name=args.app_name,
-          app_uid=args.app_uid,
-          app_api_version=args.app_api_version,
-          deployer_name=args.deployer_name,
-          deployer_uid=args.deployer_uid)
-
-
-def dump(outfile, resources, included_kinds, namespace, namespace_uid, app_name,
-         app_uid, app_api_version, deployer_name, deployer_uid):
+        namespace=namespace,
+        namespace_uid=namespace_uid,
+        app_name=app_name,
+        app_uid=app_uid,
+        app_api_version=app_api_version,
+        deployer_name=deployer_name,
+        deployer_uid=deployer_uid)
+
+  return pipeline.apply(_stage)
+
+
+def assign_ownership(resources, included_kinds, namespace, namespace_uid,
+                     app_name, app_uid, app_api_version, deployer_name,
+                     deployer_uid):
+  """Returns the resources with their owner references set."""
 
   def maybe_assign_ownership(resource):
     if resource["kind"] in _CLUSTER_SCOPED_KINDS:
@@ -166,6 +165,7 @@ def dump(outfile, resources, included_kinds, namespace, namespace_uid, app_name,
       if namespace and namespace_uid:
         log.info("Namespace '{:s}' owns '{:s}/{:s}'", namespace,
                  resource["kind"], resource["metadata"]["name"])
+        resource = copy_resource_metadata(resource)
         set_namespace_resource_ownership(
             namespace_uid=namespace_uid,
             namespace_name=namespace,
@@ -179,7 +179,7 @@ def dump(outfile, resources, included_kinds, namespace, namespace_uid, app_name,
     elif deployer_name and deployer_uid and should_be_deployer_owned(resource):
       log.info("ServiceAccount '{:s}' owns '{:s}/{:s}'", deployer_name,
                resource["kind"], resource["metadata"]["name"])
-      resource = copy.deepcopy(resource)
+      resource = copy_resource_metadata(resource)
       set_service_account_resource_ownership(
           account_uid=deployer_uid,
           account_name=deployer_name,
@@ -187,7 +187,7 @@ def dump(outfile, resources, included_kinds, namespace, namespace_uid, app_name,
     elif included_kinds is None or resource["kind"] in included_kinds:
       log.info("Application '{:s}' owns '{:s}/{:s}'", app_name,
                resource["kind"], resource["metadata"]["name"])
-      resource = copy.deepcopy(resource)
+      resource = copy_resource_metadata(resource)
       set_app_resource_ownership(
           app_uid=app_uid,
           app_name=app_name,
@@ -196,8 +196,7 @@ def dump(outfile, resources, included_kinds, namespace, namespace_uid, app_name,
 
     return resource
 
-  to_be_dumped = [maybe_assign_ownership(resource) for resource in resources]
-  yaml.safe_dump_all(to_be_dumped, outfile, default_flow_style=False, indent=2)
+  return [maybe_assign_ownership(resource) for resource in resources]
 
 
 def should_be_deployer_owned(resource):
@@ -0,0 +1,160 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import tracemalloc
+import unittest
+
+import yaml_codec
+from ensure_k8s_apps_labels import ensure_resource_has_app_label
+from resources import set_app_resource_ownership
+from set_ownership import assign_ownership
+
+APP_API_VERSION = 'app.k8s.io/v1beta1'
+APP_NAME = 'wordpress-1'
+APP_UID = '00000000-1111-2222-3333-444444444444'
+
+
+def _large_resource(kind='Thing', properties=2000):
+  """Returns a resource embedding an OpenAPI schema of several MB of YAML."""
+  schema_properties = {}
+  for i in range(properties):
+    schema_properties['field{}'.format(i)] = {
+        'type': 'object',
+        'description': 'Description of field {}. '.format(i) * 40,
+        'properties': {
+            'name': {
+                'type': 'string'
+            },
+            'values': {
+                'type': 'array',
+                'items': {
+                    'type': 'integer'
+                },
+            },
+        },
+    }
+  return {
+      'apiVersion': 'apiextensions.k8s.io/v1',
+      'kind': kind,
+      'metadata': {
+          'name': 'things.example.com',
+          'labels': {
+              'app.kubernetes.io/name': APP_NAME
+          },
+      },
+      'spec': {
+          'versions': [{
+              'name': 'v1',
+              'schema': {
+                  'openAPIV3Schema': {
+                      'type': 'object',
+                      'properties': schema_properties,
+                  }
+              },
+          }],
+      },
+  }
+
+
+def _measure_allocations(fn):
+  """Returns the peak memory allocated while running fn."""
+  tracemalloc.start()
+  try:
+    fn()
+    return tracemalloc.get_traced_memory()[1]
+  finally:
+    tracemalloc.stop()
+
+
+def _assign_app_ownership(resources):
+  return assign_ownership(
+      resources,
+      included_kinds=None,
+      namespace=None,
+      namespace_uid=None,
+      app_name=APP_NAME,
+      app_uid=APP_UID,
+      app_api_version=APP_API_VERSION,
+      deployer_name=None,
+      deployer_uid=None)
+
+
+def _deepcopy_app_ownership(resources):
+  result = []
+  for resource in resources:
+    resource = copy.deepcopy(resource)
+    set_app_resource_ownership(APP_UID, APP_NAME, APP_API_VERSION, resource)
+    result.append(resource)
+  return result
+
+
+class SetOwnershipTest(unittest.TestCase):
+
+  def test_assign_ownership_does_not_modify_input(self):
+    resource = _large_resource(properties=2)
+    original = copy.deepcopy(resource)
+    [owned] = _assign_app_ownership([resource])
+
+    self.assertEqual(original, resource)
+    self.assertEqual(APP_UID, owned['metadata']['ownerReferences'][0]['uid'])
+    self.assertIs(resource['spec'], owned['spec'])
+
+  def test_assign_ownership_matches_deepcopy(self):
+    resource = _large_resource(properties=2)
+    self.assertEqual(
+        _deepcopy_app_ownership([resource]), _assign_app_ownership([resource]))
+
+  def test_namespace_ownership_does_not_modify_input(self):
+    resource = _large_resource('CustomResourceDefinition', properties=2)
+    original = copy.deepcopy(resource)
+    [owned] = assign_ownership([resource],
+                               included_kinds=None,
+                               namespace='default',
+                               namespace_uid=APP_UID,
+                               app_name=APP_NAME,
+                               app_uid=APP_UID,
+                               app_api_version=APP_API_VERSION,
+                               deployer_name=None,
+                               deployer_uid=None)
+
+    self.assertEqual(original, resource)
+    self.assertEqual('Namespace',
+                     owned['metadata']['ownerReferences'][0]['kind'])
+
+  def test_ensure_app_label_does_not_modify_input(self):
+    resource = {'kind': 'ConfigMap', 'metadata': {'name': 'c'}, 'data': {}}
+    labeled = ensure_resource_has_app_label(resource, APP_NAME)
+
+    self.assertEqual({'name': 'c'}, resource['metadata'])
+    self.assertEqual({'app.kubernetes.io/name': APP_NAME},
+                     labeled['metadata']['labels'])
+    self.assertIs(resource['data'], labeled['data'])
+
+  def test_benchmark_allocations_on_large_manifest(self):
+    resources = [_large_resource()]
+    self.assertGreater(
+        len(yaml_codec.safe_dump_all(resources)), 2 * 1024 * 1024)
+
+    deepcopy_bytes = _measure_allocations(
+        lambda: _deepcopy_app_ownership(resources))
+    ownership_bytes = _measure_allocations(
+        lambda: _assign_app_ownership(resources))
+    label_bytes = _measure_allocations(
+        lambda: ensure_resource_has_app_label(resources[0], APP_NAME))
+
+    # Only the metadata is copied, so the allocations do not grow with the
+    # size of the spec.
+    self.assertLess(ownership_bytes * 100, deepcopy_bytes)
+    self.assertLess(label_bytes * 100, deepcopy_bytes)
@@ -15,47 +15,63 @@
 # limitations under the License.
 
 import os
-import yaml
 
+from resources import ManifestPipeline
+from yaml_util import dump_resources_yaml
 from yaml_util import load_resources_yaml
 from argparse import ArgumentParser
 '''Scans a manifest for an Application resource and sets the assembly phase.'''
 
-parser = ArgumentParser()
-
-parser.add_argument(
-    "-m", "--manifest", dest="manifest", help="the manifest file")
-parser.add_argument(
-    "-s",
-    "--status",
-    dest="status",
-    choices=['Failure', 'Pending', 'Success'],
-    help="the assembly status to set")
-
-args = parser.parse_args()
-
-assert args.manifest
-assert os.path.exists(args.manifest)
-
-resources = []
-for r in load_resources_yaml(args.manifest):
-  resources.append(r)
-apps = [r for r in resources if r['kind'] == "Application"]
-
-if len(apps) == 0:
-  raise Exception(
-      "Set of resources in {:s} does not include one of "
-      "Application kind. See {:s} for how to add to a "
-      "helm-based deployer. See {:s} for an envsubst example.".format(
-          args.manifest,
-          "https://github.com/GoogleCloudPlatform/marketplace-k8s-app-tools/blob/master/docs/building-deployer-helm.md",
-          "https://github.com/GoogleCloudPlatform/marketplace-k8s-app-tools/blob/master/docs/building-deployer-envsubst.md"
-      ))
-if len(apps) > 1:
-  raise Exception("Set of resources in {:s} includes more than one of "
-                  "Application kind".format(args.manifest))
-
-apps[0]['spec']['assemblyPhase'] = args.status
-
-with open(args.manifest, "w", encoding='utf-8') as outfile:
-  yaml.safe_dump_all(resources, outfile, default_flow_style=False, indent=2)
+
+def main():
+  parser = ArgumentParser()
+
+  parser.add_argument(
+      "-m", "--manifest", dest="manifest", help="the manifest file")
+  parser.add_argument(
+      "-s",
+      "--status",
+      dest="status",
+      choices=['Failure', 'Pending', 'Success'],
+      help="the assembly status to set")
+
+  args = parser.parse_args()
+
+  assert args.manifest
+  assert os.path.exists(args.manifest)
+
+  pipeline = add_assembly_phase_stage(ManifestPipeline(), args.status,
+                                      args.manifest)
+  resources = pipeline.run(load_resources_yaml(args.manifest))
+  dump_resources_yaml(resources, args.manifest)
+
+
+def add_assembly_phase_stage(pipeline, status, manifest_name='the manifest'):
+  """Adds a stage setting the assembly phase of the Application."""
+  return pipeline.apply(
+      lambda resources: set_assembly_phase(resources, status, manifest_name))
+
+
+def set_assembly_phase(resources, status, manifest_name='the manifest'):
+  """Sets spec.assemblyPhase of the single Application in resources."""
+  apps = [r for r in resources if r['kind'] == "Application"]
+
+  if len(apps) == 0:
+    raise Exception(
+        "Set of resources in {:s} does not include one of "
+        "Application kind. See {:s} for how to add to a "
+        "helm-based deployer. See {:s} for an envsubst example.".format(
+            manifest_name,
+            "https://github.com/GoogleCloudPlatform/marketplace-k8s-app-tools/blob/master/docs/building-deployer-helm.md",
+            "https://github.com/GoogleCloudPlatform/marketplace-k8s-app-tools/blob/master/docs/building-deployer-envsubst.md"
+        ))
+  if len(apps) > 1:
+    raise Exception("Set of resources in {:s} includes more than one of "
+                    "Application kind".format(manifest_name))
+
+  apps[0]['spec']['assemblyPhase'] = status
+  return resources
+
+
+if __name__ == "__main__":
+  main()
@@ -39,7 +39,11 @@ def main():
 
   schema = schema_values_common.load_schema(args)
   resources = load_resources_yaml(args.manifests)
+  validate_app_resource(resources, schema)
 
+
+def validate_app_resource(resources, schema):
+  """Validates the Application resource found in resources against schema."""
   app = find_application_resource(resources)
   mp_deploy_info = app.get('metadata', {}).get(
       'annotations', {}).get('marketplace.cloud.google.com/deploy-info')
@@ -14,85 +14,513 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
+import queue
 import time
 import log_util as log
 
 from argparse import ArgumentParser
-from bash_util import Command
+import k8s_client
+from bash_util import AsyncCommand
+from bash_util import BackgroundCoroutine
+from bash_util import CommandException
+from k8s_client import ApiException
 
 _PROG_HELP = "Wait for the application to get ready into a ready state"
 
+MODE_WATCH = 'watch'
+MODE_POLL = 'poll'
+
+_STABILITY_WINDOW = 30
+_STABLE_OBSERVATIONS = 3
+_POLL_INTERVAL = 1
+_MAX_POLL_INTERVAL = 8
+# How often the watch loop wakes up without events, to check the timeout and
+# whether the resources should be listed again.
+_WATCH_TICK = 1
+# Error reported by kubectl for a kind unknown to the cluster.
+_UNKNOWN_KIND_ERROR = "the server doesn't have a resource type"
+
+
+class WatchError(Exception):
+  pass
+
 
 def main():
   parser = ArgumentParser(description=_PROG_HELP)
   parser.add_argument('--name')
   parser.add_argument('--namespace')
   parser.add_argument('--timeout', type=float)
+  parser.add_argument(
+      '--mode',
+      choices=[MODE_WATCH, MODE_POLL],
+      default=MODE_WATCH,
+      help='Watch the resources for changes, or poll them periodically. '
+      'Watching falls back to polling if the watch fails.')
+  parser.add_argument(
+      '--stability_window',
+      type=float,
+      default=_STABILITY_WINDOW,
+      help='The application is ready at the latest once it has been healthy '
+      'for this many seconds')
+  parser.add_argument(
+      '--stable_observations',
+      type=int,
+      default=_STABLE_OBSERVATIONS,
+      help='The application is ready as soon as it has been healthy and '
+      'unchanged for this many consecutive observations. 0 disables the early '
+      'exit and always waits for --stability_window.')
+  parser.add_argument(
+      '--poll_interval',
+      type=float,
+      default=_POLL_INTERVAL,
+      help='The initial number of seconds between two polls')
+  parser.add_argument(
+      '--max_poll_interval',
+      type=float,
+      default=_MAX_POLL_INTERVAL,
+      help='Polls back off up to this many seconds while nothing changes')
   args = parser.parse_args()
 
   log.info("Wait {} seconds for the application '{}' to get into ready state",
            args.timeout, args.name)
-  previous_healthy = False
-
-  min_time_before_healthy = 30
-  poll_interval = 4
 
-  application = Command(
-      '''
-    kubectl get "applications.app.k8s.io/{}"
-      --namespace="{}"
-      --output=json
-    '''.format(args.name, args.namespace),
-      print_call=True).json()
+  client = k8s_client.new_client()
+  application = client.get('applications.app.k8s.io', args.name, args.namespace)
 
   top_level_kinds = [
       kind['kind'] for kind in application['spec']['componentKinds']
   ]
 
-  poll_start_time = time.time()
-
+  tracker = ReadinessTracker(
+      args.name,
+      args.timeout,
+      stability_window=args.stability_window,
+      stable_observations=args.stable_observations)
+  if args.mode == MODE_WATCH:
+    try:
+      wait_with_watch(
+          client,
+          top_level_kinds,
+          args.namespace,
+          args.name,
+          tracker,
+          poll_interval=args.poll_interval,
+          max_poll_interval=args.max_poll_interval)
+      return
+    except WatchError as e:
+      log.warn("Watching the resources failed, falling back to polling: {}", e)
+  wait_with_polling(
+      client,
+      top_level_kinds,
+      args.namespace,
+      args.name,
+      tracker,
+      poll_interval=args.poll_interval,
+      max_poll_interval=args.max_poll_interval)
+
+
+class ReadinessTracker:
+  """Decides when the application is ready.
+
+  The application is ready once it is healthy and its resources have
+  settled: every controller has observed the latest generation, and the
+  generations, ready replicas and container restarts of the resources have
+  not changed over the last stable_observations observations. If the
+  resources do not settle, it is ready after staying healthy for
+  stability_window seconds.
+  """
+
+  def __init__(self,
+               app_name,
+               timeout,
+               stability_window=_STABILITY_WINDOW,
+               stable_observations=_STABLE_OBSERVATIONS):
+    self._app_name = app_name
+    self._timeout = timeout
+    self._stability_window = stability_window
+    self._stable_observations = stable_observations
+    self._start_time = time.time()
+    self._healthy_start_time = None
+    self._signature = None
+    self._unchanged_observations = 0
+    self.changed = True
+
+  def update(self, healthy, resources=()):
+    """Records an observation of the application and its resources.
+
+    Returns True once the application is ready."""
+    signature = stability_signature(resources)
+    self.changed = signature != self._signature
+    self._signature = signature
+
+    previous_healthy = self._healthy_start_time is not None
+    if previous_healthy != healthy:
+      log.info(
+          "Initialization: Found applications.app.k8s.io/{} ready status to be {}.",
+          self._app_name, healthy)
+      if healthy:
+        log.info(
+            "Wait up to {} seconds to make sure app stays in healthy state.",
+            self._stability_window)
+        self._healthy_start_time = time.time()
+      else:
+        self._healthy_start_time = None
+
+    if not healthy or not generations_observed(resources):
+      self._unchanged_observations = 0
+    elif self.changed:
+      self._unchanged_observations = 1
+    else:
+      self._unchanged_observations += 1
+
+    if not healthy:
+      return False
+    if (self._stable_observations > 0 and
+        self._unchanged_observations >= self._stable_observations):
+      log.info("Application stayed healthy and unchanged for {} observations.",
+               self._unchanged_observations)
+      return True
+    elapsed_healthy_time = time.time() - self._healthy_start_time
+    return elapsed_healthy_time > self._stability_window
+
+  def check_timeout(self):
+    if time.time() - self._start_time > self._timeout:
+      raise Exception(
+          "ERROR Application did not get ready before timeout of {} seconds"
+          .format(self._timeout))
+
+
+def wait_with_polling(client,
+                      kinds,
+                      namespace,
+                      app_name,
+                      tracker,
+                      poll_interval=_POLL_INTERVAL,
+                      max_poll_interval=_MAX_POLL_INTERVAL):
+  """Polls the top level resources until the application is ready.
+
+  The interval between polls doubles, up to max_poll_interval, while the
+  resources do not change, and is reset to poll_interval when they do."""
+  fetcher = ResourceFetcher(client, kinds, namespace, app_name)
+  interval = poll_interval
   while True:
-    top_level_resources = []
-    for kind in top_level_kinds:
-      resources = Command('''
-        kubectl get "{}"
-        --namespace="{}"
-        --selector app.kubernetes.io/name="{}"
-        --output=json
-        '''.format(kind, args.namespace, args.name)).json()
-      top_level_resources.extend(resources['items'])
+    top_level_resources = fetcher.fetch()
 
     if len(top_level_resources) == 0:
       raise Exception("ERROR no top level resources found")
 
     log.info("Top level resources: {}", len(top_level_resources))
-    healthy = True
-    for resource in top_level_resources:
-      healthy = is_healthy(resource)
-      if not healthy:
+    healthy = all(is_healthy(resource) for resource in top_level_resources)
+    if tracker.update(healthy, top_level_resources):
+      return
+    tracker.check_timeout()
+
+    if tracker.changed:
+      interval = poll_interval
+    else:
+      interval = min(interval * 2, max_poll_interval)
+    time.sleep(interval)
+
+
+class ResourceFetcher:
+  """Fetches the application's resources of all kinds in one call.
+
+  Kinds which are not known to the cluster are dropped the first time the
+  batched call fails."""
+
+  def __init__(self, client, kinds, namespace, app_name):
+    self._client = client
+    self._kinds = list(kinds)
+    self._namespace = namespace
+    self._app_name = app_name
+
+  @property
+  def kinds(self):
+    """The kinds fetched, without those unknown to the cluster."""
+    return list(self._kinds)
+
+  def fetch(self):
+    """Returns the list of resources of all kinds."""
+    if not self._kinds:
+      return []
+    try:
+      return self._get(self._kinds)
+    except ApiException:
+      self._kinds = self._existing_kinds()
+      if not self._kinds:
+        return []
+      return self._get(self._kinds)
+
+  def _get(self, kinds):
+    return self._client.get(
+        ','.join(kinds),
+        namespace=self._namespace,
+        selector='app.kubernetes.io/name={}'.format(self._app_name))['items']
+
+  def _existing_kinds(self):
+    existing_kinds = []
+    for kind in self._kinds:
+      try:
+        self._get([kind])
+      except ApiException as e:
+        if _UNKNOWN_KIND_ERROR not in str(e):
+          raise
+        log.warn("Kind '{}' does not exist on the cluster, ignoring it", kind)
+        continue
+      existing_kinds.append(kind)
+    return existing_kinds
+
+
+def wait_with_watch(client,
+                    kinds,
+                    namespace,
+                    app_name,
+                    tracker,
+                    poll_interval=_POLL_INTERVAL,
+                    max_poll_interval=_MAX_POLL_INTERVAL):
+  """Watches the top level resources until the application is ready.
+
+  The resources are listed once to learn which ones exist. Observations are
+  only made once every watch has reported these resources: each batch of
+  watch events is one. While the watches are quiet, the resources are listed
+  again, backing off like wait_with_polling, and each list is one too. Before
+  that, these lists forget the initial resources which have been deleted.
+
+  Raises WatchError if any of the watches fails."""
+  fetcher = ResourceFetcher(client, kinds, namespace, app_name)
+  initial_resources = fetcher.fetch()
+  if len(initial_resources) == 0:
+    raise Exception("ERROR no top level resources found")
+
+  events = queue.Queue()
+  resources = WatchedResources(
+      resource['metadata']['uid'] for resource in initial_resources)
+  watches = [
+      ResourceWatch(kind, namespace, app_name, events) for kind in fetcher.kinds
+  ]
+  interval = poll_interval
+  last_observation = time.time()
+  try:
+    while True:
+      received = False
+      try:
+        event = events.get(timeout=_WATCH_TICK)
+        while True:
+          resources.handle(event)
+          received = True
+          event = events.get_nowait()
+      except queue.Empty:
+        pass
+
+      if received:
+        observed = resources.resources()
+      elif time.time() - last_observation >= interval:
+        observed = fetcher.fetch()
+        # Listed resources deleted before their watch started are never
+        # reported by it.
+        resources.forget_pending_except(
+            resource['metadata']['uid'] for resource in observed)
+      else:
+        observed = None
+
+      if observed is not None and not resources.synced():
+        last_observation = time.time()
+      elif observed is not None:
+        if len(observed) == 0:
+          raise Exception("ERROR no top level resources found")
+        log.info("Top level resources: {}", len(observed))
+        if tracker.update(resources.healthy(observed), observed):
+          return
+        if tracker.changed:
+          interval = poll_interval
+        else:
+          interval = min(interval * 2, max_poll_interval)
+        last_observation = time.time()
+      tracker.check_timeout()
+  finally:
+    for watch in watches:
+      watch.stop()
+
+
+class ResourceWatch:
+  """Streams the watch events of the application's resources of one kind.
+
+  The events are put on the given queue, followed by a WatchError once
+  the watch stops."""
+
+  def __init__(self, kind, namespace, app_name, events):
+    self._kind = kind
+    self._events = events
+    self._decoder = JsonStreamDecoder()
+    self._command = AsyncCommand([
+        'kubectl',
+        'get',
+        kind,
+        '--namespace={}'.format(namespace),
+        '--selector=app.kubernetes.io/name={}'.format(app_name),
+        '--watch',
+        '--output=json',
+        '--output-watch-events',
+    ],
+                                 on_stdout=self._feed,
+                                 keep_output=False)
+    self._watching = BackgroundCoroutine(self._watch)
+
+  def _feed(self, line):
+    for event in self._decoder.feed(line):
+      self._events.put(event)
+
+  async def _watch(self):
+    try:
+      await self._command.run()
+      self._decoder.close()
+      error = WatchError('Watching {} stopped'.format(self._kind))
+    except (CommandException, WatchError) as e:
+      error = WatchError('Watching {} failed: {}'.format(self._kind, e))
+    self._events.put(error)
+
+  def stop(self):
+    self._watching.cancel()
+
+
+class WatchedResources:
+  """The health of the watched resources, keyed by uid.
+
+  A resource is only evaluated again when its resourceVersion changes.
+  initial_uids are the resources which existed when the watches started;
+  the watches are synced once each of them has been reported."""
+
+  def __init__(self, initial_uids=()):
+    self._resources = {}
+    self._pending_uids = set(initial_uids)
+
+  def handle(self, event):
+    """Applies a watch event. Returns True if the set of resources changed."""
+    if isinstance(event, Exception):
+      raise event
+    event_type = event.get('type')
+    if event_type == 'ERROR':
+      raise WatchError('Watch error: {}'.format(
+          event.get('object', {}).get('message')))
+    if event_type not in ('ADDED', 'MODIFIED', 'DELETED'):
+      return False
+
+    resource = event['object']
+    uid = resource['metadata']['uid']
+    self._pending_uids.discard(uid)
+    if event_type == 'DELETED':
+      return self._resources.pop(uid, None) is not None
+
+    version = resource['metadata'].get('resourceVersion')
+    cached = self._resources.get(uid)
+    if cached and cached[0] == version:
+      return False
+    self._resources[uid] = (version, is_healthy(resource), resource)
+    return cached is None
+
+  def forget_pending_except(self, uids):
+    """Stops waiting for the initial resources which are not in uids."""
+    self._pending_uids &= set(uids)
+
+  def synced(self):
+    """Returns whether all the initial resources have been reported."""
+    return not self._pending_uids
+
+  def healthy(self, resources=None):
+    """Returns whether resources, by default the watched ones, are healthy.
+
+    The health of a watched resource is reused while its resourceVersion
+    is unchanged."""
+    if resources is None:
+      return bool(self._resources) and all(
+          healthy for _, healthy, _ in self._resources.values())
+    return bool(resources) and all(
+        self._is_healthy(resource) for resource in resources)
+
+  def _is_healthy(self, resource):
+    cached = self._resources.get(resource['metadata']['uid'])
+    if cached and cached[0] == resource['metadata'].get('resourceVersion'):
+      return cached[1]
+    return is_healthy(resource)
+
+  def resources(self):
+    return [resource for _, _, resource in self._resources.values()]
+
+  def __len__(self):
+    return len(self._resources)
+
+
+def iter_json_objects(chunks):
+  """Yields the JSON values of a stream of concatenated JSON documents.
+
+  Args:
+    chunks: An iterable of str, arbitrary pieces of the stream.
+  """
+  decoder = JsonStreamDecoder()
+  for chunk in chunks:
+    yield from decoder.feed(chunk)
+  decoder.close()
+
+
+class JsonStreamDecoder:
+  """Decodes a stream of concatenated JSON documents as it is received."""
+
+  def __init__(self):
+    self._decoder = json.JSONDecoder()
+    self._buf = ''
+
+  def feed(self, chunk):
+    """Adds a piece of the stream and returns the values it completes."""
+    self._buf += chunk
+    values = []
+    pos = 0
+    while True:
+      while pos < len(self._buf) and self._buf[pos].isspace():
+        pos += 1
+      if pos == len(self._buf):
         break
-
-    if previous_healthy != healthy:
-      log.info(
-          "Initialization: Found applications.app.k8s.io/{} ready status to be {}.",
-          args.name, healthy)
-      previous_healthy = healthy
-      if healthy:
-        log.info("Wait {} seconds to make sure app stays in healthy state.",
-                 min_time_before_healthy)
-        healthy_start_time = time.time()
-
-    if healthy:
-      elapsed_healthy_time = time.time() - healthy_start_time
-      if elapsed_healthy_time > min_time_before_healthy:
+      try:
+        value, pos = self._decoder.raw_decode(self._buf, pos)
+      except json.JSONDecodeError:
+        # The value is not complete yet.
         break
+      values.append(value)
+    self._buf = self._buf[pos:]
+    return values
+
+  def close(self):
+    """Raises WatchError if the stream ends within a value."""
+    if self._buf.strip():
+      raise WatchError('Truncated watch output: {}'.format(self._buf[:100]))
+
+
+def stability_signature(resources):
+  """Returns the signals of the resources which change until they settle."""
+  return {
+      (resource['kind'], name(resource)): (
+          resource['metadata'].get('generation'),
+          resource.get('status', {}).get('observedGeneration'),
+          resource.get('status', {}).get('readyReplicas'),
+          restart_count(resource),
+      ) for resource in resources
+  }
+
+
+def generations_observed(resources):
+  """Returns whether the controllers have observed the latest generation."""
+  for resource in resources:
+    observed_generation = resource.get('status', {}).get('observedGeneration')
+    if (observed_generation is not None and
+        observed_generation != resource['metadata'].get('generation')):
+      return False
+  return True
 
-    if time.time() - poll_start_time > args.timeout:
-      raise Exception(
-          "ERROR Application did not get ready before timeout of {} seconds"
-          .format(args.timeout))
 
-    time.sleep(poll_interval)
+def restart_count(resource):
+  return sum(
+      container.get('restartCount', 0)
+      for container in resource.get('status', {}).get('containerStatuses', []))
 
 
 def is_healthy(resource):
@@ -0,0 +1,380 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import queue
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import wait_for_ready
+from k8s_client import ApiException
+from wait_for_ready import ReadinessTracker
+from wait_for_ready import ResourceFetcher
+from wait_for_ready import ResourceWatch
+from wait_for_ready import WatchError
+from wait_for_ready import WatchedResources
+from wait_for_ready import iter_json_objects
+
+
+def _deployment(uid, version, ready_replicas):
+  return {
+      'kind': 'Deployment',
+      'metadata': {
+          'name': 'd-' + uid,
+          'uid': uid,
+          'resourceVersion': version,
+      },
+      'spec': {
+          'replicas': 2
+      },
+      'status': {
+          'readyReplicas': ready_replicas
+      },
+  }
+
+
+def _event(event_type, resource):
+  return {'type': event_type, 'object': resource}
+
+
+class IterJsonObjectsTest(unittest.TestCase):
+
+  def test_splits_concatenated_documents(self):
+    stream = json.dumps({'a': 1}, indent=2) + '\n' + json.dumps({'b': [2]})
+    self.assertEqual([{'a': 1}, {'b': [2]}], list(iter_json_objects([stream])))
+
+  def test_documents_split_across_chunks(self):
+    stream = json.dumps({'a': 'x' * 100}) + json.dumps({'b': 2}) + '\n'
+    chunks = [stream[i:i + 7] for i in range(0, len(stream), 7)]
+    self.assertEqual([{
+        'a': 'x' * 100
+    }, {
+        'b': 2
+    }], list(iter_json_objects(chunks)))
+
+  def test_truncated_document_raises(self):
+    with self.assertRaises(WatchError):
+      list(iter_json_objects(['{"a": 1}', '{"b": ']))
+
+
+class ResourceWatchTest(unittest.TestCase):
+
+  def watch(self, script):
+    tmpdir = tempfile.TemporaryDirectory()
+    self.addCleanup(tmpdir.cleanup)
+    kubectl = os.path.join(tmpdir.name, 'kubectl')
+    with open(kubectl, 'w', encoding='utf-8') as f:
+      f.write('#!/bin/sh\n' + script)
+    os.chmod(kubectl, 0o755)
+    patch = mock.patch.dict(
+        os.environ, {'PATH': tmpdir.name + os.pathsep + os.environ['PATH']})
+    patch.start()
+    self.addCleanup(patch.stop)
+    events = queue.Queue()
+    watch = ResourceWatch('Deployment', 'ns', 'app', events)
+    self.addCleanup(watch.stop)
+    return events
+
+  def test_streams_events_until_stopped(self):
+    event = _event('ADDED', _deployment('1', '1', 2))
+    events = self.watch("cat <<'EOF'\n{}\nEOF\n".format(
+        json.dumps(event, indent=2)))
+    self.assertEqual(event, events.get(timeout=5))
+    error = events.get(timeout=5)
+    self.assertIsInstance(error, WatchError)
+    self.assertEqual('Watching Deployment stopped', str(error))
+
+  def test_failure_is_reported(self):
+    events = self.watch('echo forbidden >&2; exit 1\n')
+    error = events.get(timeout=5)
+    self.assertIsInstance(error, WatchError)
+    self.assertIn('forbidden', str(error))
+
+  def test_stop_kills_the_watch(self):
+    start = time.time()
+    self.watch('sleep 60\n')
+    self.doCleanups()
+    self.assertLess(time.time() - start, 5)
+
+
+class WatchedResourcesTest(unittest.TestCase):
+
+  def test_healthy_once_all_resources_are_ready(self):
+    resources = WatchedResources()
+    self.assertFalse(resources.healthy())
+
+    self.assertTrue(resources.handle(_event('ADDED', _deployment('1', '1', 2))))
+    self.assertTrue(resources.handle(_event('ADDED', _deployment('2', '1', 0))))
+    self.assertFalse(resources.healthy())
+
+    self.assertFalse(
+        resources.handle(_event('MODIFIED', _deployment('2', '2', 2))))
+    self.assertTrue(resources.healthy())
+    self.assertEqual(2, len(resources))
+
+  def test_unchanged_resource_version_is_not_evaluated_again(self):
+    resources = WatchedResources()
+    with mock.patch.object(
+        wait_for_ready, 'is_healthy', return_value=True) as is_healthy:
+      resources.handle(_event('ADDED', _deployment('1', '1', 2)))
+      resources.handle(_event('MODIFIED', _deployment('1', '1', 2)))
+      resources.handle(_event('MODIFIED', _deployment('1', '2', 2)))
+    self.assertEqual(2, is_healthy.call_count)
+
+  def test_deleted_resource_is_forgotten(self):
+    resources = WatchedResources()
+    resources.handle(_event('ADDED', _deployment('1', '1', 2)))
+    resources.handle(_event('ADDED', _deployment('2', '1', 0)))
+    self.assertTrue(
+        resources.handle(_event('DELETED', _deployment('2', '2', 0))))
+    self.assertTrue(resources.healthy())
+
+  def test_synced_once_initial_resources_are_reported(self):
+    resources = WatchedResources(['1', '2'])
+    self.assertFalse(resources.synced())
+    resources.handle(_event('ADDED', _deployment('1', '1', 2)))
+    self.assertFalse(resources.synced())
+    resources.handle(_event('DELETED', _deployment('2', '1', 2)))
+    self.assertTrue(resources.synced())
+
+  def test_error_event_raises(self):
+    resources = WatchedResources()
+    with self.assertRaises(WatchError):
+      resources.handle({'type': 'ERROR', 'object': {'message': 'gone'}})
+    with self.assertRaises(WatchError):
+      resources.handle(WatchError('stopped'))
+
+
+class ReadinessTrackerTest(unittest.TestCase):
+
+  def test_ready_after_stability_window(self):
+    tracker = ReadinessTracker(
+        'app', timeout=10, stability_window=-1, stable_observations=0)
+    self.assertFalse(tracker.update(False))
+    self.assertTrue(tracker.update(True))
+
+  def test_not_ready_within_stability_window(self):
+    tracker = ReadinessTracker(
+        'app', timeout=10, stability_window=60, stable_observations=0)
+    self.assertFalse(tracker.update(True))
+    self.assertFalse(tracker.update(True))
+
+  def test_ready_after_stable_observations(self):
+    tracker = ReadinessTracker(
+        'app', timeout=10, stability_window=60, stable_observations=3)
+    resources = [_deployment('1', '1', 2)]
+    self.assertFalse(tracker.update(False, resources))
+    self.assertFalse(tracker.update(True, resources))
+    self.assertFalse(tracker.update(True, resources))
+    self.assertTrue(tracker.update(True, resources))
+
+  def test_changes_restart_stable_observations(self):
+    tracker = ReadinessTracker(
+        'app', timeout=10, stability_window=60, stable_observations=2)
+    self.assertFalse(tracker.update(True, [_deployment('1', '1', 1)]))
+    self.assertTrue(tracker.changed)
+    self.assertFalse(tracker.update(True, [_deployment('1', '2', 2)]))
+    self.assertTrue(tracker.changed)
+    self.assertTrue(tracker.update(True, [_deployment('1', '3', 2)]))
+    self.assertFalse(tracker.changed)
+
+  def test_container_restarts_are_not_stable(self):
+    tracker = ReadinessTracker(
+        'app', timeout=10, stability_window=60, stable_observations=2)
+    pod = {
+        'kind': 'Pod',
+        'metadata': {
+            'name': 'p'
+        },
+        'status': {
+            'containerStatuses': [{
+                'restartCount': 0
+            }]
+        },
+    }
+    self.assertFalse(tracker.update(True, [pod]))
+    pod['status']['containerStatuses'][0]['restartCount'] = 1
+    self.assertFalse(tracker.update(True, [pod]))
+    self.assertTrue(tracker.update(True, [pod]))
+
+  def test_unobserved_generation_is_not_stable(self):
+    tracker = ReadinessTracker(
+        'app', timeout=10, stability_window=60, stable_observations=1)
+    deployment = _deployment('1', '1', 2)
+    deployment['metadata']['generation'] = 2
+    deployment['status']['observedGeneration'] = 1
+    self.assertFalse(tracker.update(True, [deployment]))
+    deployment['status']['observedGeneration'] = 2
+    self.assertTrue(tracker.update(True, [deployment]))
+
+  def test_timeout(self):
+    tracker = ReadinessTracker('app', timeout=-1)
+    with self.assertRaises(Exception):
+      tracker.check_timeout()
+
+
+class FakeClient:
+  """Stands in for a k8s_client client listing resources of some kinds."""
+
+  def __init__(self, known_kinds):
+    self.known_kinds = known_kinds
+    self.calls = []
+
+  def get(self, resource, namespace=None, selector=None):
+    kinds = resource.split(',')
+    self.calls.append(kinds)
+    for kind in kinds:
+      if kind not in self.known_kinds:
+        raise ApiException(
+            None,
+            'error: the server doesn\'t have a resource type "{}"'.format(kind))
+    return {'items': [{'kind': kind} for kind in kinds]}
+
+
+class ResourceFetcherTest(unittest.TestCase):
+
+  def test_fetches_all_kinds_in_one_call(self):
+    client = FakeClient(['Deployment', 'Service'])
+    fetcher = ResourceFetcher(client, ['Deployment', 'Service'], 'ns', 'app')
+    self.assertEqual([{
+        'kind': 'Deployment'
+    }, {
+        'kind': 'Service'
+    }], fetcher.fetch())
+    self.assertEqual([['Deployment', 'Service']], client.calls)
+
+  def test_unknown_kinds_are_dropped(self):
+    client = FakeClient(['Deployment', 'Service'])
+    fetcher = ResourceFetcher(client, ['Deployment', 'Missing', 'Service'],
+                              'ns', 'app')
+    self.assertEqual(2, len(fetcher.fetch()))
+    del client.calls[:]
+    self.assertEqual(2, len(fetcher.fetch()))
+    self.assertEqual([['Deployment', 'Service']], client.calls)
+
+  def test_other_errors_are_raised(self):
+    client = mock.Mock()
+    client.get.side_effect = ApiException(401, 'Unauthorized')
+    fetcher = ResourceFetcher(client, ['Deployment'], 'ns', 'app')
+    with self.assertRaises(ApiException):
+      fetcher.fetch()
+
+
+class FakeListClient:
+  """Stands in for a k8s_client client listing the given resources.
+
+  After the first list, later_resources are listed if set."""
+
+  def __init__(self, resources, later_resources=None):
+    self.resources = resources
+    self.later_resources = later_resources
+    self.lists = 0
+
+  def get(self, resource, namespace=None, selector=None):
+    self.lists += 1
+    kinds = resource.split(',')
+    items = [r for r in self.resources if r['kind'] in kinds]
+    if self.later_resources is not None:
+      self.resources = self.later_resources
+    return {'items': items}
+
+
+class FakeWatch:
+  """Stands in for ResourceWatch, reporting the scripted events at once."""
+
+  def __init__(self, scripted_events, kind, namespace, app_name, events):
+    for event in scripted_events.get(kind, []):
+      events.put(event)
+
+  def stop(self):
+    pass
+
+
+class WaitWithWatchTest(unittest.TestCase):
+
+  def setUp(self):
+    patch = mock.patch.object(wait_for_ready, '_WATCH_TICK', 0.01)
+    patch.start()
+    self.addCleanup(patch.stop)
+
+  def wait(self, client, scripted_events, timeout=1):
+    tracker = ReadinessTracker(
+        'app', timeout=timeout, stability_window=60, stable_observations=2)
+
+    def _watch(*args):
+      return FakeWatch(scripted_events, *args)
+
+    with mock.patch.object(wait_for_ready, 'ResourceWatch', _watch):
+      wait_for_ready.wait_with_watch(
+          client, ['Deployment', 'Service'],
+          'ns',
+          'app',
+          tracker,
+          poll_interval=0.01,
+          max_poll_interval=0.01)
+
+  def test_ready_once_all_watches_are_synced(self):
+    deployment = _deployment('1', '1', 2)
+    service = {
+        'kind': 'Service',
+        'metadata': {
+            'name': 's',
+            'uid': '2',
+            'resourceVersion': '1'
+        },
+        'spec': {
+            'type': 'ClusterIP'
+        },
+    }
+    client = FakeListClient([deployment, service])
+    with mock.patch.object(
+        wait_for_ready, 'is_healthy',
+        wraps=wait_for_ready.is_healthy) as is_healthy:
+      self.wait(
+          client, {
+              'Deployment': [_event('ADDED', deployment)],
+              'Service': [_event('ADDED', service)],
+          })
+    # The initial list, then the list confirming that nothing changed.
+    self.assertEqual(2, client.lists)
+    # Unchanged resources are only evaluated once.
+    self.assertEqual(2, is_healthy.call_count)
+
+  def test_not_ready_before_all_watches_are_synced(self):
+    deployment = _deployment('1', '1', 2)
+    service = {
+        'kind': 'Service',
+        'metadata': {
+            'name': 's',
+            'uid': '2'
+        },
+    }
+    client = FakeListClient([deployment, service])
+    with self.assertRaisesRegex(Exception, 'did not get ready'):
+      self.wait(
+          client, {'Deployment': [_event('ADDED', deployment)]}, timeout=0.2)
+
+  def test_resource_deleted_before_its_watch_started(self):
+    replaced = _deployment('1', '1', 2)
+    deployment = _deployment('2', '1', 2)
+    client = FakeListClient([replaced, deployment],
+                            later_resources=[deployment])
+    self.wait(client, {'Deployment': [_event('ADDED', deployment)]})
+
+  def test_no_resources(self):
+    with self.assertRaisesRegex(Exception, 'no top level resources'):
+      self.wait(FakeListClient([]), {})
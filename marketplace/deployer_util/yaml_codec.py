@@ -0,0 +1,91 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Central YAML loading and dumping for the deployer tools.
+
+Uses the libyaml based C loader and dumper when PyYAML has been built with
+libyaml, and transparently falls back to the pure python implementation
+otherwise. The output of both implementations is the same.
+"""
+
+# yaml is only imported when first used, so that tools which don't parse or
+# write yaml (for example when the schema is loaded from its compiled form)
+# don't pay for the import.
+_yaml = None
+_classes = None
+
+
+def _load_yaml():
+  """Imports yaml and picks the loader and dumper classes, once."""
+  global _yaml, _classes
+  if _yaml is None:
+    import yaml
+    try:
+      classes = {
+          'SafeLoader': yaml.CSafeLoader,
+          'SafeDumper': yaml.CSafeDumper,
+          'Dumper': yaml.CDumper,
+          'LIBYAML': True,
+      }
+    except AttributeError:
+      classes = {
+          'SafeLoader': yaml.SafeLoader,
+          'SafeDumper': yaml.SafeDumper,
+          'Dumper': yaml.Dumper,
+          'LIBYAML': False,
+      }
+    classes['YAMLError'] = yaml.YAMLError
+    _classes = classes
+    _yaml = yaml
+  return _yaml
+
+
+def __getattr__(name):
+  """Resolves SafeLoader, SafeDumper, Dumper, LIBYAML and YAMLError."""
+  _load_yaml()
+  if name in _classes:
+    return _classes[name]
+  raise AttributeError("module {!r} has no attribute {!r}".format(
+      __name__, name))
+
+
+def safe_load(stream):
+  """Parses the first document of a yaml stream, like yaml.safe_load."""
+  return _load_yaml().load(stream, Loader=_classes['SafeLoader'])
+
+
+def safe_load_all(stream):
+  """Parses all documents of a yaml stream, like yaml.safe_load_all."""
+  return _load_yaml().load_all(stream, Loader=_classes['SafeLoader'])
+
+
+def safe_dump(data, stream=None, **kwargs):
+  """Serializes data into yaml, like yaml.safe_dump."""
+  return _load_yaml().dump_all([data],
+                               stream,
+                               Dumper=_classes['SafeDumper'],
+                               **kwargs)
+
+
+def safe_dump_all(documents, stream=None, **kwargs):
+  """Serializes a sequence of documents into yaml, like yaml.safe_dump_all."""
+  return _load_yaml().dump_all(
+      documents, stream, Dumper=_classes['SafeDumper'], **kwargs)
+
+
+def dump(data, stream=None, **kwargs):
+  """Serializes data into yaml, like yaml.dump."""
+  return _load_yaml().dump_all([data],
+                               stream,
+                               Dumper=_classes['Dumper'],
+                               **kwargs)
@@ -0,0 +1,118 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import unittest
+
+import yaml
+
+import yaml_codec
+
+MANIFEST = """
+apiVersion: v1
+kind: ConfigMap
+metadata:
+  name: $APP_INSTANCE_NAME-config
+  labels:
+    app.kubernetes.io/name: "$APP_INSTANCE_NAME"
+  annotations:
+    marketplace.cloud.google.com/deploy-info: '{"partner_id": "p", "product_id": "s"}'
+data:
+  empty: ""
+  multiline: |
+    first line
+      indented line
+    last line
+  folded: >
+    folded text
+    on several lines
+  long: "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore et dolore magna aliqua."
+  unicode: "caf\\u00e9 \\u2603"
+  quoted: "yes"
+  number_string: "0123"
+  special: "a: b # c"
+  trailing_space: "trailing "
+---
+# Comment only document.
+---
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: $APP_INSTANCE_NAME
+  labels: &labels
+    app.kubernetes.io/name: "$APP_INSTANCE_NAME"
+spec:
+  replicas: 3
+  paused: false
+  progressDeadlineSeconds: 1.5
+  minReadySeconds: null
+  selector:
+    matchLabels: *labels
+  template:
+    spec:
+      containers:
+      - image: gcr.io/google/busybox:1.0
+        args: ["--flag", "--other=value", '']
+        env:
+        - {name: DATE, value: 2018-01-01}
+"""
+
+
+def _pure_safe_dump_all(documents, **kwargs):
+  return yaml.dump_all(documents, Dumper=yaml.SafeDumper, **kwargs)
+
+
+class YamlCodecTest(unittest.TestCase):
+
+  def test_load_is_identical_to_pure_python(self):
+    self.assertEqual(
+        list(yaml.load_all(MANIFEST, Loader=yaml.SafeLoader)),
+        list(yaml_codec.safe_load_all(MANIFEST)))
+    single = MANIFEST.split('---')[0]
+    self.assertEqual(
+        yaml.load(single, Loader=yaml.SafeLoader), yaml_codec.safe_load(single))
+
+  def test_dump_is_byte_identical_to_pure_python(self):
+    docs = [d for d in yaml_codec.safe_load_all(MANIFEST) if d]
+    for kwargs in [{}, {
+        'default_flow_style': False,
+        'indent': 2
+    }, {
+        'default_flow_style': False,
+        'explicit_start': True
+    }]:
+      self.assertEqual(
+          _pure_safe_dump_all(docs, **kwargs),
+          yaml_codec.safe_dump_all(docs, **kwargs))
+      self.assertEqual(
+          yaml.dump(docs[0], Dumper=yaml.SafeDumper, **kwargs),
+          yaml_codec.safe_dump(docs[0], **kwargs))
+      self.assertEqual(
+          yaml.dump(docs[1], Dumper=yaml.Dumper, **kwargs),
+          yaml_codec.dump(docs[1], **kwargs))
+
+  def test_dump_to_stream_is_byte_identical_to_pure_python(self):
+    docs = [d for d in yaml_codec.safe_load_all(MANIFEST) if d]
+    pure = io.StringIO()
+    fast = io.StringIO()
+    yaml.dump_all(docs, pure, Dumper=yaml.SafeDumper, default_flow_style=False)
+    yaml_codec.safe_dump_all(docs, fast, default_flow_style=False)
+    self.assertEqual(pure.getvalue(), fast.getvalue())
+
+  def test_uses_libyaml_when_available(self):
+    if not yaml.__with_libyaml__:
+      self.skipTest('PyYAML is built without libyaml')
+    self.assertTrue(yaml_codec.LIBYAML)
+    self.assertIs(yaml_codec.SafeLoader, yaml.CSafeLoader)
+    self.assertIs(yaml_codec.SafeDumper, yaml.CSafeDumper)
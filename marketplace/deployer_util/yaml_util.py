@@ -13,15 +13,17 @@
 # limitations under the License.
 
 import copy
-import yaml
+import itertools
+import os
+import sys
 import log_util as log
+import parse_cache
+import yaml_codec
 
 
 def load_yaml(filename):
   """ Helper function for loading a single yaml entry from file """
-  with open(filename, "r", encoding='utf-8') as stream:
-    content = stream.read()
-    return yaml.safe_load(content)
+  return parse_cache.load(filename, yaml_codec.safe_load, 'yaml')
 
 
 def add_or_replace(orig, dest):
@@ -43,8 +45,12 @@ def overlay_yaml_file(orig, dest):
   y2 = load_yaml(dest)
 
   add_or_replace(y1, y2)
-  with open(dest, "w", encoding='utf-8') as out:
-    yaml.dump(y2, out)
+  # Replace dest rather than rewriting it, as it may be a hardlink into the
+  # extracted chart cache.
+  tmp_dest = '{}.{}.tmp'.format(dest, os.getpid())
+  with open(tmp_dest, "w", encoding='utf-8') as out:
+    yaml_codec.dump(y2, out)
+  os.replace(tmp_dest, dest)
 
 
 def load_resources_yaml(filename):
@@ -58,9 +64,7 @@ def load_resources_yaml(filename):
     A list of structured kubernetes resources"""
 
   log.info("Reading " + filename)
-  with open(filename, "r", encoding='utf-8') as stream:
-    content = stream.read()
-    return parse_resources_yaml(content)
+  return parse_cache.load(filename, parse_resources_yaml, 'resources')
 
 
 def parse_resources_yaml(content):
@@ -72,8 +76,99 @@ def parse_resources_yaml(content):
   Returns:
     A list of structured kubernetes resources"""
 
-  docs_yaml = []
-  for doc_yaml in yaml.safe_load_all(content):
+  return list(_filter_resources(yaml_codec.safe_load_all(content)))
+
+
+def iter_resources(path_or_stream):
+  """Lazily parses kubernetes resources from a yaml file or stream.
+
+  Documents are parsed one at a time as the generator is consumed, so that
+  stages which don't need the whole manifest run in bounded memory.
+
+  Args:
+    path_or_stream: A str, the name of the manifest file, or '-' for stdin,
+      or a readable stream.
+
+  Yields:
+    Structured kubernetes resources"""
+
+  if path_or_stream == '-':
+    path_or_stream = sys.stdin
+  if not isinstance(path_or_stream, str):
+    yield from _filter_resources(yaml_codec.safe_load_all(path_or_stream))
+    return
+
+  log.info("Reading " + path_or_stream)
+  with open(path_or_stream, "r", encoding='utf-8') as stream:
+    yield from _filter_resources(yaml_codec.safe_load_all(stream))
+
+
+def _filter_resources(docs):
+  for doc_yaml in docs:
     if doc_yaml and 'kind' in doc_yaml:
-      docs_yaml.append(doc_yaml)
-  return docs_yaml
+      yield doc_yaml
+
+
+def iter_manifests(manifests):
+  """Lazily parses kubernetes resources from a manifest file, a folder of
+  manifest files, or stdin if manifests is '-'.
+
+  Returns:
+    A generator of structured kubernetes resources"""
+
+  if manifests == '-' or os.path.isfile(manifests):
+    return iter_resources(manifests)
+  filenames = [os.path.join(manifests, f) for f in os.listdir(manifests)]
+  return itertools.chain.from_iterable(iter_resources(f) for f in filenames)
+
+
+def load_manifests(manifests):
+  """Loads kubernetes resources from a manifest file, a folder of manifest
+  files, or stdin if manifests is '-'.
+
+  Returns:
+    A list of structured kubernetes resources"""
+
+  if manifests == '-':
+    return parse_resources_yaml(sys.stdin.read())
+  if os.path.isfile(manifests):
+    return load_resources_yaml(manifests)
+  resources = []
+  for filename in os.listdir(manifests):
+    resources += load_resources_yaml(os.path.join(manifests, filename))
+  return resources
+
+
+def write_resources(resources, outfile, explicit_start=False):
+  """Serializes kubernetes resources in yaml format into outfile.
+
+  resources may be any iterable, including a generator; each resource is
+  serialized as soon as it is produced."""
+  yaml_codec.safe_dump_all(
+      resources,
+      outfile,
+      default_flow_style=False,
+      indent=2,
+      explicit_start=explicit_start)
+
+
+def dump_resources_yaml(resources, filename, explicit_start=False):
+  """Writes kubernetes resources in yaml format into a file,
+  or to stdout if filename is '-'.
+
+  The file is written to a temporary location first and then moved into
+  place, so resources may be lazily read from the same file."""
+
+  if filename == '-':
+    write_resources(resources, sys.stdout, explicit_start=explicit_start)
+    sys.stdout.flush()
+    return
+  tmp_filename = os.path.join(
+      os.path.dirname(filename), '.{}.tmp'.format(os.path.basename(filename)))
+  try:
+    with open(tmp_filename, 'w', encoding='utf-8') as outfile:
+      write_resources(resources, outfile, explicit_start=explicit_start)
+    os.replace(tmp_filename, filename)
+  finally:
+    if os.path.exists(tmp_filename):
+      os.unlink(tmp_filename)
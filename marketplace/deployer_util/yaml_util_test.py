@@ -13,8 +13,13 @@
 # limitations under the License.
 """Test for yaml_util"""
 
+import io
+import os
+import tempfile
 import unittest
 
+from yaml_util import dump_resources_yaml
+from yaml_util import iter_resources
 from yaml_util import parse_resources_yaml
 
 
@@ -106,3 +111,41 @@ spec:
     self.assertEqual(docs[1]['apiVersion'], "v1")
     self.assertEqual(docs[1]['kind'], "Service")
     self.assertEqual(docs[1]['spec']['ports'][0]['port'], 3306)
+
+  def test_iter_resources_from_stream_is_lazy(self):
+    stream = io.StringIO("""
+kind: ConfigMap
+metadata:
+  name: first
+---
+# no kind, skipped
+metadata:
+  name: ignored
+---
+kind: ConfigMap
+metadata:
+  name: second
+---
+kind: [invalid
+""")
+    resources = iter_resources(stream)
+    self.assertEqual('first', next(resources)['metadata']['name'])
+    self.assertEqual('second', next(resources)['metadata']['name'])
+    self.assertRaises(Exception, lambda: next(resources))
+
+  def test_dump_resources_yaml_in_place_from_stream(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      filename = os.path.join(tmpdir, 'manifest.yaml')
+      with open(filename, 'w', encoding='utf-8') as f:
+        f.write('kind: ConfigMap\n---\nkind: Secret\n')
+
+      dump_resources_yaml(
+          (dict(r, seen=True) for r in iter_resources(filename)),
+          filename,
+          explicit_start=True)
+
+      with open(filename, 'r', encoding='utf-8') as f:
+        self.assertEqual(
+            '---\nkind: ConfigMap\nseen: true\n'
+            '---\nkind: Secret\nseen: true\n', f.read())
+      self.assertEqual(['manifest.yaml'], os.listdir(tmpdir))